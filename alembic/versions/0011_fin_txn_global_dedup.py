@@ -0,0 +1,31 @@
+"""global unique dedup index for finance transactions
+
+Revision ID: 0011_fin_txn_global_dedup
+Revises: 0010_user_invites
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+
+revision = "0011_fin_txn_global_dedup"
+down_revision = "0010_user_invites"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Statements imported before this revision may overlap: keep the first copy
+    # of each row. Only imported rows can collide (manual entries carry a random
+    # hash), and nothing links to imported rows, so nothing is left dangling.
+    op.execute(
+        "DELETE FROM finance_transactions t USING finance_transactions first "
+        "WHERE t.dedup_hash = first.dedup_hash AND t.id > first.id"
+    )
+    op.create_index("ix_fin_txn_dedup_hash", "finance_transactions", ["dedup_hash"], unique=True)
+    # the per-import constraint is implied by the global one now
+    op.drop_constraint("uq_fin_txn_import_dedup", "finance_transactions", type_="unique")
+
+
+def downgrade() -> None:
+    op.create_unique_constraint("uq_fin_txn_import_dedup", "finance_transactions", ["import_job_id", "dedup_hash"])
+    op.drop_index("ix_fin_txn_dedup_hash", table_name="finance_transactions")
@@ -0,0 +1,26 @@
+"""batch import jobs (parent job + sheet name)
+
+Revision ID: 0012_import_job_batches
+Revises: 0011_fin_txn_global_dedup
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012_import_job_batches"
+down_revision = "0011_fin_txn_global_dedup"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("import_jobs", sa.Column("parent_id", sa.Integer(), sa.ForeignKey("import_jobs.id", ondelete="CASCADE"), nullable=True))
+    op.add_column("import_jobs", sa.Column("sheet_name", sa.String(length=255), nullable=False, server_default=""))
+    op.create_index("ix_import_jobs_parent_id", "import_jobs", ["parent_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_import_jobs_parent_id", table_name="import_jobs")
+    op.drop_column("import_jobs", "sheet_name")
+    op.drop_column("import_jobs", "parent_id")
@@ -0,0 +1,28 @@
+"""data version counters (rule engine cache invalidation)
+
+Revision ID: 0013_data_versions
+Revises: 0012_import_job_batches
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0013_data_versions"
+down_revision = "0012_import_job_batches"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    table = op.create_table(
+        "data_versions",
+        sa.Column("name", sa.String(length=64), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.bulk_insert(table, [{"name": "mapping_rules", "version": 1}])
+
+
+def downgrade() -> None:
+    op.drop_table("data_versions")
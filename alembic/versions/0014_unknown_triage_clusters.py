@@ -0,0 +1,75 @@
+"""description fingerprint + partial index for the unknown triage queue
+
+Revision ID: 0014_unknown_triage_clusters
+Revises: 0013_data_versions
+Create Date: 2026-10-16
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0014_unknown_triage_clusters"
+down_revision = "0013_data_versions"
+branch_labels = None
+depends_on = None
+
+_BACKFILL_BATCH = 5000
+
+# Frozen copy of kbeton.importers.utils.description_fingerprint as of this
+# revision, so later changes to the app code don't change what this backfills.
+_NOISE = re.compile(r"[\d\W_]+")
+_LEN = 64
+_COUNTERPARTY_LEN = 24
+
+
+def _fingerprint(description: str | None, counterparty: str | None) -> str:
+    text = " ".join(_NOISE.sub(" ", (description or "").lower()).split())
+    party = re.sub(r"\s+", " ", (counterparty or "").strip().lower().replace('"', "").replace("'", ""))
+    if not party:
+        return text[:_LEN].rstrip()
+    if not text:
+        return party[:_LEN].rstrip()
+    party = party[:_COUNTERPARTY_LEN].rstrip()
+    return f"{text[:_LEN - len(party) - 3].rstrip()} | {party}"
+
+
+def upgrade() -> None:
+    op.add_column("finance_transactions", sa.Column("description_fingerprint", sa.String(length=64), nullable=False, server_default=""))
+    # Only the triage backlog needs fingerprints; new rows get them on insert.
+    bind = op.get_bind()
+    txn = sa.table(
+        "finance_transactions",
+        sa.column("id", sa.Integer),
+        sa.column("description", sa.Text),
+        sa.column("counterparty", sa.String),
+        sa.column("description_fingerprint", sa.String),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text(
+                "SELECT id, description, counterparty FROM finance_transactions "
+                "WHERE tx_type = 'unknown' AND id > :last ORDER BY id LIMIT :n"
+            ),
+            {"last": last_id, "n": _BACKFILL_BATCH},
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        bind.execute(
+            txn.update().where(txn.c.id == sa.bindparam("_id")).values(description_fingerprint=sa.bindparam("fp")),
+            [{"_id": r.id, "fp": _fingerprint(r.description, r.counterparty)} for r in rows],
+        )
+    op.create_index(
+        "ix_fin_txn_unknown_fingerprint",
+        "finance_transactions",
+        ["description_fingerprint"],
+        postgresql_where=sa.text("tx_type = 'unknown'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_fin_txn_unknown_fingerprint", table_name="finance_transactions")
+    op.drop_column("finance_transactions", "description_fingerprint")
@@ -0,0 +1,30 @@
+"""per-rule classifier statistics
+
+Revision ID: 0015_mapping_rule_stats
+Revises: 0014_unknown_triage_clusters
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0015_mapping_rule_stats"
+down_revision = "0014_unknown_triage_clusters"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "mapping_rule_stats",
+        sa.Column("rule_id", sa.Integer(), sa.ForeignKey("mapping_rules.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("hits", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("evaluations", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("match_seconds", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("last_hit_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("mapping_rule_stats")
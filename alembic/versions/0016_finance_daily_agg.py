@@ -0,0 +1,46 @@
+"""finance daily rollup for P&L
+
+Revision ID: 0016_finance_daily_agg
+Revises: 0015_mapping_rule_stats
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0016_finance_daily_agg"
+down_revision = "0015_mapping_rule_stats"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    txn_type_enum = postgresql.ENUM("income", "expense", "unknown", name="txn_type_enum", create_type=False)
+    op.create_table(
+        "finance_daily_agg",
+        sa.Column("date", sa.Date(), primary_key=True),
+        sa.Column("tx_type", txn_type_enum, primary_key=True),
+        sa.Column("article_id", sa.Integer(), primary_key=True, server_default="0"),
+        sa.Column("amount", sa.Numeric(16, 2), nullable=False, server_default="0"),
+        sa.Column("tx_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        """
+        INSERT INTO finance_daily_agg (date, tx_type, article_id, amount, tx_count)
+        SELECT date, tx_type,
+               CASE tx_type
+                   WHEN 'income' THEN COALESCE(income_article_id, 0)
+                   WHEN 'expense' THEN COALESCE(expense_article_id, 0)
+                   ELSE 0
+               END AS article_id,
+               SUM(amount), COUNT(*)
+        FROM finance_transactions
+        WHERE date IS NOT NULL
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("finance_daily_agg")
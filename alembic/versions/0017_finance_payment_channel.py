@@ -0,0 +1,104 @@
+"""payment channel on finance transactions + running channel balances
+
+Revision ID: 0017_finance_payment_channel
+Revises: 0016_finance_daily_agg
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0017_finance_payment_channel"
+down_revision = "0016_finance_daily_agg"
+branch_labels = None
+depends_on = None
+
+_BACKFILL_BATCH = 5000
+
+# Frozen copy of kbeton.importers.utils.payment_channel as of this revision,
+# so later changes to the app code don't change what this backfills.
+_CHANNEL_FIELDS = ("payment_channel", "account_type", "channel", "source_account", "wallet")
+
+
+def _bucket(raw_value: str) -> str | None:
+    value = (raw_value or "").strip().lower()
+    if not value:
+        return None
+    if any(token in value for token in ["касса", "нал", "налич", "cash"]):
+        return "cash"
+    if any(token in value for token in ["банк", "р/с", "рс", "расчет", "расч", "безнал", "bank"]):
+        return "bank"
+    return None
+
+
+def _payment_channel(raw_fields, article_name: str | None, description: str | None) -> str | None:
+    if isinstance(raw_fields, dict):
+        for key in _CHANNEL_FIELDS:
+            bucket = _bucket(str(raw_fields.get(key, "")))
+            if bucket:
+                return bucket
+    return _bucket(f"{article_name or ''} {description or ''}")
+
+
+def upgrade() -> None:
+    op.add_column("finance_transactions", sa.Column("payment_channel", sa.String(length=8), nullable=True))
+    bind = op.get_bind()
+    txn = sa.table(
+        "finance_transactions",
+        sa.column("id", sa.Integer),
+        sa.column("payment_channel", sa.String),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text(
+                "SELECT t.id, t.raw_fields, t.description, a.name AS article_name FROM finance_transactions t "
+                "LEFT JOIN finance_articles a ON a.id = COALESCE(t.income_article_id, t.expense_article_id) "
+                "WHERE t.id > :last ORDER BY t.id LIMIT :n"
+            ),
+            {"last": last_id, "n": _BACKFILL_BATCH},
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        updates = [
+            {"_id": r.id, "channel": channel}
+            for r in rows
+            if (channel := _payment_channel(r.raw_fields, r.article_name, r.description))
+        ]
+        if updates:
+            bind.execute(
+                txn.update().where(txn.c.id == sa.bindparam("_id")).values(payment_channel=sa.bindparam("channel")),
+                updates,
+            )
+    op.create_index("ix_fin_txn_channel_date", "finance_transactions", ["payment_channel", "date"])
+
+    op.create_table(
+        "finance_channel_balances",
+        sa.Column("channel", sa.String(length=8), primary_key=True),
+        sa.Column("date", sa.Date(), primary_key=True),
+        sa.Column("balance", sa.Numeric(16, 2), nullable=False, server_default="0"),
+        sa.Column("tx_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        """
+        INSERT INTO finance_channel_balances (channel, date, balance, tx_count)
+        SELECT channel, date,
+               SUM(net) OVER (PARTITION BY channel ORDER BY date),
+               SUM(n) OVER (PARTITION BY channel ORDER BY date)
+        FROM (
+            SELECT payment_channel AS channel, date,
+                   SUM(CASE tx_type WHEN 'income' THEN amount WHEN 'expense' THEN -amount ELSE 0 END) AS net,
+                   COUNT(*) AS n
+            FROM finance_transactions
+            WHERE payment_channel IS NOT NULL AND date IS NOT NULL
+            GROUP BY payment_channel, date
+        ) per_day
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("finance_channel_balances")
+    op.drop_index("ix_fin_txn_channel_date", table_name="finance_transactions")
+    op.drop_column("finance_transactions", "payment_channel")
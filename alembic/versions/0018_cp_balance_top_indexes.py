@@ -0,0 +1,24 @@
+"""indexes for top debtors / creditors of a snapshot
+
+Revision ID: 0018_cp_balance_top_indexes
+Revises: 0017_finance_payment_channel
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+
+revision = "0018_cp_balance_top_indexes"
+down_revision = "0017_finance_payment_channel"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The dashboard reads the top rows of one snapshot by amount (ORDER BY ... DESC LIMIT n).
+    op.create_index("ix_cp_balance_snapshot_receivable", "counterparty_balances", ["snapshot_id", "receivable_money"])
+    op.create_index("ix_cp_balance_snapshot_payable", "counterparty_balances", ["snapshot_id", "payable_money"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_cp_balance_snapshot_payable", table_name="counterparty_balances")
+    op.drop_index("ix_cp_balance_snapshot_receivable", table_name="counterparty_balances")
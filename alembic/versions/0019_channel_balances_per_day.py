@@ -0,0 +1,51 @@
+"""finance_channel_balances: per-day movement instead of running balances
+
+Revision ID: 0019_channel_balances_per_day
+Revises: 0018_cp_balance_top_indexes
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+
+revision = "0019_channel_balances_per_day"
+down_revision = "0018_cp_balance_top_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # A backdated row used to rewrite every later day of its channel; now each
+    # row holds its own day and the dashboard sums up to the date it shows.
+    op.alter_column("finance_channel_balances", "balance", new_column_name="amount")
+    op.execute(
+        """
+        UPDATE finance_channel_balances b
+        SET amount = b.amount - p.prev_amount, tx_count = b.tx_count - p.prev_count
+        FROM (
+            SELECT channel, date,
+                   COALESCE(LAG(amount) OVER w, 0) AS prev_amount,
+                   COALESCE(LAG(tx_count) OVER w, 0) AS prev_count
+            FROM finance_channel_balances
+            WINDOW w AS (PARTITION BY channel ORDER BY date)
+        ) p
+        WHERE p.channel = b.channel AND p.date = b.date
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        UPDATE finance_channel_balances b
+        SET amount = r.run_amount, tx_count = r.run_count
+        FROM (
+            SELECT channel, date,
+                   SUM(amount) OVER w AS run_amount,
+                   SUM(tx_count) OVER w AS run_count
+            FROM finance_channel_balances
+            WINDOW w AS (PARTITION BY channel ORDER BY date)
+        ) r
+        WHERE r.channel = b.channel AND r.date = b.date
+        """
+    )
+    op.alter_column("finance_channel_balances", "amount", new_column_name="balance")
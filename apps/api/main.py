@@ -7,11 +7,11 @@ from fastapi.responses import Response
 from kbeton.core.config import settings
 from kbeton.core.logging import configure_logging
 from kbeton.db.session import session_scope
-from kbeton.reports.pnl import pnl as pnl_calc
-from kbeton.reports.export_xlsx import pnl_to_xlsx
 from kbeton.schemas.common import Ok
-from kbeton.schemas.finance import PnlResponse, PnlRow as PnlRowSchema
+from kbeton.schemas.finance import PnlCacheStats, PnlResponse, PnlRow as PnlRowSchema, RuleStatRow
+from kbeton.services.pnl_cache import pnl_cache
 from kbeton.services.pricing import get_current_prices
+from kbeton.services.rule_stats import rule_stats_report
 from apps.api.security import require_api_auth
 
 configure_logging(settings.log_level)
@@ -30,7 +30,7 @@ def pnl(
     end: date = Query(...),
 ):
     with session_scope() as session:
-        rows, meta = pnl_calc(session, start=start, end=end, period=period)
+        rows, meta = pnl_cache.report(session, start=start, end=end, period=period)
         return PnlResponse(
             period=period,
             start=start,
@@ -54,8 +54,7 @@ def pnl_xlsx(
     end: date = Query(...),
 ):
     with session_scope() as session:
-        rows, meta = pnl_calc(session, start=start, end=end, period=period)
-        data = pnl_to_xlsx(rows, period=period, start=start, end=end, totals=meta)
+        data = pnl_cache.xlsx(session, start=start, end=end, period=period)
     filename = f"pnl_{period}_{start.isoformat()}_{end.isoformat()}.xlsx"
     return Response(
         content=data,
@@ -63,6 +62,15 @@ def pnl_xlsx(
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
+@protected.get("/pnl/cache-stats", response_model=PnlCacheStats)
+def pnl_cache_stats():
+    return PnlCacheStats(**pnl_cache.stats())
+
+@protected.get("/rules/stats", response_model=list[RuleStatRow])
+def rules_stats(limit: int = Query(100, ge=1, le=1000)):
+    with session_scope() as session:
+        return [RuleStatRow(**r) for r in rule_stats_report(session, limit=limit)]
+
 @protected.get("/prices/current")
 def prices_current():
     with session_scope() as session:
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import structlog
+
+from apps.worker.celery_app import celery
+from kbeton.db.session import session_scope
+from kbeton.services.dashboard import build_dashboard_text, period_range
+from kbeton.services.dashboard_snapshots import read_dashboard, request_dashboard_refresh, store_dashboard
+
+log = structlog.get_logger(__name__)
+
+
+def dashboard_changed() -> None:
+    """Call after a write the dashboard shows (shift, realization, stock, money)."""
+    try:
+        request_dashboard_refresh(celery)
+    except Exception as e:
+        log.warning("dashboard_refresh_request_failed", error=str(e))
+
+
+def dashboard_snapshot(period: str, mode: str) -> dict:
+    # Served from the worker's precomputed snapshots; built here only when the
+    # worker has not produced one yet (first start, Redis flushed, day rollover).
+    snapshot = read_dashboard(period, mode)
+    if snapshot is None:
+        start, end = period_range(period)
+        with session_scope() as session:
+            text = build_dashboard_text(session, start=start, end=end, mode=mode, session_factory=session_scope)
+        snapshot = store_dashboard(period, mode, text, end=end)
+    return snapshot
+
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+
+import structlog
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from apps.bot.db_async import to_thread
+from apps.bot.ui import section_text
+from kbeton.db.session import session_scope
+from kbeton.models.finance import ImportJob
+from kbeton.services.import_progress import progress_lines, read_progress
+
+log = structlog.get_logger(__name__)
+
+IMPORT_WATCH_INTERVAL_SECONDS = 2.0
+IMPORT_WATCH_TIMEOUT_SECONDS = 2 * 3600
+_FINAL_STATUSES = {"done", "failed"}
+_watchers: set[asyncio.Task] = set()
+
+
+def import_progress_text(job_id: int, title: str, progress: dict | None) -> str:
+    status = (progress or {}).get("status")
+    icon = "✅" if status == "done" else "❌" if status == "failed" else "⏳"
+    return section_text(f"{title} #{job_id}", progress_lines(progress), icon=icon)
+
+
+def _job_progress_from_db(job_id: int) -> dict | None:
+    # Fallback when Redis has nothing (worker not started yet, key expired, Redis down).
+    with session_scope() as session:
+        job = session.get(ImportJob, job_id)
+        if job is None or job.status not in _FINAL_STATUSES:
+            return None
+        summary = job.summary or {}
+        return {
+            "status": job.status,
+            "rows": summary.get("rows") or 0,
+            "inserted": summary.get("inserted", summary.get("rows") or 0),
+            "classified": (summary["rows"] - summary["unknown"]) if "unknown" in summary else None,
+            "error": job.error or "",
+        }
+
+
+async def _watch_import(bot: Bot, chat_id: int, message_id: int, job_id: int, title: str) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + IMPORT_WATCH_TIMEOUT_SECONDS
+    last_text = None
+    while loop.time() < deadline:
+        progress = await to_thread(read_progress, job_id)
+        if progress is None:
+            progress = await to_thread(_job_progress_from_db, job_id)
+        text = import_progress_text(job_id, title, progress)
+        if text != last_text:
+            try:
+                await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id)
+                last_text = text
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except TelegramBadRequest as e:
+                log.info("import_progress_edit_stopped", job_id=job_id, error=str(e))
+                return
+        if progress and progress.get("status") in _FINAL_STATUSES:
+            return
+        await asyncio.sleep(IMPORT_WATCH_INTERVAL_SECONDS)
+
+
+async def start_import_progress(message: Message, job_id: int, title: str) -> None:
+    """Send one status message and keep editing it until the import finishes."""
+    status_message = await message.answer(import_progress_text(job_id, title, None))
+    task = asyncio.create_task(_watch_import(message.bot, status_message.chat.id, status_message.message_id, job_id, title))
+    _watchers.add(task)
+    task.add_done_callback(_watchers.discard)
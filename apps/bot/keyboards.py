@@ -3,6 +3,7 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMar
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 
 from kbeton.models.enums import Role
+from kbeton.services.dashboard_snapshots import dashboard_reply_markup
 
 CONCRETE_RECIPE_MARKS = ["M100", "M150", "M200", "M250", "M300", "M350", "M400"]
 INVITE_ROLE_OPTIONS = ["Viewer", "FinDir", "HeadProd", "Operator", "Warehouse"]
@@ -54,6 +55,7 @@ def finance_menu(role: Role | None = None) -> ReplyKeyboardMarkup:
     action_buttons: list[str] = []
     if _role_allowed(role, {Role.Admin, Role.FinDir}):
         action_buttons.append("📥 Загрузить взаиморасчеты (контрагенты)")
+        action_buttons.append("📥 Загрузить выписку (финансы)")
         action_buttons.append("📦 Статус импорта")
         action_buttons.append("➕ Добавить контрагента")
     if _role_allowed(role, {Role.Admin, Role.FinDir, Role.Viewer}):
@@ -185,23 +187,8 @@ def pnl_period_kb() -> InlineKeyboardMarkup:
     b.adjust(5)
     return b.as_markup()
 
-def dashboard_period_kb(active_period: str = "month", active_mode: str = "full") -> InlineKeyboardMarkup:
-    labels = [
-        ("day", "Сегодня"),
-        ("week", "Неделя"),
-        ("month", "Месяц"),
-        ("year", "Год"),
-    ]
-    b = InlineKeyboardBuilder()
-    for period, label in labels:
-        prefix = "● " if period == active_period else ""
-        b.button(text=f"{prefix}{label}", callback_data=f"dashboard:period:{period}:{active_mode}")
-    mode_labels = [("summary", "Кратко"), ("full", "Подробно")]
-    for mode, label in mode_labels:
-        prefix = "● " if mode == active_mode else ""
-        b.button(text=f"{prefix}{label}", callback_data=f"dashboard:mode:{mode}:{active_period}")
-    b.adjust(2, 2, 2)
-    return b.as_markup()
+def dashboard_period_kb(active_period: str = "month", active_mode: str = "full", live: bool = False) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup.model_validate(dashboard_reply_markup(active_period, active_mode, live=live))
 
 def production_period_kb() -> InlineKeyboardMarkup:
     b = InlineKeyboardBuilder()
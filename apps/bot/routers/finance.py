@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-import html
 import uuid
-from datetime import date, datetime, timedelta
+import zipfile
+from datetime import date, datetime
 
 from aiogram import Router, F
 from aiogram.exceptions import TelegramBadRequest
@@ -22,14 +22,24 @@ from kbeton.models.inventory import InventoryTxn, InventoryItem, InventoryBalanc
 from kbeton.models.enums import ShiftStatus, ProductType
 from kbeton.services.s3 import put_bytes
 from kbeton.services.audit import audit_log
-from kbeton.services.dashboard import build_dashboard_text as _build_dashboard_text
+from kbeton.services.counterparties import latest_counterparty_snapshot
+from kbeton.services.dashboard import period_range
+from kbeton.services.dashboard_snapshots import dashboard_html
+from kbeton.services.live_dashboard import get_live, start_live, stop_live
 from kbeton.services.pricing import set_price, get_current_prices
-from kbeton.services.mapping import apply_article
 from kbeton.services.manual_finance import create_manual_finance_tx
-from kbeton.reports.pnl import pnl as pnl_calc
-from kbeton.reports.export_xlsx import pnl_to_xlsx
+from kbeton.services.finance_preview import preview_finance_file
+from kbeton.services.rule_stats import DEAD_RULE_DAYS, flush_rule_stats_if_due, rule_stats_report
+from kbeton.services.triage import assign_cluster, unknown_backlog, unknown_clusters
+from kbeton.services.versions import RULES_VERSION, bump_version
+from kbeton.services.pnl_cache import pnl_cache
+from kbeton.importers.batch import is_batch_upload
+from kbeton.importers.finance_formats import finance_content_type, finance_file_ext
 from kbeton.importers.utils import norm_counterparty_name
 
+from apps.bot.db_async import to_thread
+from apps.bot.dashboard import dashboard_changed, dashboard_snapshot
+from apps.bot.import_progress import start_import_progress
 from apps.bot.keyboards import (
     pnl_period_kb,
     dashboard_period_kb,
@@ -44,6 +54,7 @@ from apps.bot.keyboards import (
 )
 from apps.bot.states import (
     CounterpartyUploadState,
+    FinanceUploadState,
     CounterpartyCardState,
     CounterpartyAddState,
     RealizationState,
@@ -54,7 +65,7 @@ from apps.bot.states import (
     OverheadCostState,
 )
 from apps.bot.ui import list_text, preview_text, section_text, wizard_text
-from apps.bot.utils import get_db_user, ensure_role
+from apps.bot.utils import discard_pending_upload, get_db_user, ensure_role
 
 from apps.worker.celery_app import celery
 
@@ -97,7 +108,7 @@ def _upsert_counterparty_registry_entry(name: str, actor_user_id: int | None) ->
         return ""
 
     with session_scope() as session:
-        snap = session.query(CounterpartySnapshot).order_by(CounterpartySnapshot.id.desc()).first()
+        snap = latest_counterparty_snapshot(session)
         if not snap:
             job = ImportJob(
                 kind="counterparty",
@@ -205,21 +216,7 @@ def _calc_recipe_cost(recipe: ConcreteRecipe, prices: dict, overheads: dict) ->
     return total, missing
 
 def _range_for(period: str) -> tuple[date, date]:
-    today = date.today()
-    if period == "day":
-        return today, today
-    if period == "week":
-        start = today - timedelta(days=today.weekday())
-        return start, today
-    if period == "month":
-        return date(today.year, today.month, 1), today
-    if period == "quarter":
-        q = (today.month - 1)//3
-        m = q*3 + 1
-        return date(today.year, m, 1), today
-    if period == "year":
-        return date(today.year, 1, 1), today
-    return today, today
+    return period_range(period)
 
 def _dashboard_period_label(period: str) -> str:
     return {
@@ -256,6 +253,15 @@ def _active_dashboard_mode(message: Message | None) -> str | None:
                 return callback_data.split(":")[2]
     return None
 
+def _active_dashboard_live(message: Message | None) -> bool:
+    markup = getattr(message, "reply_markup", None)
+    rows = getattr(markup, "inline_keyboard", None) or []
+    return any(
+        (getattr(button, "callback_data", "") or "").startswith("dashlive:off:")
+        for row in rows
+        for button in row
+    )
+
 def _realization_candidates(session):
     outputs = (
         session.query(ProductionOutput, ProductionShift)
@@ -382,8 +388,8 @@ def _pending_expense_caption(row: dict) -> str:
 def _pnl_payload(period: str):
     start, end = _range_for(period)
     with session_scope() as session:
-        rows, meta = pnl_calc(session, start=start, end=end, period=period)
-        xlsx = pnl_to_xlsx(rows, period=period, start=start, end=end, totals=meta)
+        rows, meta = pnl_cache.report(session, start=start, end=end, period=period)
+        xlsx = pnl_cache.xlsx(session, start=start, end=end, period=period, report=(rows, meta))
     text = (
         f"📈 P&L ({period})\n"
         f"Период: {start.isoformat()} → {end.isoformat()}\n"
@@ -411,7 +417,7 @@ def _pnl_payload(period: str):
 def _counterparty_page_payload(page: int) -> tuple[str | None, object | None]:
     safe_page = max(0, page)
     with session_scope() as session:
-        snap = session.query(CounterpartySnapshot).order_by(CounterpartySnapshot.id.desc()).first()
+        snap = latest_counterparty_snapshot(session)
         if not snap:
             return None, None
         total = session.query(CounterpartyBalance).filter(CounterpartyBalance.snapshot_id == snap.id).count()
@@ -496,15 +502,150 @@ async def cp_upload_handle(message: Message, state: FSMContext, **data):
             "Импорт создан",
             [f"job_id: {job_id}", f"Файл: {doc.file_name}"],
             icon="✅",
-            hint="Статус можно посмотреть в разделе '📦 Статус импорта'.",
+            hint="Прогресс обновляется в сообщении ниже.",
         ),
         reply_markup=finance_menu(user.role),
     )
+    await start_import_progress(message, job_id, "Импорт взаиморасчетов")
 
 @router.message(CounterpartyUploadState.waiting_file)
 async def cp_upload_waiting(message: Message, **data):
     await message.answer(section_text("Импорт взаиморасчетов", ["Нужно отправить XLSX как документ."], icon="⚠️", hint="Или нажмите 'Отмена'."))
 
+@router.message(F.text == "📥 Загрузить выписку (финансы)")
+async def finance_upload_prompt(message: Message, state: FSMContext, **data):
+    user = get_db_user(data, message)
+    ensure_role(user, {Role.Admin, Role.FinDir})
+    await state.set_state(FinanceUploadState.waiting_file)
+    await message.answer(
+        wizard_text(
+            "Импорт выписки",
+            step=1,
+            total=1,
+            body_lines=["Отправьте выписку из 1С или банка: XLSX, TXT (1CClientBankExchange) или CSV."],
+            hint="Файл нужно отправить как документ. Повторные строки будут пропущены.",
+        )
+    )
+
+FINANCE_FIELD_LABELS = {
+    "date": "Дата",
+    "amount": "Сумма",
+    "currency": "Валюта",
+    "description": "Назначение",
+    "counterparty": "Контрагент",
+    "tx_type": "Приход/расход",
+}
+
+def _finance_preview(filename: str, content: bytes) -> dict:
+    with session_scope() as session:
+        preview = preview_finance_file(session, filename=filename, data=content)
+        # the bot only classifies here; its counters would otherwise never reach the table
+        flush_rule_stats_if_due(session)
+        return preview
+
+def _finance_preview_lines(filename: str, preview: dict) -> list[str]:
+    lines = [f"Файл: {filename}"]
+    if preview.get("parts"):
+        lines.append(f"Пакет: {len(preview['parts'])} выписок, обрабатываются параллельно")
+        lines.extend(f"  – {title}" for title in preview["parts"][:10])
+        if len(preview["parts"]) > 10:
+            lines.append(f"  … и еще {len(preview['parts']) - 10}")
+        lines.append(f"Предпросмотр по первой: {preview['parts'][0]}")
+    lines.extend(["", "Колонки:"])
+    for field, label in FINANCE_FIELD_LABELS.items():
+        source = preview["columns"].get(field)
+        lines.append(f"• {label}: {source or '—'}")
+    lines.append("")
+    total = preview.get("total_estimate")
+    lines.append(f"Строк в файле: ~{total}" if total is not None else "Строк в файле: неизвестно")
+    lines.append(f"Проверено строк: {preview['sample_rows']}")
+    if preview["date_min"]:
+        lines.append(f"Даты в проверенных строках: {preview['date_min']} — {preview['date_max']}")
+    if preview["undated"]:
+        lines.append(f"Без даты: {preview['undated']}")
+    lines.append(f"Распознано правилами: {preview['hit_rate'] * 100:.0f}% (неразобранных: {preview['unknown']})")
+    return lines
+
+@router.message(FinanceUploadState.waiting_file, F.document)
+async def finance_upload_handle(message: Message, state: FSMContext, **data):
+    user = get_db_user(data, message)
+    ensure_role(user, {Role.Admin, Role.FinDir})
+
+    doc = message.document
+    if finance_file_ext(doc.file_name) is None and not is_batch_upload(doc.file_name):
+        await message.answer("Нужен файл .xlsx, .txt (1CClientBankExchange), .csv или .zip с выписками")
+        return
+    file = await message.bot.get_file(doc.file_id)
+    b = await message.bot.download_file(file.file_path)
+    content = b.read()
+
+    try:
+        preview = await to_thread(_finance_preview, doc.file_name, content)
+    except (ValueError, zipfile.BadZipFile) as e:
+        await message.answer(section_text("Файл отклонен", [str(e)], icon="⚠️", hint="Проверьте заголовки и отправьте файл снова."))
+        return
+    if not preview["sample_rows"]:
+        await message.answer(section_text("Файл отклонен", ["В файле нет строк с операциями."], icon="⚠️", hint="Отправьте другой файл."))
+        return
+
+    key = f"imports/finance/{uuid.uuid4().hex}_{doc.file_name}"
+    put_bytes(key, content, content_type="application/zip" if is_batch_upload(doc.file_name) else finance_content_type(doc.file_name))
+    await state.update_data(finance_import_key=key, finance_import_filename=doc.file_name, finance_import_preview=preview)
+    await state.set_state(FinanceUploadState.waiting_confirm)
+    await message.answer(
+        preview_text("Предпросмотр импорта", _finance_preview_lines(doc.file_name, preview), approve_hint="Запустить импорт?"),
+        reply_markup=preview_actions_kb("fimport", [], confirm_label="✅ Импортировать"),
+    )
+
+@router.callback_query(F.data.startswith("fimport:"))
+async def finance_upload_confirm(call: CallbackQuery, state: FSMContext, **data):
+    user = get_db_user(data, call.message)
+    ensure_role(user, {Role.Admin, Role.FinDir})
+    action = (call.data or "").split(":", 1)[1]
+    st = await state.get_data()
+    key = st.get("finance_import_key")
+    filename = st.get("finance_import_filename")
+
+    if action != "yes":
+        await discard_pending_upload(state)
+        await state.clear()
+        await call.message.answer("Импорт отменен.", reply_markup=finance_menu(user.role))
+        await call.answer()
+        return
+    if not key or not filename:
+        await state.clear()
+        await call.message.answer("Сессия импорта устарела. Загрузите файл заново.", reply_markup=finance_menu(user.role))
+        await call.answer()
+        return
+
+    preview = st.get("finance_import_preview") or {}
+    is_batch = bool(preview.get("parts"))
+    with session_scope() as session:
+        job = ImportJob(kind="finance_batch" if is_batch else "finance", status="pending", filename=filename, s3_key=key, created_by_user_id=user.id)
+        session.add(job)
+        session.flush()
+        audit_log(session, actor_user_id=user.id, action="finance_import_created", entity_type="import_job", entity_id=str(job.id), payload={"filename": filename, "s3_key": key, "preview": preview})
+        job_id = job.id
+
+    task = "apps.worker.tasks.process_finance_batch" if is_batch else "apps.worker.tasks.process_finance_import"
+    celery.send_task(task, args=[job_id])
+    await state.clear()
+    await call.message.answer(
+        section_text(
+            "Импорт создан",
+            [f"job_id: {job_id}", f"Файл: {filename}"],
+            icon="✅",
+            hint="Прогресс обновляется в сообщении ниже.",
+        ),
+        reply_markup=finance_menu(user.role),
+    )
+    await start_import_progress(call.message, job_id, "Пакетный импорт" if is_batch else "Импорт выписки")
+    await call.answer()
+
+@router.message(FinanceUploadState.waiting_file)
+async def finance_upload_waiting(message: Message, **data):
+    await message.answer(section_text("Импорт выписки", ["Нужно отправить XLSX, TXT (1C) или CSV как документ."], icon="⚠️", hint="Или нажмите 'Отмена'."))
+
 @router.message(F.text == "📦 Статус импорта")
 async def import_status(message: Message, **data):
     user = get_db_user(data, message)
@@ -512,17 +653,18 @@ async def import_status(message: Message, **data):
     with session_scope() as session:
         jobs = (
             session.query(ImportJob)
+            .filter(ImportJob.parent_id.is_(None))
             .order_by(ImportJob.id.desc())
             .limit(10)
             .all()
         )
     if not jobs:
-        await message.answer(section_text("Статус импорта", ["Импортов пока нет."], icon="📦", hint="Сначала загрузите XLSX взаиморасчетов."))
+        await message.answer(section_text("Статус импорта", ["Импортов пока нет."], icon="📦", hint="Сначала загрузите XLSX взаиморасчетов или выписку."))
         return
     lines = []
     for j in jobs:
         status = j.status
-        summary = j.summary or {}
+        summary = {k: v for k, v in (j.summary or {}).items() if k not in ("items", "progress")}
         err = j.error or ""
         parts = [f"#{j.id} {j.kind} — {status}"]
         if j.filename:
@@ -730,6 +872,7 @@ async def expense_approval_approve(call: CallbackQuery, **data):
         qty = float(txn.qty or 0)
         uom = item.uom
         unit_price = float(txn.unit_price or 0)
+    dashboard_changed()
 
     await call.message.answer(
         section_text(
@@ -943,6 +1086,7 @@ async def realization_confirm_action(call: CallbackQuery, state: FSMContext, **d
         audit_log(session, actor_user_id=user.id, action="production_realized", entity_type="production_realization", entity_id=str(real.id), payload={"output_id": out.id, "qty": qty, "unit_price": unit_price, "total_amount": total_amount})
         uom = out.uom
         product_label = f"{product_type_ru} {out.mark or ''}".strip()
+    dashboard_changed()
     await state.clear()
     await call.message.answer(
         section_text(
@@ -1062,6 +1206,24 @@ async def expense_articles(message: Message, state: FSMContext, **data):
         )
     )
 
+def _rule_stats_lines(report: list[dict]) -> list[str]:
+    lines = []
+    hot = [r for r in report if r["hits"]][:5]
+    if hot:
+        lines.append("")
+        lines.append("Чаще всего срабатывают:")
+        lines += [f"• {r['rule_id']}: '{r['pattern']}' — {r['hits']}" for r in hot]
+    dead = [r for r in report if r["dead"]]
+    if dead:
+        lines.append("")
+        lines.append(f"Не срабатывали {DEAD_RULE_DAYS}+ дней: {len(dead)} (id: {', '.join(str(r['rule_id']) for r in dead[:15])})")
+    slow = sorted((r for r in report if r["evaluations"]), key=lambda r: r["avg_match_us"], reverse=True)[:3]
+    if slow:
+        lines.append("")
+        lines.append("Самые медленные regex:")
+        lines += [f"• {r['rule_id']}: '{r['pattern']}' — {r['avg_match_us']} мкс/проверка, всего {r['match_ms']} мс" for r in slow]
+    return lines
+
 @router.message(F.text == "📐 Правила маппинга")
 async def rules_menu(message: Message, state: FSMContext, **data):
     user = get_db_user(data, message)
@@ -1074,10 +1236,13 @@ async def rules_menu(message: Message, state: FSMContext, **data):
             .limit(10)
             .all()
         )
+        report = rule_stats_report(session)
         audit_log(session, actor_user_id=user.id, action="mapping_rules_view", entity_type="mapping_rule", entity_id="", payload={"count": len(rules)})
+    hits = {r["rule_id"]: r["hits"] for r in report}
     lines = []
     for r, art in rules:
-        lines.append(f"• {r.id}: {r.kind.value}/{r.pattern_type.value} prio={r.priority} '{r.pattern}' → {art.name}")
+        lines.append(f"• {r.id}: {r.kind.value}/{r.pattern_type.value} prio={r.priority} '{r.pattern}' → {art.name} (срабатываний: {hits.get(r.id, 0)})")
+    lines += _rule_stats_lines(report)
     await state.set_state(MappingRuleAddState.waiting_rule)
     await message.answer(
         wizard_text(
@@ -1131,9 +1296,11 @@ async def rules_add(message: Message, state: FSMContext, **data):
         rule = MappingRule(kind=kind, pattern_type=ptype, pattern=pattern, priority=priority, is_active=True, article_id=art.id, created_by_user_id=user.id)
         session.add(rule)
         session.flush()
+        bump_version(session, RULES_VERSION)
         audit_log(session, actor_user_id=user.id, action="mapping_rule_add", entity_type="mapping_rule", entity_id=str(rule.id), payload={"kind": kind.value, "pattern_type": ptype.value, "pattern": pattern, "priority": priority, "article_id": art.id})
     await state.clear()
-    await message.answer(f"✅ Правило добавлено: {rule.id}", reply_markup=finance_menu(user.role))
+    celery.send_task("apps.worker.tasks.reclassify_unknown_transactions", args=[[rule.id], message.chat.id])
+    await message.answer(f"✅ Правило добавлено: {rule.id}\nНеразобранные операции переразмечаются в фоне.", reply_markup=finance_menu(user.role))
 
 @router.message(ArticleAddState.waiting_name)
 async def add_article(message: Message, state: FSMContext, **data):
@@ -1162,20 +1329,23 @@ async def unclassified(message: Message, **data):
     user = get_db_user(data, message)
     ensure_role(user, {Role.Admin, Role.FinDir})
     with session_scope() as session:
-        txs = session.query(FinanceTransaction).filter(FinanceTransaction.tx_type == TxType.unknown).order_by(FinanceTransaction.id.desc()).limit(5).all()
-        income_arts = session.query(FinanceArticle).filter(FinanceArticle.kind == TxType.income).order_by(FinanceArticle.name.asc()).all()
-        expense_arts = session.query(FinanceArticle).filter(FinanceArticle.kind == TxType.expense).order_by(FinanceArticle.name.asc()).all()
-        audit_log(session, actor_user_id=user.id, action="unclassified_view", entity_type="finance_transaction", entity_id="", payload={"count": len(txs)})
-    if not txs:
+        backlog = unknown_backlog(session)
+        clusters = unknown_clusters(session)
+        audit_log(session, actor_user_id=user.id, action="unclassified_view", entity_type="finance_transaction", entity_id="", payload={"count": backlog, "clusters": len(clusters)})
+    if not clusters:
         await message.answer("✅ Неразобранных строк нет.")
         return
-    for tx in txs:
-        text = f"ID {tx.id} | {tx.date} | {float(tx.amount):.2f} {tx.currency}\n{(tx.description or '')[:200]}\nКонтрагент: {tx.counterparty}"
-        # choose kind first
-        from aiogram.utils.keyboard import InlineKeyboardBuilder
+    await message.answer(section_text("Неразобранное", [f"Всего строк: {backlog}", f"Крупнейшие группы: {len(clusters)} (статья назначается всей группе сразу)"], icon="🧩"))
+    for c in clusters:
+        period = f"{c['date_min']} … {c['date_max']}" if c["date_min"] != c["date_max"] else f"{c['date_min']}"
+        text = (
+            f"×{c['count']} | {c['total']:.2f} | {period}\n{c['sample'][:200]}\n"
+            f"Контрагент: {c['counterparty'] or '—'}\nГруппа: {c['fingerprint'] or '(без текста)'}"
+        )
+        # choose kind first; the sample row stands for its group
         b = InlineKeyboardBuilder()
-        b.button(text="Доход → выбрать статью", callback_data=f"pickkind:{tx.id}:income")
-        b.button(text="Расход → выбрать статью", callback_data=f"pickkind:{tx.id}:expense")
+        b.button(text="Доход → выбрать статью", callback_data=f"pickkind:{c['sample_id']}:income")
+        b.button(text="Расход → выбрать статью", callback_data=f"pickkind:{c['sample_id']}:expense")
         b.adjust(1)
         await message.answer(text, reply_markup=b.as_markup())
 
@@ -1207,14 +1377,14 @@ async def assign_article(call: CallbackQuery, **data):
     kind_enum = TxType.income if kind == "income" else TxType.expense
 
     with session_scope() as session:
-        tx = session.query(FinanceTransaction).filter(FinanceTransaction.id == txid).one()
-        income_article_id, expense_article_id = apply_article(session, tx_type=kind_enum, article_id=aid)
-        tx.tx_type = kind_enum
-        tx.income_article_id = income_article_id
-        tx.expense_article_id = expense_article_id
-        audit_log(session, actor_user_id=user.id, action="txn_assign_article", entity_type="finance_transaction", entity_id=str(tx.id), payload={"kind": kind_enum.value, "article_id": aid})
-        desc = tx.description or ""
-    await call.message.answer("✅ Назначено. Создать правило маппинга (contains) автоматически?", reply_markup=yes_no_kb(prefix=f"mk_rule:{txid}:{kind}:{aid}"))
+        assigned = assign_cluster(session, sample_id=txid, tx_type=kind_enum, article_id=aid)
+        audit_log(session, actor_user_id=user.id, action="txn_assign_article", entity_type="finance_transaction", entity_id=str(txid), payload={"kind": kind_enum.value, "article_id": aid, "rows": assigned})
+    if not assigned:
+        await call.message.answer("Группа уже разобрана.")
+        await call.answer()
+        return
+    dashboard_changed()
+    await call.message.answer(f"✅ Назначено строк: {assigned}. Создать правило маппинга (contains) автоматически?", reply_markup=yes_no_kb(prefix=f"mk_rule:{txid}:{kind}:{aid}"))
     await call.answer()
 
 @router.callback_query(F.data.startswith("mk_rule:"))
@@ -1248,11 +1418,13 @@ async def make_rule(call: CallbackQuery, **data):
         rule = MappingRule(kind=kind_enum, pattern_type=PatternType.contains, pattern=pattern, priority=100, is_active=True, article_id=aid, created_by_user_id=user.id)
         session.add(rule)
         session.flush()
+        bump_version(session, RULES_VERSION)
         audit_log(session, actor_user_id=user.id, action="mapping_rule_add", entity_type="mapping_rule", entity_id=str(rule.id), payload={"kind": kind_enum.value, "pattern": pattern, "article_id": aid})
+    celery.send_task("apps.worker.tasks.reclassify_unknown_transactions", args=[[rule.id], call.message.chat.id])
     await call.message.answer(
         section_text(
             "Правило добавлено",
-            [f"contains '{pattern}' → {kind_enum.value} (article_id={aid})"],
+            [f"contains '{pattern}' → {kind_enum.value} (article_id={aid})", "Остальные неразобранные операции переразмечаются в фоне."],
             icon="✅",
         )
     )
@@ -1512,9 +1684,8 @@ async def dashboard_quick(message: Message, **data):
     ensure_role(user, {Role.Admin, Role.FinDir, Role.Viewer})
     period = "month"
     mode = "full"
-    start, end = _range_for(period)
+    snapshot = await to_thread(dashboard_snapshot, period, mode)
     with session_scope() as session:
-        text = _build_dashboard_text(session, start=start, end=end, mode=mode)
         audit_log(
             session,
             actor_user_id=user.id,
@@ -1524,7 +1695,7 @@ async def dashboard_quick(message: Message, **data):
             payload={"period": period, "mode": mode},
         )
     await message.answer(
-        f"<pre>{html.escape(text)}</pre>",
+        dashboard_html(snapshot),
         parse_mode="HTML",
         reply_markup=dashboard_period_kb(period, mode),
     )
@@ -1558,9 +1729,8 @@ async def dashboard_period_pick(call: CallbackQuery, **data):
     if current_period == period and current_mode == mode:
         await call.answer()
         return
-    start, end = _range_for(period)
+    snapshot = await to_thread(dashboard_snapshot, period, mode)
     with session_scope() as session:
-        text = _build_dashboard_text(session, start=start, end=end, mode=mode)
         audit_log(
             session,
             actor_user_id=user.id,
@@ -1570,17 +1740,70 @@ async def dashboard_period_pick(call: CallbackQuery, **data):
             payload={"period": period, "mode": mode},
         )
     if call.message:
+        live = False
+        if _active_dashboard_live(call.message):
+            # a live message keeps following whatever period/mode it is switched to
+            current = get_live(call.message.chat.id)
+            if current and current["message_id"] == call.message.message_id:
+                live = start_live(call.message.chat.id, call.message.message_id, period, mode, snapshot["text"])
         try:
             await call.message.edit_text(
-                f"<pre>{html.escape(text)}</pre>",
+                dashboard_html(snapshot),
                 parse_mode="HTML",
-                reply_markup=dashboard_period_kb(period, mode),
+                reply_markup=dashboard_period_kb(period, mode, live=live),
             )
         except TelegramBadRequest as exc:
             if "message is not modified" not in str(exc):
                 raise
     await call.answer()
 
+@router.callback_query(F.data.startswith("dashlive:"))
+async def dashboard_live_toggle(call: CallbackQuery, **data):
+    user = get_db_user(data, call.message)
+    ensure_role(user, {Role.Admin, Role.FinDir, Role.Viewer})
+    # dashlive:on|off:PERIOD:MODE
+    parts = (call.data or "").split(":")
+    if (
+        len(parts) != 4
+        or parts[1] not in {"on", "off"}
+        or parts[2] not in {"day", "week", "month", "year"}
+        or parts[3] not in {"summary", "full"}
+        or not call.message
+    ):
+        await call.answer("Неизвестное действие.", show_alert=False)
+        return
+    _prefix, action, period, mode = parts
+    chat_id = call.message.chat.id
+    if action == "on":
+        snapshot = await to_thread(dashboard_snapshot, period, mode)
+        if not start_live(chat_id, call.message.message_id, period, mode, snapshot["text"]):
+            await call.answer("Live-режим сейчас недоступен.", show_alert=True)
+            return
+        try:
+            await call.message.edit_text(
+                dashboard_html(snapshot),
+                parse_mode="HTML",
+                reply_markup=dashboard_period_kb(period, mode, live=True),
+            )
+        except TelegramBadRequest as exc:
+            if "message is not modified" not in str(exc):
+                raise
+        notice = "Live включен: сообщение обновляется само при изменении данных."
+    else:
+        stop_live(chat_id)
+        await call.message.edit_reply_markup(reply_markup=dashboard_period_kb(period, mode))
+        notice = "Live выключен."
+    with session_scope() as session:
+        audit_log(
+            session,
+            actor_user_id=user.id,
+            action="dashboard_live",
+            entity_type="pnl",
+            entity_id=_dashboard_period_label(period),
+            payload={"live": action == "on", "period": period, "mode": mode, "chat_id": chat_id},
+        )
+    await call.answer(notice)
+
 @router.message(F.text == "Контрагенты/Задолженность (снимки)")
 async def cp_report(message: Message, state: FSMContext, **data):
     # not in keyboard by default; kept for compatibility
@@ -1593,7 +1816,7 @@ async def cp_summary(message: Message, state: FSMContext, **data):
     user = get_db_user(data, message)
     ensure_role(user, {Role.Admin, Role.FinDir, Role.Viewer})
     with session_scope() as session:
-        snap = session.query(CounterpartySnapshot).order_by(CounterpartySnapshot.id.desc()).first()
+        snap = latest_counterparty_snapshot(session)
         if not snap:
             await message.answer(section_text("Контрагенты и задолженность", ["Нет снимков взаиморасчетов."], icon="🤝", hint="Загрузите XLSX взаиморасчетов в разделе финансов."))
             return
@@ -1631,7 +1854,7 @@ async def cp_card(message: Message, state: FSMContext, **data):
         await message.answer("Введите название контрагента или 'отмена'.")
         return
     with session_scope() as session:
-        snap = session.query(CounterpartySnapshot).order_by(CounterpartySnapshot.id.desc()).first()
+        snap = latest_counterparty_snapshot(session)
         if not snap:
             await message.answer(section_text("Карточка контрагента", ["Нет снимков взаиморасчетов."], icon="🤝", hint="Сначала загрузите XLSX взаиморасчетов."))
             await state.clear()
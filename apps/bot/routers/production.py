@@ -25,6 +25,7 @@ from kbeton.services.production import (
     shift_line_from_outputs,
 )
 
+from apps.bot.dashboard import dashboard_changed
 from apps.bot.keyboards import (
     production_menu,
     shift_type_kb,
@@ -674,6 +675,7 @@ async def shift_approve(call: CallbackQuery, **data):
     with session_scope() as session:
         result = approve_shift(session, shift_id=shift_id, actor_user_id=user.id)
     if result.approved:
+        dashboard_changed()
         lines = [f"✅ Смена {result.shift_id} согласована."]
     else:
         lines = [f"❌ Смена {result.shift_id} не согласована."]
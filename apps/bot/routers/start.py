@@ -6,7 +6,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
 
 from apps.bot.keyboards import main_menu, finance_menu, production_menu, warehouse_menu, admin_menu
-from apps.bot.utils import get_db_user, ensure_role
+from apps.bot.utils import discard_pending_upload, get_db_user, ensure_role
 from kbeton.models.enums import Role
 from kbeton.db.session import session_scope
 from kbeton.models.user import User
@@ -99,6 +99,7 @@ async def show_ids(message: Message, **data):
 @router.message(F.text == "❌ Отмена")
 @router.message(F.text == "🏠 Главное меню")
 async def cancel_text(message: Message, state: FSMContext, **data):
+    await discard_pending_upload(state)
     await state.clear()
     user = get_db_user(data, message)
     await message.answer("Главное меню:", reply_markup=main_menu(user.role))
@@ -107,6 +108,7 @@ async def cancel_text(message: Message, state: FSMContext, **data):
 async def back(message: Message, state: FSMContext, **data):
     user = get_db_user(data, message)
     state_name = await state.get_state()
+    await discard_pending_upload(state)
     await state.clear()
     title, markup = _state_menu(state_name, user.role)
     await message.answer(title, reply_markup=markup)
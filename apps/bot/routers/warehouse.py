@@ -13,6 +13,7 @@ from kbeton.services.audit import audit_log
 from kbeton.services.s3 import put_bytes
 
 from apps.bot.states import InventoryTxnState, InventoryAdjustState
+from apps.bot.dashboard import dashboard_changed
 from apps.bot.keyboards import pager_kb
 from apps.bot.ui import list_text, section_text, wizard_text
 from apps.bot.utils import get_db_user, ensure_role
@@ -240,6 +241,7 @@ async def txn_finish(message: Message, state: FSMContext, **data):
         uom = it.uom
         name = it.name
 
+    dashboard_changed()
     await state.clear()
     await message.answer(section_text("Складская операция выполнена", [f"{name}: остаток {bal_qty:.3f} {uom}"], icon="✅"))
 
@@ -302,6 +304,7 @@ async def receipt_invoice_photo(message: Message, state: FSMContext, **data):
         uom = it.uom
         name = it.name
 
+    dashboard_changed()
     await state.clear()
     approval_note = (
         "\n🕒 Расход отправлен на согласование финдиром и попадет в P&L после подтверждения."
@@ -414,5 +417,6 @@ async def inv_finish(message: Message, state: FSMContext, **data):
         _apply_balance(session, item_id=item_id, delta=delta)
         audit_log(session, actor_user_id=user.id, action="inventory_adjust", entity_type="inventory_item", entity_id=str(item_id), payload={"old": old, "new": fact_qty, "delta": delta})
         bal2 = session.query(InventoryBalance).filter(InventoryBalance.item_id == item_id).one()
+    dashboard_changed()
     await state.clear()
     await message.answer(section_text("Инвентаризация завершена", [f"{it.name}: было {old:.3f} → стало {float(bal2.qty):.3f} {it.uom}"], icon="✅"))
@@ -4,6 +4,10 @@ from aiogram.fsm.state import State, StatesGroup
 class CounterpartyUploadState(StatesGroup):
     waiting_file = State()
 
+class FinanceUploadState(StatesGroup):
+    waiting_file = State()
+    waiting_confirm = State()
+
 class CounterpartyCardState(StatesGroup):
     waiting_name = State()
 
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
+import structlog
+
 from kbeton.models.user import User
 from kbeton.models.enums import Role
 from kbeton.db.session import session_scope
 from kbeton.services.auth import get_or_create_user
+from kbeton.services.s3 import delete_object
+
+log = structlog.get_logger(__name__)
 
 def _extract_full_name(tg_user) -> str:
     first = getattr(tg_user, "first_name", "") or ""
@@ -71,3 +76,13 @@ def ensure_role(user: User, allowed: set[Role]) -> None:
         return
     if user.role not in allowed:
         raise PermissionError("Access denied")
+
+async def discard_pending_upload(state) -> None:
+    """Delete a finance upload that was stored for its preview but never confirmed."""
+    key = (await state.get_data()).get("finance_import_key")
+    if not key:
+        return
+    try:
+        delete_object(key)
+    except Exception as e:
+        log.warning("pending_upload_delete_failed", key=key, error=str(e))
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 from celery import Celery
 from celery.schedules import crontab
+from kombu import Queue
 
 from kbeton.core.config import settings
 from kbeton.core.logging import configure_logging
+from kbeton.services.dashboard_snapshots import DASHBOARD_REFRESH_SECONDS
 
 configure_logging(settings.log_level)
 
@@ -15,10 +17,41 @@ celery = Celery(
     include=["apps.worker.tasks"],
 )
 
+# Workload classes get their own queues and worker pools (see docker-compose.yml):
+# - imports: CPU/memory heavy parsing, prefetch 1, acks_late so a lost worker re-delivers;
+# - reports: scheduled P&L / production reports;
+# - notifications: short, latency-sensitive alerts that must not wait behind imports.
+IMPORTS_QUEUE = "imports"
+REPORTS_QUEUE = "reports"
+NOTIFICATIONS_QUEUE = "notifications"
+
 celery.conf.update(
     timezone=settings.tz,
     enable_utc=False,
     task_track_started=True,
+    task_queues=(
+        Queue(IMPORTS_QUEUE),
+        Queue(REPORTS_QUEUE),
+        Queue(NOTIFICATIONS_QUEUE),
+    ),
+    task_default_queue=REPORTS_QUEUE,
+    task_routes={
+        "apps.worker.tasks.process_counterparty_import": {"queue": IMPORTS_QUEUE},
+        "apps.worker.tasks.process_finance_import": {"queue": IMPORTS_QUEUE},
+        "apps.worker.tasks.process_finance_batch": {"queue": IMPORTS_QUEUE},
+        "apps.worker.tasks.finalize_finance_batch": {"queue": IMPORTS_QUEUE},
+        "apps.worker.tasks.finalize_failed_finance_batch": {"queue": IMPORTS_QUEUE},
+        "apps.worker.tasks.reclassify_unknown_transactions": {"queue": IMPORTS_QUEUE},
+        "apps.worker.tasks.send_daily_pnl": {"queue": REPORTS_QUEUE},
+        "apps.worker.tasks.refresh_dashboards": {"queue": REPORTS_QUEUE},
+        "apps.worker.tasks.send_daily_production": {"queue": REPORTS_QUEUE},
+        "apps.worker.tasks.check_inventory_alerts": {"queue": NOTIFICATIONS_QUEUE},
+        "apps.worker.tasks.send_telegram_message": {"queue": NOTIFICATIONS_QUEUE},
+        "apps.worker.tasks.update_live_dashboard": {"queue": NOTIFICATIONS_QUEUE},
+    },
+    # Redis re-delivers unacked (acks_late) messages after the visibility timeout;
+    # it has to be longer than the slowest import, otherwise it would run twice.
+    broker_transport_options={"visibility_timeout": 6 * 3600},
 )
 
 # Scheduled jobs (Asia/Bishkek by default)
@@ -27,6 +60,10 @@ celery.conf.beat_schedule = {
         "task": "apps.worker.tasks.send_daily_pnl",
         "schedule": crontab(hour=9, minute=0),
     },
+    "refresh-dashboards": {
+        "task": "apps.worker.tasks.refresh_dashboards",
+        "schedule": float(DASHBOARD_REFRESH_SECONDS),
+    },
     "inventory-alerts-0830": {
         "task": "apps.worker.tasks.check_inventory_alerts",
         "schedule": crontab(hour=8, minute=30),
@@ -1,24 +1,41 @@
 from __future__ import annotations
 
+import time
+import uuid
 from datetime import date, datetime, timedelta
 import httpx
+import structlog
 
-from celery import shared_task
+from celery import chord, current_app, group, shared_task
 from sqlalchemy import select
 
 from kbeton.core.config import settings
 from kbeton.db.session import session_scope
-from kbeton.importers.counterparties_importer import parse_counterparties_xlsx
+from kbeton.importers.batch import BatchPart, split_finance_batch
+from kbeton.importers.counterparties_importer import iter_counterparty_rows
+from kbeton.importers.estimate import estimate_rows
+from kbeton.importers.finance_formats import finance_content_type, iter_finance_file
+from kbeton.importers.utils import ParseTimer, peak_rss_mb
 from kbeton.models.finance import ImportJob
-from kbeton.models.counterparty import CounterpartySnapshot, CounterpartyBalance
 from kbeton.models.inventory import InventoryItem, InventoryBalance
 from kbeton.models.user import User
 from kbeton.models.enums import Role, ShiftStatus, ProductType
 from kbeton.models.production import ProductionShift, ProductionOutput
-from kbeton.services.s3 import get_bytes
+from kbeton.services.s3 import get_bytes, put_bytes
 from kbeton.services.audit import audit_log
-from kbeton.reports.pnl import pnl as pnl_calc
-from kbeton.reports.export_xlsx import pnl_to_xlsx
+from kbeton.services.counterparties import discard_counterparty_import, import_counterparty_rows
+from kbeton.services.finance_import import discard_finance_import, import_finance_rows
+from kbeton.services.import_jobs import aggregate_batch_summary, batch_children, reset_progress
+from kbeton.services.import_progress import ProgressReporter
+from kbeton.services.mapping import get_rule_engine
+from kbeton.services.reclassify import reclassify_unknown
+from kbeton.services.rule_stats import flush_rule_stats
+from kbeton.services.pnl_cache import pnl_cache
+from kbeton.services.dashboard_snapshots import dashboard_html, dashboard_reply_markup, materialize_dashboards, read_dashboard, request_dashboard_refresh
+from kbeton.services.live_dashboard import mark_live_edited, schedule_live_updates, stop_live, take_live, text_hash
+
+
+log = structlog.get_logger(__name__)
 
 def tg_send_message(chat_id: int, text: str) -> None:
     if not settings.telegram_bot_token:
@@ -36,7 +53,21 @@ def tg_send_document(chat_id: int, filename: str, data: bytes, caption: str = ""
     with httpx.Client(timeout=30) as client:
         client.post(url, data=data_payload, files=files)
 
+def tg_edit_message(chat_id: int, message_id: int, html_text: str, reply_markup: dict | None = None) -> dict:
+    """editMessageText; returns Telegram's JSON reply (ok/description) so the caller can react to 400s."""
+    if not settings.telegram_bot_token:
+        return {"ok": False, "description": "no bot token"}
+    url = f"https://api.telegram.org/bot{settings.telegram_bot_token}/editMessageText"
+    payload = {"chat_id": chat_id, "message_id": message_id, "text": html_text, "parse_mode": "HTML"}
+    if reply_markup is not None:
+        payload["reply_markup"] = reply_markup
+    with httpx.Client(timeout=10) as client:
+        return client.post(url, json=payload).json()
+
 def _notify_import(session, job: ImportJob, text: str, include_default: bool = False) -> None:
+    if job.parent_id:
+        # parts of a batch upload are reported once, by finalize_finance_batch
+        return
     chat_ids: set[int] = set()
     if job.created_by_user_id:
         user = session.get(User, job.created_by_user_id)
@@ -45,54 +76,279 @@ def _notify_import(session, job: ImportJob, text: str, include_default: bool = F
     if include_default and settings.telegram_default_chat_id:
         chat_ids.add(int(settings.telegram_default_chat_id))
     for cid in chat_ids:
-        tg_send_message(cid, text)
+        # Sent from the notifications pool so the message is not held up by the import worker.
+        send_telegram_message.delay(cid, text)
+
+@shared_task(name="apps.worker.tasks.send_telegram_message", autoretry_for=(httpx.HTTPError,), retry_backoff=True, max_retries=3)
+def send_telegram_message(chat_id: int, text: str) -> None:
+    tg_send_message(chat_id, text)
+
+def _flush_rule_stats() -> None:
+    # Own transaction: a failed stats write must not undo the import that produced it.
+    try:
+        with session_scope() as session:
+            flush_rule_stats(session)
+    except Exception as e:
+        log.warning("rule_stats_flush_failed", error=str(e))
+
+def _dashboard_changed() -> None:
+    # Best effort: a lost refresh request is covered by the beat schedule.
+    try:
+        request_dashboard_refresh(current_app)
+    except Exception as e:
+        log.warning("dashboard_refresh_request_failed", error=str(e))
+
+def _start_import(session, import_job_id: int) -> ImportJob:
+    job = session.execute(select(ImportJob).where(ImportJob.id == import_job_id)).scalar_one()
+    if job.status != "done":
+        job.status = "processing"
+        session.commit()
+    return job
 
-@shared_task(name="apps.worker.tasks.process_counterparty_import")
+def _fail_import(session, import_job_id: int, discard, error: Exception) -> ImportJob:
+    # Chunks committed before the error are removed so a failed job leaves no partial data,
+    # and with them the resume cursor: a redelivered run must not skip the discarded rows.
+    session.rollback()
+    job = session.get(ImportJob, import_job_id)
+    if discard is not None:
+        discard(session, job)
+        reset_progress(job)
+    job.status = "failed"
+    job.error = str(error)
+    return job
+
+@shared_task(name="apps.worker.tasks.process_counterparty_import", acks_late=True, reject_on_worker_lost=True)
 def process_counterparty_import(import_job_id: int) -> dict:
     with session_scope() as session:
-        job = session.execute(select(ImportJob).where(ImportJob.id == import_job_id)).scalar_one()
-        job.status = "processing"
-        session.flush()
+        job = _start_import(session, import_job_id)
+        if job.status == "done":
+            return {"ok": True, **(job.summary or {})}
 
+        timer = ParseTimer()
         try:
             xlsx = get_bytes(job.s3_key)
-            rows = parse_counterparties_xlsx(xlsx)
+            progress = ProgressReporter(job.id, total_estimate=estimate_rows(job.filename, xlsx))
+            progress.update({"rows": 0})
+            rows = timer.wrap(iter_counterparty_rows(xlsx))
+            result = import_counterparty_rows(session, job=job, rows=rows, snapshot_date=date.today(), commit_chunks=True, on_chunk=progress.update)
         except Exception as e:
-            job.status = "failed"
-            job.error = str(e)
+            ProgressReporter(import_job_id).finish("failed", error=str(e))
+            job = _fail_import(session, import_job_id, discard_counterparty_import, e)
             audit_log(session, actor_user_id=job.created_by_user_id, action="counterparty_import_failed", entity_type="import_job", entity_id=str(job.id), payload={"error": str(e)})
             _notify_import(session, job, f"❌ Импорт контрагентов #{job.id} не выполнен.\nОшибка: {e}", include_default=True)
             return {"ok": False, "error": str(e)}
 
-        snap_date = date.today()
-        snap = CounterpartySnapshot(snapshot_date=snap_date, import_job_id=job.id)
-        session.add(snap)
-        session.flush()
-
-        session.query(CounterpartyBalance).filter(CounterpartyBalance.snapshot_id == snap.id).delete()
-
-        for r in rows:
-            session.add(CounterpartyBalance(
-                snapshot_id=snap.id,
-                counterparty_name=r.counterparty_name,
-                counterparty_name_norm=r.counterparty_name_norm,
-                receivable_money=r.receivable_money,
-                receivable_assets=r.receivable_assets,
-                payable_money=r.payable_money,
-                payable_assets=r.payable_assets,
-                ending_balance_money=r.ending_balance_money,
-            ))
         job.status = "done"
         job.processed_at = datetime.now().astimezone()
-        job.summary = {"rows": len(rows), "snapshot_date": snap_date.isoformat()}
+        job.summary = {
+            "rows": result["rows"],
+            "snapshot_date": result["snapshot_date"],
+            "parse_seconds": round(timer.seconds, 3),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        progress.finish("done", job.summary)
         audit_log(session, actor_user_id=job.created_by_user_id, action="counterparty_import_done", entity_type="import_job", entity_id=str(job.id), payload=job.summary)
         _notify_import(
             session,
             job,
-            f"✅ Импорт контрагентов завершен (#{job.id}).\nrows={len(rows)}, snapshot_date={snap_date.isoformat()}",
+            f"✅ Импорт контрагентов завершен (#{job.id}).\nrows={result['rows']}, snapshot_date={result['snapshot_date']}",
+            include_default=False,
+        )
+        result = {"ok": True, **job.summary}
+    _dashboard_changed()
+    return result
+
+@shared_task(name="apps.worker.tasks.process_finance_import", acks_late=True, reject_on_worker_lost=True)
+def process_finance_import(import_job_id: int) -> dict:
+    with session_scope() as session:
+        job = _start_import(session, import_job_id)
+        if job.status == "done":
+            return {"ok": True, **(job.summary or {})}
+
+        timer = ParseTimer()
+        try:
+            content = get_bytes(job.s3_key)
+            sheet_name = job.sheet_name or None
+            progress = ProgressReporter(job.id, total_estimate=estimate_rows(job.filename, content, sheet_name=sheet_name))
+            progress.update({"rows": 0})
+            rows = timer.wrap(iter_finance_file(job.filename, content, sheet_name=sheet_name))
+            memo = get_rule_engine(session).memo
+            memo_before = (memo.hits, memo.misses)
+            summary = import_finance_rows(session, job=job, rows=rows, commit_chunks=True, on_chunk=progress.update)
+        except Exception as e:
+            ProgressReporter(import_job_id).finish("failed", error=str(e))
+            job = _fail_import(session, import_job_id, discard_finance_import, e)
+            audit_log(session, actor_user_id=job.created_by_user_id, action="finance_import_failed", entity_type="import_job", entity_id=str(job.id), payload={"error": str(e)})
+            _notify_import(session, job, f"❌ Импорт выписки #{job.id} не выполнен.\nОшибка: {e}", include_default=True)
+            return {"ok": False, "error": str(e)}
+
+        job.status = "done"
+        job.processed_at = datetime.now().astimezone()
+        summary["parse_seconds"] = round(timer.seconds, 3)
+        summary["peak_rss_mb"] = peak_rss_mb()
+        summary["memo_hits"] = memo.hits - memo_before[0]
+        summary["memo_misses"] = memo.misses - memo_before[1]
+        job.summary = summary
+        progress.finish("done", summary)
+        audit_log(session, actor_user_id=job.created_by_user_id, action="finance_import_done", entity_type="import_job", entity_id=str(job.id), payload=job.summary)
+        _notify_import(
+            session,
+            job,
+            f"✅ Импорт выписки завершен (#{job.id}).\n"
+            f"rows={summary['rows']}, inserted={summary['inserted']}, "
+            f"duplicates={summary['duplicates']}, unknown={summary['unknown']}",
             include_default=False,
         )
-        return {"ok": True, **job.summary}
+        result = {"ok": True, **job.summary}
+    _flush_rule_stats()
+    _dashboard_changed()
+    return result
+
+@shared_task(name="apps.worker.tasks.process_finance_batch", acks_late=True, reject_on_worker_lost=True)
+def process_finance_batch(import_job_id: int) -> dict:
+    """Fan a ZIP / multi-sheet upload out as one finance import per part; the
+    chord callback aggregates the parts into the parent job."""
+    with session_scope() as session:
+        parent = _start_import(session, import_job_id)
+        if parent.status == "done":
+            return {"ok": True, **(parent.summary or {})}
+
+        children = batch_children(session, parent)
+        if not children:
+            try:
+                content = get_bytes(parent.s3_key)
+                parts = split_finance_batch(parent.filename, content)
+                if not parts:
+                    parts = [BatchPart(parent.filename, "", None)]
+                member_keys: dict[int, str] = {}  # sheets of one ZIP member share its bytes and its upload
+                for part in parts:
+                    key = parent.s3_key
+                    if part.data is not None:
+                        key = member_keys.get(id(part.data))
+                        if key is None:
+                            key = f"imports/finance/{uuid.uuid4().hex}_{part.filename}"
+                            put_bytes(key, part.data, content_type=finance_content_type(part.filename))
+                            member_keys[id(part.data)] = key
+                    session.add(ImportJob(
+                        kind="finance",
+                        status="pending",
+                        filename=part.filename,
+                        sheet_name=part.sheet_name,
+                        s3_key=key,
+                        parent_id=parent.id,
+                        created_by_user_id=parent.created_by_user_id,
+                    ))
+                session.flush()
+                children = batch_children(session, parent)
+                parent.summary = {"parts": len(children)}
+                session.commit()
+            except Exception as e:
+                ProgressReporter(import_job_id).finish("failed", error=str(e))
+                parent = _fail_import(session, import_job_id, None, e)
+                audit_log(session, actor_user_id=parent.created_by_user_id, action="finance_import_failed", entity_type="import_job", entity_id=str(parent.id), payload={"error": str(e)})
+                _notify_import(session, parent, f"❌ Пакетный импорт #{parent.id} не выполнен.\nОшибка: {e}", include_default=True)
+                return {"ok": False, "error": str(e)}
+
+        pending = [c.id for c in children if c.status != "done"]
+        ProgressReporter(parent.id, total_estimate=None).update({"rows": 0})
+
+    finalize = _batch_callback(import_job_id)
+    if pending:
+        chord(group(process_finance_import.si(cid) for cid in pending))(finalize)
+    else:
+        finalize.delay()
+    return {"ok": True, "parts": len(children), "queued": len(pending)}
+
+def _batch_callback(import_job_id: int):
+    # A part that raises outside its own error handling fails the chord, and the
+    # callback is then never called: the errback finalizes the parent instead.
+    return finalize_finance_batch.si(import_job_id).on_error(finalize_failed_finance_batch.si(import_job_id))
+
+@shared_task(name="apps.worker.tasks.finalize_failed_finance_batch")
+def finalize_failed_finance_batch(import_job_id: int) -> dict:
+    """Chord errback: parts left unfinished are failed (their committed chunks
+    discarded), then the parent is finalized like after a clean run."""
+    with session_scope() as session:
+        parent = session.get(ImportJob, import_job_id)
+        for child in batch_children(session, parent):
+            if child.status in ("done", "failed"):
+                continue
+            error = RuntimeError("обработка части прервана")
+            ProgressReporter(child.id).finish("failed", error=str(error))
+            _fail_import(session, child.id, discard_finance_import, error)
+            session.commit()
+    return finalize_finance_batch(import_job_id)
+
+@shared_task(name="apps.worker.tasks.finalize_finance_batch")
+def finalize_finance_batch(import_job_id: int) -> dict:
+    with session_scope() as session:
+        parent = session.get(ImportJob, import_job_id)
+        status, summary = aggregate_batch_summary(batch_children(session, parent))
+        parent.status = status
+        parent.processed_at = datetime.now().astimezone()
+        parent.summary = summary
+        if status == "failed":
+            parent.error = "; ".join(f"{p['file']}: {p['error']}" for p in summary["items"] if p["error"])[:2000]
+        ProgressReporter(parent.id).finish(status, summary, error=parent.error)
+        audit_log(session, actor_user_id=parent.created_by_user_id, action=f"finance_import_{status}", entity_type="import_job", entity_id=str(parent.id), payload={k: v for k, v in summary.items() if k != "items"})
+        _notify_import(
+            session,
+            parent,
+            f"{'✅' if status == 'done' else '❌'} Пакетный импорт #{parent.id}: частей {summary['parts']}, с ошибкой {summary['failed_parts']}.\n"
+            f"rows={summary['rows']}, inserted={summary['inserted']}, "
+            f"duplicates={summary['duplicates']}, unknown={summary['unknown']}",
+            include_default=status == "failed",
+        )
+        result = {"ok": status == "done", **summary}
+    _dashboard_changed()
+    return result
+
+@shared_task(name="apps.worker.tasks.reclassify_unknown_transactions", acks_late=True, reject_on_worker_lost=True)
+def reclassify_unknown_transactions(rule_ids: list[int] | None = None, chat_id: int | None = None) -> dict:
+    # Only touches rows that are still unknown, so a re-delivered run is harmless.
+    started = time.perf_counter()
+    with session_scope() as session:
+        result = reclassify_unknown(session, rule_ids=rule_ids, commit_chunks=True)
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        audit_log(session, actor_user_id=None, action="finance_reclassify", entity_type="mapping_rule", entity_id=",".join(map(str, rule_ids or [])), payload=result)
+    _flush_rule_stats()
+    if result["classified"]:
+        _dashboard_changed()
+    if chat_id and result["classified"]:
+        lines = [f"🔁 Переразметка: {result['classified']} неразобранных операций получили статью ({result['seconds']} с)."]
+        lines += [f"• правило #{rule_id}: {n}" for rule_id, n in result["by_rule"].items()]
+        send_telegram_message.delay(chat_id, "\n".join(lines))
+    return {"ok": True, **result}
+
+@shared_task(name="apps.worker.tasks.refresh_dashboards")
+def refresh_dashboards() -> dict:
+    started = time.perf_counter()
+    with session_scope() as session:
+        written = materialize_dashboards(session, session_factory=session_scope)
+    live = schedule_live_updates(current_app)
+    return {"ok": True, "snapshots": written, "live": live, "seconds": round(time.perf_counter() - started, 3)}
+
+@shared_task(name="apps.worker.tasks.update_live_dashboard", autoretry_for=(httpx.HTTPError,), retry_backoff=True, max_retries=3)
+def update_live_dashboard(chat_id: int) -> dict:
+    live = take_live(chat_id)
+    if live is None:
+        return {"ok": True, "edited": False, "reason": "not live"}
+    snapshot = read_dashboard(live["period"], live["mode"])
+    if snapshot is None:
+        return {"ok": True, "edited": False, "reason": "no snapshot"}  # the next refresh brings one
+    # Compared on the dashboard body: the "as of" footer alone is not worth an edit.
+    if text_hash(snapshot["text"]) == live["hash"]:
+        return {"ok": True, "edited": False, "reason": "unchanged"}
+    markup = dashboard_reply_markup(live["period"], live["mode"], live=True)
+    reply = tg_edit_message(chat_id, live["message_id"], dashboard_html(snapshot), markup)
+    description = reply.get("description") or ""
+    if not reply.get("ok") and "not modified" not in description:
+        if "not found" in description or "can't be edited" in description:
+            stop_live(chat_id)  # the message was deleted; stop following it
+        log.warning("live_dashboard_edit_failed", chat_id=chat_id, error=description)
+        return {"ok": False, "edited": False, "reason": description}
+    mark_live_edited(chat_id, live, snapshot["text"])
+    return {"ok": True, "edited": True}
 
 @shared_task(name="apps.worker.tasks.send_daily_pnl")
 def send_daily_pnl() -> dict:
@@ -107,9 +363,9 @@ def send_daily_pnl() -> dict:
         for u in admins:
             if u.tg_id:
                 chat_ids.add(int(u.tg_id))
-        rows, meta = pnl_calc(session, start=start, end=end, period="day")
+        rows, meta = pnl_cache.report(session, start=start, end=end, period="day")
         text = f"📈 P&L за {today.isoformat()}\nДоход: {meta['total_income']:.2f}\nРасход: {meta['total_expense']:.2f}\nЧистая прибыль: {meta['total_net']:.2f}\nНеразобранное: {meta.get('unknown_count', 0)}"
-        xlsx = pnl_to_xlsx(rows, period="day", start=start, end=end, totals=meta)
+        xlsx = pnl_cache.xlsx(session, start=start, end=end, period="day", report=(rows, meta))
     if not chat_ids:
         return {"ok": False, "error": "No recipients for daily P&L"}
     for cid in chat_ids:
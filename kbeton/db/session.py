@@ -5,6 +5,9 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 
 from kbeton.core.config import settings
+# registers the finance_daily_agg / finance_channel_balances listeners on
+# FinanceTransaction for every app and script that writes through session_scope
+import kbeton.services.finance_agg  # noqa: F401
 
 engine = create_engine(settings.database_url, pool_pre_ping=True, pool_size=5, max_overflow=10)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
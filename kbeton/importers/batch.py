@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import io
+import os
+import zipfile
+from typing import NamedTuple
+
+from openpyxl import load_workbook
+
+from kbeton.importers.finance_formats import finance_file_ext
+from kbeton.importers.finance_importer import bytes_to_filelike, header_columns
+
+MAX_BATCH_PARTS = 100
+MAX_BATCH_MEMBER_BYTES = 100 * 1024 * 1024  # uncompressed, per file in a ZIP
+
+class BatchPart(NamedTuple):
+    filename: str
+    sheet_name: str
+    data: bytes | None  # None: the part lives in the uploaded file itself
+
+    @property
+    def title(self) -> str:
+        return f"{self.filename} [{self.sheet_name}]" if self.sheet_name else self.filename
+
+def is_batch_upload(filename: str) -> bool:
+    return os.path.splitext(filename or "")[1].lower() == ".zip"
+
+def _statement_sheets(data: bytes) -> list[str]:
+    """Sheets whose finance header is detected; covers, summaries and other
+    auxiliary sheets are left out."""
+    wb = load_workbook(filename=bytes_to_filelike(data), read_only=True, data_only=True)
+    try:
+        sheets = []
+        for ws in wb.worksheets:
+            try:
+                header_columns(ws.iter_rows(values_only=True))
+            except ValueError:
+                continue
+            sheets.append(ws.title)
+        return sheets
+    finally:
+        wb.close()
+
+def _sheet_parts(filename: str, data: bytes, member: bytes | None) -> list[BatchPart] | None:
+    # One part per statement sheet; with fewer than two the workbook is a
+    # single statement read from its active sheet, as a plain upload always was.
+    sheets = _statement_sheets(data)
+    if len(sheets) < 2:
+        return None
+    return [BatchPart(filename, sheet, member) for sheet in sheets]
+
+def _zip_member_name(info: zipfile.ZipInfo) -> str:
+    name = info.filename
+    if not info.flag_bits & 0x800:
+        # no UTF-8 flag: Windows archivers store cp866 names, zipfile decoded them as cp437
+        try:
+            name = name.encode("cp437").decode("cp866")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            pass
+    return os.path.basename(name)
+
+def split_finance_batch(filename: str, data: bytes) -> list[BatchPart] | None:
+    """Parts of a batch upload: one per statement file in a ZIP and one per
+    statement sheet of a multi-sheet workbook. None for a plain single statement."""
+    if is_batch_upload(filename):
+        parts: list[BatchPart] = []
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            for info in zf.infolist():
+                name = _zip_member_name(info)
+                if info.is_dir() or name.startswith(".") or "__MACOSX" in info.filename or finance_file_ext(name) is None:
+                    continue
+                if info.file_size > MAX_BATCH_MEMBER_BYTES:
+                    raise ValueError(f"{name}: file is too large ({info.file_size // (1024 * 1024)} MB, max {MAX_BATCH_MEMBER_BYTES // (1024 * 1024)} MB)")
+                member = zf.read(info)
+                # sheet parts of one workbook share the same bytes, stored once
+                sheet_parts = _sheet_parts(name, member, member) if finance_file_ext(name) == ".xlsx" else None
+                parts.extend(sheet_parts or [BatchPart(name, "", member)])
+        if not parts:
+            raise ValueError("ZIP archive contains no .xlsx/.txt/.csv statements")
+    elif finance_file_ext(filename) == ".xlsx":
+        parts = _sheet_parts(filename, data, None)
+        if parts is None:
+            return None
+    else:
+        return None
+    if len(parts) > MAX_BATCH_PARTS:
+        raise ValueError(f"Too many statements in one upload: {len(parts)} (max {MAX_BATCH_PARTS})")
+    return parts
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Iterator
+
 from openpyxl import load_workbook
 
-from kbeton.importers.utils import norm_header, parse_date, parse_money, norm_counterparty_name
+from kbeton.importers.utils import iter_chunks, json_safe_cell, money_column_converter, norm_counterparty_name, norm_header
+
+CONVERT_BLOCK_SIZE = 512
 
 @dataclass
 class CounterpartyRow:
@@ -29,42 +34,80 @@ def bytes_to_filelike(data: bytes):
     from io import BytesIO
     return BytesIO(data)
 
-def _find_header_row(rows: list[list[object]], max_scan: int = 20) -> tuple[int, dict[str, int]]:
-    for i in range(min(max_scan, len(rows))):
-        r = rows[i]
-        headers = [norm_header(str(c)) if c is not None else "" for c in r]
-        idx_map: dict[str, int] = {}
-        for field, syns in CP_HEADER_SYNONYMS.items():
-            for col_i, h in enumerate(headers):
-                if h in syns:
-                    idx_map[field] = col_i
-                    break
-        if "counterparty_name" in idx_map and ("ending_balance_money" in idx_map or "receivable_money" in idx_map or "payable_money" in idx_map):
+def _header_map(r) -> dict[str, int] | None:
+    headers = [norm_header(str(c)) if c is not None else "" for c in r]
+    idx_map: dict[str, int] = {}
+    for field, syns in CP_HEADER_SYNONYMS.items():
+        for col_i, h in enumerate(headers):
+            if h in syns:
+                idx_map[field] = col_i
+                break
+    if "counterparty_name" in idx_map and ("ending_balance_money" in idx_map or "receivable_money" in idx_map or "payable_money" in idx_map):
+        return idx_map
+    return None
+
+def _find_header_row(rows: Iterator[tuple], max_scan: int = 20) -> tuple[int, dict[str, int]]:
+    # Consumes at most max_scan rows; data rows continue from the same iterator.
+    for i, r in enumerate(islice(rows, max_scan)):
+        if r is None:
+            continue
+        idx_map = _header_map(r)
+        if idx_map is not None:
             return i, idx_map
     raise ValueError("Cannot detect header row for counterparties import")
 
-def parse_counterparties_xlsx(data: bytes) -> list[CounterpartyRow]:
-    wb = load_workbook(filename=bytes_to_filelike(data), data_only=True)
-    ws = wb.active
-    rows = list(ws.iter_rows(values_only=True))
-    header_idx, idx_map = _find_header_row(rows)
-    out: list[CounterpartyRow] = []
-
-    for r in rows[header_idx + 1 :]:
-        if r is None or all(c is None or str(c).strip() == "" for c in r):
+def _cell(r, idx_map: dict[str, int], field: str):
+    i = idx_map.get(field)
+    if i is None or i >= len(r):
+        return None
+    return r[i]
+
+def _text(r, idx_map: dict[str, int], field: str) -> str:
+    v = _cell(r, idx_map, field)
+    return str(v).strip() if v is not None else ""
+
+MONEY_FIELDS = ("receivable_money", "payable_money", "ending_balance_money")
+
+def _is_blank(r) -> bool:
+    return r is None or all(c is None or str(c).strip() == "" for c in r)
+
+def _to_counterparty_row(r, idx_map: dict[str, int], money: dict[str, float]) -> CounterpartyRow:
+    raw = {str(i): json_safe_cell(c) for i, c in enumerate(r)}
+    name = _text(r, idx_map, "counterparty_name")
+    return CounterpartyRow(
+        counterparty_name=name,
+        counterparty_name_norm=norm_counterparty_name(name),
+        receivable_money=money["receivable_money"],
+        receivable_assets=_text(r, idx_map, "receivable_assets"),
+        payable_money=money["payable_money"],
+        payable_assets=_text(r, idx_map, "payable_assets"),
+        ending_balance_money=money["ending_balance_money"],
+        raw_fields=raw,
+    )
+
+def convert_counterparty_rows(rows: Iterator, idx_map: dict[str, int], *, block_size: int = CONVERT_BLOCK_SIZE) -> Iterator[CounterpartyRow]:
+    """Money columns get a number locale detected once from the first block."""
+    converters: dict[str, Callable[[object], float]] = {}
+    for block in iter_chunks(rows, block_size):
+        block = [r for r in block if not _is_blank(r)]
+        if not block:
             continue
-        raw = {str(i): (c if c is not None else "") for i, c in enumerate(r)}
-        name = str(r[idx_map["counterparty_name"]]).strip() if r[idx_map["counterparty_name"]] is not None else ""
-        out.append(
-            CounterpartyRow(
-                counterparty_name=name,
-                counterparty_name_norm=norm_counterparty_name(name),
-                receivable_money=parse_money(r[idx_map["receivable_money"]]) if "receivable_money" in idx_map else 0.0,
-                receivable_assets=str(r[idx_map["receivable_assets"]]).strip() if "receivable_assets" in idx_map and r[idx_map["receivable_assets"]] is not None else "",
-                payable_money=parse_money(r[idx_map["payable_money"]]) if "payable_money" in idx_map else 0.0,
-                payable_assets=str(r[idx_map["payable_assets"]]).strip() if "payable_assets" in idx_map and r[idx_map["payable_assets"]] is not None else "",
-                ending_balance_money=parse_money(r[idx_map["ending_balance_money"]]) if "ending_balance_money" in idx_map else 0.0,
-                raw_fields=raw,
-            )
-        )
-    return out
+        columns = {f: [_cell(r, idx_map, f) for r in block] for f in MONEY_FIELDS}
+        if not converters:
+            converters = {f: money_column_converter(col) for f, col in columns.items()}
+        converted = {f: list(map(converters[f], col)) for f, col in columns.items()}
+        for i, r in enumerate(block):
+            yield _to_counterparty_row(r, idx_map, {f: converted[f][i] for f in MONEY_FIELDS})
+
+def iter_counterparty_rows(data: bytes, *, max_scan: int = 20) -> Iterator[CounterpartyRow]:
+    """Yield rows one at a time from a read-only workbook (constant memory)."""
+    wb = load_workbook(filename=bytes_to_filelike(data), read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        _header_idx, idx_map = _find_header_row(rows, max_scan=max_scan)
+        yield from convert_counterparty_rows(rows, idx_map)
+    finally:
+        wb.close()
+
+def parse_counterparties_xlsx(data: bytes) -> list[CounterpartyRow]:
+    return list(iter_counterparty_rows(data))
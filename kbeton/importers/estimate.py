@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import os
+
+from openpyxl import load_workbook
+
+from kbeton.importers.finance_importer import bytes_to_filelike
+
+def estimate_rows(filename: str, data: bytes, *, sheet_name: str | None = None) -> int | None:
+    """Cheap upper bound of data rows, used only for progress/ETA."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    try:
+        if ext == ".xlsx":
+            # read_only mode takes max_row from the sheet <dimension> tag
+            wb = load_workbook(filename=bytes_to_filelike(data), read_only=True)
+            try:
+                max_row = (wb[sheet_name] if sheet_name else wb.active).max_row
+            finally:
+                wb.close()
+            return max(0, max_row - 1) if max_row else None
+        if data.lstrip(b"\xef\xbb\xbf").startswith(b"1CClientBankExchange"):
+            return max(
+                data.count("КонецДокумента".encode("cp1251")),
+                data.count("КонецДокумента".encode("utf-8")),
+                data.count("КонецДокумента".encode("cp866")),
+            )
+        return max(0, data.count(b"\n") - 1)
+    except Exception:
+        return None
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import os
+from typing import Callable, Iterator, NamedTuple
+
+from kbeton.importers.finance_importer import FinanceRow, finance_xlsx_columns, iter_finance_rows
+from kbeton.importers.text_statement_importer import iter_text_statement_rows, text_statement_columns
+
+class FinanceFormat(NamedTuple):
+    iter_rows: Callable[..., Iterator[FinanceRow]]
+    read_columns: Callable[..., dict[str, str]]
+    content_type: str
+
+FINANCE_IMPORT_FORMATS: dict[str, FinanceFormat] = {
+    ".xlsx": FinanceFormat(iter_finance_rows, finance_xlsx_columns, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    ".txt": FinanceFormat(iter_text_statement_rows, text_statement_columns, "text/plain"),
+    ".csv": FinanceFormat(iter_text_statement_rows, text_statement_columns, "text/csv"),
+}
+
+def finance_file_ext(filename: str) -> str | None:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if ext in FINANCE_IMPORT_FORMATS else None
+
+def _format_for(filename: str) -> FinanceFormat:
+    ext = finance_file_ext(filename)
+    if ext is None:
+        raise ValueError(f"Unsupported finance import format: {filename}")
+    return FINANCE_IMPORT_FORMATS[ext]
+
+def finance_content_type(filename: str) -> str:
+    ext = finance_file_ext(filename)
+    return FINANCE_IMPORT_FORMATS[ext].content_type if ext else "application/octet-stream"
+
+def _sheet_kwargs(filename: str, sheet_name: str | None) -> dict:
+    # only workbooks have sheets
+    return {"sheet_name": sheet_name} if sheet_name and finance_file_ext(filename) == ".xlsx" else {}
+
+def iter_finance_file(filename: str, data: bytes, *, default_currency: str = "KGS", sheet_name: str | None = None) -> Iterator[FinanceRow]:
+    return _format_for(filename).iter_rows(data, default_currency=default_currency, **_sheet_kwargs(filename, sheet_name))
+
+def finance_file_columns(filename: str, data: bytes, *, sheet_name: str | None = None) -> dict[str, str]:
+    return _format_for(filename).read_columns(data, **_sheet_kwargs(filename, sheet_name))
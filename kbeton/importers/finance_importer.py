@@ -2,9 +2,22 @@ from __future__ import annotations
 
 import hashlib
 from dataclasses import dataclass
+from itertools import islice
+from typing import Iterator
+
 from openpyxl import load_workbook
 
-from kbeton.importers.utils import norm_header, parse_date, parse_money
+from kbeton.importers.utils import (
+    date_column_converter,
+    iter_chunks,
+    json_safe_cell,
+    money_column_converter,
+    norm_header,
+    parse_date,
+    parse_money,
+)
+
+CONVERT_BLOCK_SIZE = 512
 
 @dataclass
 class FinanceRow:
@@ -29,40 +42,103 @@ def bytes_to_filelike(data: bytes):
     from io import BytesIO
     return BytesIO(data)
 
-def _find_header_row(rows: list[list[object]], max_scan: int = 15) -> tuple[int, dict[str, int]]:
-    for i in range(min(max_scan, len(rows))):
-        r = rows[i]
-        headers = [norm_header(str(c)) if c is not None else "" for c in r]
-        idx_map: dict[str, int] = {}
-        for field, syns in FINANCE_HEADER_SYNONYMS.items():
-            for col_i, h in enumerate(headers):
-                if h in syns:
-                    idx_map[field] = col_i
-                    break
-        if "amount" in idx_map and ("date" in idx_map or "description" in idx_map):
+def _header_map(r) -> dict[str, int] | None:
+    headers = [norm_header(str(c)) if c is not None else "" for c in r]
+    idx_map: dict[str, int] = {}
+    for field, syns in FINANCE_HEADER_SYNONYMS.items():
+        for col_i, h in enumerate(headers):
+            if h in syns:
+                idx_map[field] = col_i
+                break
+    if "amount" in idx_map and ("date" in idx_map or "description" in idx_map):
+        return idx_map
+    return None
+
+def _find_header_row(rows: Iterator[tuple], max_scan: int = 15) -> tuple[int, dict[str, int]]:
+    # Consumes at most max_scan rows; data rows continue from the same iterator.
+    for i, r in enumerate(islice(rows, max_scan)):
+        if r is None:
+            continue
+        idx_map = _header_map(r)
+        if idx_map is not None:
             return i, idx_map
     raise ValueError("Cannot detect header row for finance import")
 
-def parse_finance_xlsx(data: bytes, *, default_currency: str = "KGS") -> list[FinanceRow]:
-    wb = load_workbook(filename=bytes_to_filelike(data), data_only=True)
-    ws = wb.active
-    rows = list(ws.iter_rows(values_only=True))
+def header_columns(rows: Iterator[tuple], max_scan: int = 15) -> dict[str, str]:
+    """Detected field -> source column title."""
+    for r in islice(rows, max_scan):
+        if r is None:
+            continue
+        idx_map = _header_map(r)
+        if idx_map is not None:
+            return {field: str(r[i]).strip() for field, i in idx_map.items()}
+    raise ValueError("Cannot detect header row for finance import")
 
-    header_idx, idx_map = _find_header_row(rows)
-    out: list[FinanceRow] = []
+def _cell(r, idx_map: dict[str, int], field: str):
+    i = idx_map.get(field)
+    if i is None or i >= len(r):
+        return None
+    return r[i]
 
-    for r in rows[header_idx + 1 :]:
-        if r is None or all(c is None or str(c).strip() == "" for c in r):
+def _is_blank(r) -> bool:
+    return r is None or all(c is None or str(c).strip() == "" for c in r)
+
+def _to_finance_row(r, idx_map: dict[str, int], default_currency: str, dt=None, amt=None) -> FinanceRow:
+    raw = {str(i): json_safe_cell(c) for i, c in enumerate(r)}
+    if dt is None:
+        dt = parse_date(_cell(r, idx_map, "date"))
+    if amt is None:
+        amt = parse_money(_cell(r, idx_map, "amount"))
+    cur_v = _cell(r, idx_map, "currency")
+    cur = str(cur_v).strip() if cur_v else default_currency
+    desc_v = _cell(r, idx_map, "description")
+    desc = str(desc_v).strip() if desc_v is not None else ""
+    cp_v = _cell(r, idx_map, "counterparty")
+    cp = str(cp_v).strip() if cp_v is not None else ""
+    ttype_v = _cell(r, idx_map, "tx_type")
+    ttype = str(ttype_v).strip().lower() if ttype_v is not None else None
+    return FinanceRow(date=dt, amount=amt, currency=cur or default_currency, description=desc, counterparty=cp, tx_type=ttype, raw_fields=raw)
+
+def convert_finance_rows(rows: Iterator, idx_map: dict[str, int], default_currency: str, *, block_size: int = CONVERT_BLOCK_SIZE) -> Iterator[FinanceRow]:
+    """Convert data rows block by block; date/amount formats are detected once
+    from the first block and applied to whole columns."""
+    to_date = to_money = None
+    for block in iter_chunks(rows, block_size):
+        block = [r for r in block if not _is_blank(r)]
+        if not block:
             continue
-        raw = {str(i): (c if c is not None else "") for i, c in enumerate(r)}
-        dt = parse_date(r[idx_map['date']]) if 'date' in idx_map else None
-        amt = parse_money(r[idx_map['amount']]) if 'amount' in idx_map else 0.0
-        cur = str(r[idx_map['currency']]).strip() if 'currency' in idx_map and r[idx_map['currency']] else default_currency
-        desc = str(r[idx_map['description']]).strip() if 'description' in idx_map and r[idx_map['description']] is not None else ''
-        cp = str(r[idx_map['counterparty']]).strip() if 'counterparty' in idx_map and r[idx_map['counterparty']] is not None else ''
-        ttype = str(r[idx_map['tx_type']]).strip().lower() if 'tx_type' in idx_map and r[idx_map['tx_type']] is not None else None
-        out.append(FinanceRow(date=dt, amount=amt, currency=cur or default_currency, description=desc, counterparty=cp, tx_type=ttype, raw_fields=raw))
-    return out
+        date_col = [_cell(r, idx_map, "date") for r in block]
+        amount_col = [_cell(r, idx_map, "amount") for r in block]
+        if to_date is None:
+            to_date = date_column_converter(date_col)
+            to_money = money_column_converter(amount_col)
+        dates = list(map(to_date, date_col))
+        amounts = list(map(to_money, amount_col))
+        for r, dt, amt in zip(block, dates, amounts):
+            yield _to_finance_row(r, idx_map, default_currency, dt, amt)
+
+def _sheet(wb, sheet_name: str | None):
+    return wb[sheet_name] if sheet_name else wb.active
+
+def iter_finance_rows(data: bytes, *, default_currency: str = "KGS", max_scan: int = 15, sheet_name: str | None = None) -> Iterator[FinanceRow]:
+    """Yield rows one at a time from a read-only workbook (constant memory)."""
+    wb = load_workbook(filename=bytes_to_filelike(data), read_only=True, data_only=True)
+    try:
+        rows = _sheet(wb, sheet_name).iter_rows(values_only=True)
+        _header_idx, idx_map = _find_header_row(rows, max_scan=max_scan)
+        yield from convert_finance_rows(rows, idx_map, default_currency)
+    finally:
+        wb.close()
+
+def finance_xlsx_columns(data: bytes, *, max_scan: int = 15, sheet_name: str | None = None) -> dict[str, str]:
+    wb = load_workbook(filename=bytes_to_filelike(data), read_only=True, data_only=True)
+    try:
+        return header_columns(_sheet(wb, sheet_name).iter_rows(values_only=True), max_scan=max_scan)
+    finally:
+        wb.close()
+
+def parse_finance_xlsx(data: bytes, *, default_currency: str = "KGS") -> list[FinanceRow]:
+    return list(iter_finance_rows(data, default_currency=default_currency))
 
 def make_dedup_hash(row: FinanceRow) -> str:
     base = f"{row.date}|{row.amount}|{row.currency}|{row.description}|{row.counterparty}|{row.tx_type}"
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+from typing import Iterator
+
+from kbeton.importers.finance_importer import FinanceRow, _find_header_row, convert_finance_rows, header_columns
+from kbeton.importers.utils import parse_date, parse_money
+
+ONEC_SIGNATURE = "1CClientBankExchange"
+ONEC_COLUMNS = {
+    "date": "ДатаСписано / ДатаПоступило",
+    "amount": "Сумма",
+    "description": "НазначениеПлатежа",
+    "counterparty": "Плательщик / Получатель",
+    "tx_type": "РасчСчет (направление)",
+}
+_SNIFF_BYTES = 64 * 1024
+
+def _detect_encoding(data: bytes) -> str:
+    head = data[:_SNIFF_BYTES]
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    if "Кодировка=DOS".encode("cp866") in head:
+        return "cp866"
+    return "cp1251"
+
+def _text_lines(data: bytes) -> io.TextIOWrapper:
+    # Decodes lazily: the statement is never materialised as one str.
+    return io.TextIOWrapper(io.BytesIO(data), encoding=_detect_encoding(data), errors="replace", newline="")
+
+def is_1c_exchange(data: bytes) -> bool:
+    return data.lstrip(codecs.BOM_UTF8)[:len(ONEC_SIGNATURE)].decode("ascii", "ignore") == ONEC_SIGNATURE
+
+def _onec_row(doc: dict[str, str], own_accounts: set[str], default_currency: str) -> FinanceRow | None:
+    amount = parse_money(doc.get("Сумма"))
+    if not amount:
+        return None
+    payer_acc = doc.get("ПлательщикСчет") or doc.get("ПлательщикРасчСчет") or ""
+    recipient_acc = doc.get("ПолучательСчет") or doc.get("ПолучательРасчСчет") or ""
+    if payer_acc and payer_acc in own_accounts:
+        outgoing = True
+    elif recipient_acc and recipient_acc in own_accounts:
+        outgoing = False
+    else:
+        outgoing = bool(doc.get("ДатаСписано")) and not doc.get("ДатаПоступило")
+    if outgoing:
+        dt = parse_date(doc.get("ДатаСписано") or doc.get("Дата"))
+        counterparty = doc.get("Получатель1") or doc.get("Получатель") or ""
+    else:
+        dt = parse_date(doc.get("ДатаПоступило") or doc.get("Дата"))
+        counterparty = doc.get("Плательщик1") or doc.get("Плательщик") or ""
+    raw = {"payment_channel": "bank", **doc}
+    return FinanceRow(
+        date=dt,
+        amount=amount,
+        currency=default_currency,
+        description=(doc.get("НазначениеПлатежа") or "").strip(),
+        counterparty=counterparty.strip(),
+        tx_type="расход" if outgoing else "приход",
+        raw_fields=raw,
+    )
+
+def iter_1c_exchange_rows(data: bytes, *, default_currency: str = "KGS") -> Iterator[FinanceRow]:
+    """Stream documents of a 1CClientBankExchange file (key=value sections)."""
+    own_accounts: set[str] = set()
+    doc: dict[str, str] | None = None
+    for line in _text_lines(data):
+        line = line.strip()
+        if not line:
+            continue
+        key, _, value = line.partition("=")
+        if key == "СекцияДокумент":
+            doc = {"ВидДокумента": value}
+        elif key == "КонецДокумента":
+            if doc is not None:
+                row = _onec_row(doc, own_accounts, default_currency)
+                if row is not None:
+                    yield row
+            doc = None
+        elif doc is not None:
+            doc[key] = value.strip()
+        elif key == "РасчСчет" and value.strip():
+            own_accounts.add(value.strip())
+
+class _SemicolonDialect(csv.excel):
+    delimiter = ";"
+
+def _csv_dialect(data: bytes, encoding: str):
+    sample = data[:_SNIFF_BYTES].decode(encoding, errors="ignore")
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=";,\t")
+    except csv.Error:
+        # 1C and local banks export ';'-separated files by default
+        return _SemicolonDialect
+
+def iter_csv_rows(data: bytes, *, default_currency: str = "KGS", max_scan: int = 15) -> Iterator[FinanceRow]:
+    """Stream a CSV statement using the same header synonyms as the XLSX importer."""
+    lines = _text_lines(data)
+    reader = csv.reader(lines, dialect=_csv_dialect(data, lines.encoding))
+    _header_idx, idx_map = _find_header_row(reader, max_scan=max_scan)
+    yield from convert_finance_rows(reader, idx_map, default_currency)
+
+def iter_text_statement_rows(data: bytes, *, default_currency: str = "KGS") -> Iterator[FinanceRow]:
+    if is_1c_exchange(data):
+        return iter_1c_exchange_rows(data, default_currency=default_currency)
+    return iter_csv_rows(data, default_currency=default_currency)
+
+def text_statement_columns(data: bytes) -> dict[str, str]:
+    if is_1c_exchange(data):
+        return dict(ONEC_COLUMNS)
+    lines = _text_lines(data)
+    return header_columns(csv.reader(lines, dialect=_csv_dialect(data, lines.encoding)))
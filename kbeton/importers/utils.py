@@ -1,8 +1,15 @@
 from __future__ import annotations
 
 import re
+import resource
+import sys
+import time
 from datetime import datetime, date
 from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
 
 def norm_header(s: str) -> str:
     s = (s or "").strip().lower()
@@ -11,6 +18,8 @@ def norm_header(s: str) -> str:
     s = s.replace("ё", "е")
     return s
 
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y")
+
 def parse_date(v) -> date | None:
     if v is None or str(v).strip() == "":
         return None
@@ -19,7 +28,7 @@ def parse_date(v) -> date | None:
     if isinstance(v, datetime):
         return v.date()
     s = str(v).strip()
-    for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y"):
+    for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(s, fmt).date()
         except ValueError:
@@ -52,8 +61,191 @@ def parse_money(v) -> float:
     except (InvalidOperation, ValueError):
         return 0.0
 
+# Column-wise conversion: the format is detected once from a sample of the
+# column and applied to every cell; cells that do not fit the detected format
+# fall back to parse_date / parse_money.
+
+# strptime format -> (separator, position of year, month, day)
+_DATE_LAYOUTS = {
+    "%Y-%m-%d": ("-", 0, 1, 2),
+    "%d.%m.%Y": (".", 2, 1, 0),
+    "%d/%m/%Y": ("/", 2, 1, 0),
+    "%d-%m-%Y": ("-", 2, 1, 0),
+}
+
+def _layout_date(s: str, layout: tuple[str, int, int, int]) -> date | None:
+    sep, yi, mi, di = layout
+    parts = s.split(sep)
+    if len(parts) != 3:
+        return None
+    y, m, d = parts[yi], parts[mi], parts[di]
+    if not (len(y) == 4 and y.isdigit() and 0 < len(m) <= 2 and m.isdigit() and 0 < len(d) <= 2 and d.isdigit()):
+        return None
+    try:
+        return date(int(y), int(m), int(d))
+    except ValueError:
+        return None
+
+def detect_date_format(sample: Iterable) -> str | None:
+    texts = [str(v).strip() for v in sample if v is not None and not isinstance(v, (date, datetime)) and str(v).strip()]
+    if not texts:
+        return None
+    for fmt in DATE_FORMATS:
+        layout = _DATE_LAYOUTS[fmt]
+        if all(_layout_date(t, layout) is not None for t in texts):
+            return fmt
+    return None
+
+def date_column_converter(sample: Iterable) -> Callable[[object], date | None]:
+    fmt = detect_date_format(sample)
+    if fmt is None:
+        return parse_date
+    layout = _DATE_LAYOUTS[fmt]
+
+    def convert(v) -> date | None:
+        if v is None:
+            return None
+        if isinstance(v, datetime):
+            return v.date()
+        if isinstance(v, date):
+            return v
+        s = str(v).strip()
+        if not s:
+            return None
+        return _layout_date(s, layout) or parse_date(s)
+
+    return convert
+
+_PLAIN_NUMBER_RE = re.compile(r"^-?\d+(\.\d+)?$")
+_COMMA_DECIMAL_RE = re.compile(r"^-?\d+(,\d{1,2}|,\d{4,})?$")
+# parse_money reads a single "-1,500" as -1.5, so that shape is left to it
+_COMMA_THOUSANDS_RE = re.compile(r"^(?!-\d{1,3},\d{3}$)-?\d{1,3}(,\d{3})+(\.\d+)?$")
+_DOT_THOUSANDS_RE = re.compile(r"^-?\d{1,3}(\.\d{3})+,\d+$")
+
+# locale -> (cell pattern, normalisation to a float() literal); every pattern
+# only accepts strings on which parse_money gives the same result.
+_MONEY_LOCALES: dict[str, tuple[re.Pattern, Callable[[str], str]]] = {
+    "plain": (_PLAIN_NUMBER_RE, lambda s: s),
+    "comma_decimal": (_COMMA_DECIMAL_RE, lambda s: s.replace(",", ".")),
+    "comma_thousands": (_COMMA_THOUSANDS_RE, lambda s: s.replace(",", "")),
+    "dot_thousands": (_DOT_THOUSANDS_RE, lambda s: s.replace(".", "").replace(",", ".")),
+}
+
+def detect_money_locale(sample: Iterable) -> str | None:
+    texts = [str(v).strip().replace(" ", "") for v in sample if v is not None and not isinstance(v, (int, float))]
+    texts = [t for t in texts if t]
+    if not texts:
+        return "plain"
+    for name, (pattern, _normalise) in _MONEY_LOCALES.items():
+        if all(pattern.match(t) for t in texts):
+            return name
+    return None
+
+def money_column_converter(sample: Iterable) -> Callable[[object], float]:
+    locale = detect_money_locale(sample)
+    if locale is None:
+        return parse_money
+    pattern, normalise = _MONEY_LOCALES[locale]
+    match = pattern.match
+
+    def convert(v) -> float:
+        if v is None:
+            return 0.0
+        if isinstance(v, (int, float)):
+            return float(v)
+        s = str(v).strip().replace(" ", "")
+        if not s:
+            return 0.0
+        if match(s):
+            return float(normalise(s))
+        return parse_money(v)
+
+    return convert
+
 def norm_counterparty_name(name: str) -> str:
     s = (name or "").strip().lower()
     s = s.replace('"', "").replace("'", "")
     s = re.sub(r"\s+", " ", s)
     return s
+
+_FINGERPRINT_NOISE = re.compile(r"[\d\W_]+")
+FINGERPRINT_LEN = 64
+# room kept for the counterparty, so a long description can't push it out
+FINGERPRINT_COUNTERPARTY_LEN = 24
+
+def description_fingerprint(description: str, counterparty: str = "") -> str:
+    """Payment text without numbers and punctuation plus the counterparty:
+    "оплата по счету №15 от 01.02" and "... №16 от 03.02" from the same supplier
+    share one, the same text from another supplier does not."""
+    text = " ".join(_FINGERPRINT_NOISE.sub(" ", (description or "").lower()).split())
+    party = norm_counterparty_name(counterparty)
+    if not party:
+        return text[:FINGERPRINT_LEN].rstrip()
+    if not text:
+        return party[:FINGERPRINT_LEN].rstrip()
+    party = party[:FINGERPRINT_COUNTERPARTY_LEN].rstrip()
+    return f"{text[:FINGERPRINT_LEN - len(party) - 3].rstrip()} | {party}"
+
+PAYMENT_CHANNELS = ("bank", "cash")
+_CHANNEL_FIELDS = ("payment_channel", "account_type", "channel", "source_account", "wallet")
+
+def channel_bucket(raw_value: str) -> str | None:
+    value = (raw_value or "").strip().lower()
+    if not value:
+        return None
+    if any(token in value for token in ["касса", "нал", "налич", "cash"]):
+        return "cash"
+    if any(token in value for token in ["банк", "р/с", "рс", "расчет", "расч", "безнал", "bank"]):
+        return "bank"
+    return None
+
+def payment_channel(raw_fields, article_name: str | None, description: str | None) -> str | None:
+    """"bank" / "cash" from the statement columns, else from article name and description."""
+    if isinstance(raw_fields, dict):
+        for key in _CHANNEL_FIELDS:
+            bucket = channel_bucket(str(raw_fields.get(key, "")))
+            if bucket:
+                return bucket
+    return channel_bucket(f"{article_name or ''} {description or ''}")
+
+def json_safe_cell(v):
+    if v is None:
+        return ""
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return float(v)
+    return v
+
+def iter_chunks(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+class ParseTimer:
+    """Accumulates time spent inside a wrapped row generator."""
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+
+    def wrap(self, items: Iterable[T]) -> Iterator[T]:
+        it = iter(items)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.seconds += time.perf_counter() - started
+                return
+            self.seconds += time.perf_counter() - started
+            yield item
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    if sys.platform == "darwin":
+        return round(rss / (1024 * 1024), 1)
+    return round(rss / 1024, 1)
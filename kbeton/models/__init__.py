@@ -5,8 +5,11 @@ from kbeton.models.audit import AuditLog
 from kbeton.models.finance import (
     FinanceArticle,
     MappingRule,
+    MappingRuleStat,
     ImportJob,
     FinanceTransaction,
+    FinanceDailyAgg,
+    FinanceChannelBalance,
 )
 from kbeton.models.pricing import PriceVersion
 from kbeton.models.production import ProductionShift, ProductionOutput, ProductionRealization
@@ -14,3 +17,4 @@ from kbeton.models.inventory import InventoryItem, InventoryBalance, InventoryTx
 from kbeton.models.counterparty import CounterpartySnapshot, CounterpartyBalance
 from kbeton.models.recipes import ConcreteRecipe
 from kbeton.models.costs import MaterialPrice, OverheadCost
+from kbeton.models.versions import DataVersion
@@ -31,3 +31,5 @@ class CounterpartyBalance(Base):
     snapshot = relationship("CounterpartySnapshot", back_populates="balances")
 
 Index("ix_cp_balance_snapshot_norm", CounterpartyBalance.snapshot_id, CounterpartyBalance.counterparty_name_norm)
+Index("ix_cp_balance_snapshot_receivable", CounterpartyBalance.snapshot_id, CounterpartyBalance.receivable_money)
+Index("ix_cp_balance_snapshot_payable", CounterpartyBalance.snapshot_id, CounterpartyBalance.payable_money)
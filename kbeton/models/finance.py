@@ -1,16 +1,18 @@
 from __future__ import annotations
 
 from sqlalchemy import (
+    BigInteger,
     Date,
     DateTime,
     Enum,
+    Float,
     ForeignKey,
+    Index,
     Integer,
     JSON,
     Numeric,
     String,
     Text,
-    UniqueConstraint,
     func,
 )
 from sqlalchemy.dialects.postgresql import JSONB
@@ -41,41 +43,89 @@ class MappingRule(Base):
 
     article = relationship("FinanceArticle")
 
+class MappingRuleStat(Base):
+    """Cumulative classifier counters per rule (flushed from the workers)."""
+    __tablename__ = "mapping_rule_stats"
+    rule_id: Mapped[int] = mapped_column(Integer, ForeignKey("mapping_rules.id", ondelete="CASCADE"), primary_key=True)
+    hits: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # regex rules only: contains rules are matched together by one automaton scan
+    evaluations: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    match_seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    last_hit_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
 class ImportJob(Base):
     __tablename__ = "import_jobs"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    kind: Mapped[str] = mapped_column(String(50), nullable=False)  # finance|counterparty
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)  # finance|finance_batch|counterparty
     status: Mapped[str] = mapped_column(String(50), nullable=False, default="pending")
     filename: Mapped[str] = mapped_column(String(255), nullable=False, default="")
     s3_key: Mapped[str] = mapped_column(String(512), nullable=False, default="")
     summary: Mapped[dict] = mapped_column(JSON().with_variant(JSONB, "postgresql"), nullable=False, default=dict)
     error: Mapped[str] = mapped_column(Text, nullable=False, default="")
     created_by_user_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # batch uploads (zip / multi-sheet workbook): one child job per file or sheet
+    parent_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("import_jobs.id", ondelete="CASCADE"), nullable=True, index=True)
+    sheet_name: Mapped[str] = mapped_column(String(255), nullable=False, default="")
 
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     processed_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
 class FinanceTransaction(Base):
     __tablename__ = "finance_transactions"
-    __table_args__ = (
-        UniqueConstraint("import_job_id", "dedup_hash", name="uq_fin_txn_import_dedup"),
-    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     import_job_id: Mapped[int] = mapped_column(Integer, ForeignKey("import_jobs.id", ondelete="CASCADE"), nullable=False)
 
-    date: Mapped[Date] = mapped_column(Date, nullable=True)
-    amount: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False, default=0)
+    # active_history: the daily rollup (kbeton.services.finance_agg) needs the old values on update
+    date: Mapped[Date] = mapped_column(Date, nullable=True, active_history=True)
+    amount: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False, default=0, active_history=True)
     currency: Mapped[str] = mapped_column(String(10), nullable=False, default="KGS")
-    tx_type: Mapped[TxType] = mapped_column(Enum(TxType, name="txn_type_enum"), nullable=False, default=TxType.unknown)
+    tx_type: Mapped[TxType] = mapped_column(Enum(TxType, name="txn_type_enum"), nullable=False, default=TxType.unknown, active_history=True)
 
     description: Mapped[str] = mapped_column(Text, nullable=False, default="")
     counterparty: Mapped[str] = mapped_column(String(255), nullable=False, default="")
 
-    income_article_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("finance_articles.id", ondelete="SET NULL"), nullable=True)
-    expense_article_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("finance_articles.id", ondelete="SET NULL"), nullable=True)
+    income_article_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("finance_articles.id", ondelete="SET NULL"), nullable=True, active_history=True)
+    expense_article_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("finance_articles.id", ondelete="SET NULL"), nullable=True, active_history=True)
 
     dedup_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    # kbeton.importers.utils.description_fingerprint, groups unknown rows for triage
+    description_fingerprint: Mapped[str] = mapped_column(String(64), nullable=False, default="")
     raw_fields: Mapped[dict] = mapped_column(JSON().with_variant(JSONB, "postgresql"), nullable=False, default=dict)
+    # "bank" / "cash" (kbeton.importers.utils.payment_channel), resolved once on insert
+    payment_channel: Mapped[str | None] = mapped_column(String(8), nullable=True, active_history=True)
 
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class FinanceDailyAgg(Base):
+    """Daily rollup of finance_transactions (kbeton.services.finance_agg keeps it current)."""
+    __tablename__ = "finance_daily_agg"
+    date: Mapped[Date] = mapped_column(Date, primary_key=True)
+    tx_type: Mapped[TxType] = mapped_column(Enum(TxType, name="txn_type_enum"), primary_key=True)
+    # income_article_id / expense_article_id by tx_type, 0 = no article (no FK: 0 is not a row)
+    article_id: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)
+    amount: Mapped[float] = mapped_column(Numeric(16, 2), nullable=False, default=0)
+    tx_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+class FinanceChannelBalance(Base):
+    """Bank / cash movement per day: income minus expense of the channel's
+    transactions on `date`. The balance as of a day is the sum of the rows up
+    to it (kbeton.services.finance_agg.channel_balances)."""
+    __tablename__ = "finance_channel_balances"
+    channel: Mapped[str] = mapped_column(String(8), primary_key=True)
+    date: Mapped[Date] = mapped_column(Date, primary_key=True)
+    amount: Mapped[float] = mapped_column(Numeric(16, 2), nullable=False, default=0)
+    # transactions of any type that day
+    tx_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+# one row per dedup_hash across all imports (manual entries get a random hash)
+Index("ix_fin_txn_dedup_hash", FinanceTransaction.dedup_hash, unique=True)
+Index("ix_fin_txn_channel_date", FinanceTransaction.payment_channel, FinanceTransaction.date)
+# partial: only the (small) triage backlog is indexed
+Index(
+    "ix_fin_txn_unknown_fingerprint",
+    FinanceTransaction.description_fingerprint,
+    postgresql_where=FinanceTransaction.tx_type == TxType.unknown,
+    sqlite_where=FinanceTransaction.tx_type == TxType.unknown,
+)
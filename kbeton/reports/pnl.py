@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import date, timedelta
-from sqlalchemy import select, func, case
+from datetime import date
+from sqlalchemy import (
+    Date, DateTime, Integer, Numeric, String, case, cast, func, literal, literal_column, null, select, type_coerce, union_all,
+)
 from sqlalchemy.orm import Session
 
-from kbeton.models.finance import FinanceTransaction, FinanceArticle
+from kbeton.models.finance import FinanceArticle, FinanceDailyAgg
 from kbeton.models.enums import TxType
 
 @dataclass
@@ -18,64 +20,129 @@ class PnlRow:
     def net_profit(self) -> float:
         return self.income_sum - self.expense_sum
 
-def _date_floor(d: date, period: str) -> date:
+PERIODS = ("day", "week", "month", "quarter", "year")
+TOP_ARTICLES = 10
+
+
+def _day_series(dialect: str, start: date, end: date):
+    """One row per day in [start, end] as column `d`."""
+    if dialect == "postgresql":
+        days = func.generate_series(
+            cast(start, DateTime), cast(end, DateTime), literal_column("interval '1 day'")
+        ).table_valued("d").render_derived()
+        return select(cast(days.c.d, Date).label("d")).subquery("days")
+    # SQLite (unit tests): recursive CTE over ISO date strings
+    first = literal(start.isoformat())
+    days = select(first.label("d")).where(first <= end.isoformat()).cte("days", recursive=True)
+    days = days.union_all(select(func.date(days.c.d, "+1 day")).where(days.c.d < end.isoformat()))
+    return select(type_coerce(days.c.d, Date).label("d")).subquery("days_typed")
+
+
+def _period_floor(dialect: str, d, period: str):
+    if period not in PERIODS:
+        raise ValueError("Invalid period")
+    if dialect == "postgresql":
+        # date_trunc('week') is the ISO (Monday) week, same as the Python floor had
+        return cast(func.date_trunc(period, cast(d, DateTime)), Date)
     if period == "day":
         return d
     if period == "week":
-        # ISO week starts Monday
-        return d - timedelta(days=d.weekday())
-    if period == "month":
-        return date(d.year, d.month, 1)
-    if period == "quarter":
-        q = (d.month - 1)//3
-        m = q*3 + 1
-        return date(d.year, m, 1)
-    if period == "year":
-        return date(d.year, 1, 1)
-    raise ValueError("Invalid period")
+        floor = func.date(d, "-6 days", "weekday 1")
+    elif period == "month":
+        floor = func.date(d, "start of month")
+    elif period == "quarter":
+        back = (cast(func.strftime("%m", d), Integer) - 1) % 3
+        floor = func.date(d, "start of month", "-" + cast(back, String) + " months")
+    else:
+        floor = func.date(d, "start of year")
+    return type_coerce(floor, Date)
 
-def _iterate_periods(start: date, end: date, period: str) -> list[date]:
-    # end is inclusive
-    cur = _date_floor(start, period)
-    res = []
-    seen = set()
-    d = start
-    while d <= end:
-        p = _date_floor(d, period)
-        if p not in seen:
-            res.append(p)
-            seen.add(p)
-        d += timedelta(days=1)
-    return sorted(res)
 
 def pnl(session: Session, *, start: date, end: date, period: str) -> tuple[list[PnlRow], dict]:
-    stmt = (
+    # reads the finance_daily_agg rollup (kbeton.services.finance_agg), not the transactions
+    agg = FinanceDailyAgg
+    dialect = session.get_bind().dialect.name
+    # One statement, one pass over the range: `scoped` feeds both the day series
+    # (section 0) and the ranked article totals (sections 1/2), glued by UNION ALL.
+    # (GROUPING SETS would need a PostgreSQL-only variant; the CTE runs on both.)
+    scoped = select(agg).where(agg.date >= start, agg.date <= end).cte("scoped")
+    by_day = (
         select(
-            FinanceTransaction.date.label("d"),
-            func.sum(case((FinanceTransaction.tx_type == TxType.income, FinanceTransaction.amount), else_=0)).label("income"),
-            func.sum(case((FinanceTransaction.tx_type == TxType.expense, FinanceTransaction.amount), else_=0)).label("expense"),
-            func.sum(case((FinanceTransaction.tx_type == TxType.unknown, 1), else_=0)).label("unknown_count"),
+            scoped.c.date.label("d"),
+            func.sum(case((scoped.c.tx_type == TxType.income, scoped.c.amount), else_=0)).label("income"),
+            func.sum(case((scoped.c.tx_type == TxType.expense, scoped.c.amount), else_=0)).label("expense"),
+            func.sum(case((scoped.c.tx_type == TxType.unknown, scoped.c.tx_count), else_=0)).label("unknown_count"),
         )
-        .where(FinanceTransaction.date >= start, FinanceTransaction.date <= end)
-        .group_by(FinanceTransaction.date)
+        .group_by(scoped.c.date)
+        .subquery("by_day")
+    )
+    days = _day_series(dialect, start, end)
+    bucket = _period_floor(dialect, days.c.d, period)
+    income = func.coalesce(by_day.c.income, 0)
+    expense = func.coalesce(by_day.c.expense, 0)
+    day_rows = (
+        select(
+            literal(0).label("section"),
+            days.c.d,
+            bucket.label("bucket"),
+            income.label("income"),
+            expense.label("expense"),
+            func.sum(income).over(partition_by=bucket).label("period_income"),
+            func.sum(expense).over(partition_by=bucket).label("period_expense"),
+            func.sum(func.coalesce(by_day.c.unknown_count, 0)).over().label("unknown_total"),
+            cast(null(), String).label("name"),
+            cast(null(), Numeric).label("total"),
+        )
+        .select_from(days.outerjoin(by_day, by_day.c.d == days.c.d))
     )
-    rows = session.execute(stmt).all()
-    by_day = {r.d: (float(r.income or 0), float(r.expense or 0), int(r.unknown_count or 0)) for r in rows}
 
-    periods = _iterate_periods(start, end, period)
-    out: dict[date, PnlRow] = {p: PnlRow(period_start=p, income_sum=0.0, expense_sum=0.0) for p in periods}
-    unknown_total = 0
+    total = func.sum(scoped.c.amount)
+    # per article name, as before: same-named articles share one line
+    ranked = (
+        select(
+            scoped.c.tx_type,
+            FinanceArticle.name,
+            total.label("total"),
+            func.row_number().over(partition_by=scoped.c.tx_type, order_by=(total.desc(), FinanceArticle.name)).label("rn"),
+        )
+        .join(FinanceArticle, FinanceArticle.id == scoped.c.article_id)
+        .where(scoped.c.tx_type.in_([TxType.income, TxType.expense]))
+        .group_by(scoped.c.tx_type, FinanceArticle.name)
+        .subquery("ranked")
+    )
+    article_rows = (
+        select(
+            case((ranked.c.tx_type == TxType.income, 1), else_=2).label("section"),
+            cast(null(), Date),
+            cast(null(), Date),
+            cast(null(), Numeric),
+            cast(null(), Numeric),
+            cast(null(), Numeric),
+            cast(null(), Numeric),
+            cast(null(), Integer),
+            ranked.c.name,
+            ranked.c.total,
+        )
+        .where(ranked.c.rn <= TOP_ARTICLES)
+    )
+    combined = union_all(day_rows, article_rows).subquery("pnl")
+    rows = session.execute(
+        select(combined).order_by(combined.c.section, combined.c.d, combined.c.total.desc(), combined.c.name)
+    ).all()
 
-    d = start
-    while d <= end:
-        inc, exp, unk = by_day.get(d, (0.0, 0.0, 0))
-        unknown_total += unk
-        ps = _date_floor(d, period)
-        if ps not in out:
-            out[ps] = PnlRow(period_start=ps, income_sum=0.0, expense_sum=0.0)
-        out[ps].income_sum += inc
-        out[ps].expense_sum += exp
-        d += timedelta(days=1)
+    out: dict[date, PnlRow] = {}
+    daily = []
+    top: dict[int, list[dict]] = {1: [], 2: []}
+    unknown_total = 0
+    for r in rows:
+        if r.section:
+            top[r.section].append({"name": r.name, "amount": float(r.total or 0)})
+            continue
+        if r.bucket not in out:
+            out[r.bucket] = PnlRow(period_start=r.bucket, income_sum=float(r.period_income), expense_sum=float(r.period_expense))
+        inc, exp = float(r.income), float(r.expense)
+        daily.append({"date": r.d, "income": inc, "expense": exp, "net": inc - exp})
+        unknown_total = int(r.unknown_total)
 
     result_rows = [out[p] for p in sorted(out.keys())]
     total_income = sum(r.income_sum for r in result_rows)
@@ -88,45 +155,8 @@ def pnl(session: Session, *, start: date, end: date, period: str) -> tuple[list[
         "total_net": total_income - total_expense,
     }
     # Daily dynamics (always by day)
-    daily = []
-    d = start
-    while d <= end:
-        inc, exp, _unk = by_day.get(d, (0.0, 0.0, 0))
-        daily.append({"date": d, "income": inc, "expense": exp, "net": inc - exp})
-        d += timedelta(days=1)
     meta["daily"] = daily
-
     # Top articles by amount (income/expense)
-    income_q = (
-        select(FinanceArticle.name, func.sum(FinanceTransaction.amount))
-        .join(FinanceArticle, FinanceArticle.id == FinanceTransaction.income_article_id)
-        .where(
-            FinanceTransaction.tx_type == TxType.income,
-            FinanceTransaction.date >= start,
-            FinanceTransaction.date <= end,
-        )
-        .group_by(FinanceArticle.name)
-        .order_by(func.sum(FinanceTransaction.amount).desc())
-        .limit(10)
-    )
-    expense_q = (
-        select(FinanceArticle.name, func.sum(FinanceTransaction.amount))
-        .join(FinanceArticle, FinanceArticle.id == FinanceTransaction.expense_article_id)
-        .where(
-            FinanceTransaction.tx_type == TxType.expense,
-            FinanceTransaction.date >= start,
-            FinanceTransaction.date <= end,
-        )
-        .group_by(FinanceArticle.name)
-        .order_by(func.sum(FinanceTransaction.amount).desc())
-        .limit(10)
-    )
-    meta["top_income_articles"] = [
-        {"name": name, "amount": float(total or 0)}
-        for name, total in session.execute(income_q).all()
-    ]
-    meta["top_expense_articles"] = [
-        {"name": name, "amount": float(total or 0)}
-        for name, total in session.execute(expense_q).all()
-    ]
+    meta["top_income_articles"] = top[1]
+    meta["top_expense_articles"] = top[2]
     return result_rows, meta
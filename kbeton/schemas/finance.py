@@ -1,5 +1,5 @@
 from __future__ import annotations
-from datetime import date
+from datetime import date, datetime
 from pydantic import BaseModel, Field
 
 class PnlRow(BaseModel):
@@ -29,3 +29,22 @@ class PnlResponse(BaseModel):
     daily: list[PnlDailyRow] = Field(default_factory=list)
     top_income_articles: list[PnlTopArticle] = Field(default_factory=list)
     top_expense_articles: list[PnlTopArticle] = Field(default_factory=list)
+
+class PnlCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    hit_rate: float = 0
+
+class RuleStatRow(BaseModel):
+    rule_id: int
+    kind: str
+    pattern_type: str
+    pattern: str
+    priority: int
+    article: str
+    hits: int = 0
+    evaluations: int = 0
+    match_ms: float = 0
+    avg_match_us: float = 0
+    last_hit_at: datetime | None = None
+    dead: bool = False
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Callable, Iterable
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from kbeton.importers.counterparties_importer import CounterpartyRow
+from kbeton.importers.utils import iter_chunks
+from kbeton.models.counterparty import CounterpartyBalance, CounterpartySnapshot
+from kbeton.models.finance import ImportJob
+from kbeton.services.import_jobs import checkpoint, import_progress, save_progress, skip_done_rows
+
+COUNTERPARTY_IMPORT_CHUNK_SIZE = 1000
+
+
+def latest_counterparty_snapshot(session: Session) -> CounterpartySnapshot | None:
+    # Imports commit in chunks; a snapshot is visible only once its job is done.
+    return (
+        session.query(CounterpartySnapshot)
+        .join(ImportJob, ImportJob.id == CounterpartySnapshot.import_job_id)
+        .filter(ImportJob.status == "done")
+        .order_by(CounterpartySnapshot.id.desc())
+        .first()
+    )
+
+
+def _row_key(row: CounterpartyRow) -> str:
+    return f"{row.counterparty_name_norm}|{row.receivable_money}|{row.payable_money}|{row.ending_balance_money}"
+
+
+def import_counterparty_rows(
+    session: Session,
+    *,
+    job: ImportJob,
+    rows: Iterable[CounterpartyRow],
+    snapshot_date: date,
+    chunk_size: int = COUNTERPARTY_IMPORT_CHUNK_SIZE,
+    commit_chunks: bool = False,
+    on_chunk: Callable[[dict], None] | None = None,
+) -> dict:
+    """Write a balance snapshot chunk by chunk; with commit_chunks a rerun
+    reuses the snapshot and resumes after the last committed chunk."""
+    progress = import_progress(job)
+    snap = session.get(CounterpartySnapshot, progress["snapshot_id"]) if progress.get("snapshot_id") else None
+    if snap is None:
+        progress = {}
+        snap = CounterpartySnapshot(snapshot_date=snapshot_date, import_job_id=job.id)
+        session.add(snap)
+        session.flush()
+    total = resumed = int(progress.get("rows_done") or 0)
+    for chunk in iter_chunks(skip_done_rows(rows, progress, _row_key), chunk_size):
+        session.execute(insert(CounterpartyBalance), [
+            {
+                "snapshot_id": snap.id,
+                "counterparty_name": r.counterparty_name,
+                "counterparty_name_norm": r.counterparty_name_norm,
+                "receivable_money": r.receivable_money,
+                "receivable_assets": r.receivable_assets,
+                "payable_money": r.payable_money,
+                "payable_assets": r.payable_assets,
+                "ending_balance_money": r.ending_balance_money,
+            }
+            for r in chunk
+        ])
+        total += len(chunk)
+        if commit_chunks:
+            save_progress(session, job, checkpoint(total, [_row_key(r) for r in chunk], snapshot_id=snap.id), rows=total)
+        if on_chunk is not None:
+            on_chunk({"rows": total, "resumed": resumed})
+    return {"rows": total, "snapshot_id": snap.id, "snapshot_date": snap.snapshot_date.isoformat()}
+
+
+def discard_counterparty_import(session: Session, job: ImportJob) -> None:
+    snap_ids = [s.id for s in session.query(CounterpartySnapshot.id).filter(CounterpartySnapshot.import_job_id == job.id)]
+    if snap_ids:
+        session.query(CounterpartyBalance).filter(CounterpartyBalance.snapshot_id.in_(snap_ids)).delete(synchronize_session=False)
+        session.query(CounterpartySnapshot).filter(CounterpartySnapshot.id.in_(snap_ids)).delete(synchronize_session=False)
@@ -1,16 +1,43 @@
 from __future__ import annotations
 
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from datetime import date, timedelta
+from typing import Callable, ContextManager
 
-from sqlalchemy import and_, or_
+import structlog
+from sqlalchemy import and_, text
 from sqlalchemy.orm import Session
 
 from kbeton.importers.utils import norm_counterparty_name
-from kbeton.models.counterparty import CounterpartyBalance, CounterpartySnapshot
-from kbeton.models.enums import ProductType, ShiftStatus, TxType
-from kbeton.models.finance import FinanceArticle, FinanceTransaction
+from kbeton.models.counterparty import CounterpartyBalance
+from kbeton.models.enums import ProductType, ShiftStatus
 from kbeton.models.inventory import InventoryBalance, InventoryItem
 from kbeton.models.production import ProductionOutput, ProductionRealization, ProductionShift
+from kbeton.services.counterparties import latest_counterparty_snapshot
+from kbeton.services.finance_agg import channel_balances
+
+log = structlog.get_logger(__name__)
+
+
+def period_range(period: str, today: date | None = None) -> tuple[date, date]:
+    """(start, end) of the current day / week / month / quarter / year up to today."""
+    today = today or date.today()
+    if period == "day":
+        return today, today
+    if period == "week":
+        start = today - timedelta(days=today.weekday())
+        return start, today
+    if period == "month":
+        return date(today.year, today.month, 1), today
+    if period == "quarter":
+        q = (today.month - 1)//3
+        m = q*3 + 1
+        return date(today.year, m, 1), today
+    if period == "year":
+        return date(today.year, 1, 1), today
+    return today, today
 
 
 def _bar(value: float, max_value: float, width: int = 10) -> str:
@@ -82,65 +109,24 @@ def _product_type_label(value: ProductType | str) -> str:
     return labels.get(enum_value, enum_value.value)
 
 
-def _latest_counterparty_snapshot_map(session: Session) -> tuple[CounterpartySnapshot | None, dict[str, CounterpartyBalance]]:
-    snap = session.query(CounterpartySnapshot).order_by(CounterpartySnapshot.id.desc()).first()
-    if not snap:
-        return None, {}
-    rows = session.query(CounterpartyBalance).filter(CounterpartyBalance.snapshot_id == snap.id).all()
-    return snap, {r.counterparty_name_norm: r for r in rows}
-
-
-def _channel_bucket(raw_value: str) -> str | None:
-    value = (raw_value or "").strip().lower()
-    if not value:
-        return None
-    if any(token in value for token in ["касса", "нал", "налич", "cash"]):
-        return "cash"
-    if any(token in value for token in ["банк", "р/с", "рс", "расчет", "расч", "безнал", "bank"]):
-        return "bank"
-    return None
-
-
-def _dashboard_money_lines(session: Session, *, end: date) -> list[str]:
+def _counterparty_receivables(session: Session, snapshot_id: int | None, names_norm: set[str]) -> dict[str, float]:
+    """Receivable per normalized name, for just the given names of the snapshot."""
+    if snapshot_id is None or not names_norm:
+        return {}
     rows = (
-        session.query(
-            FinanceTransaction.amount,
-            FinanceTransaction.tx_type,
-            FinanceTransaction.description,
-            FinanceTransaction.raw_fields,
-            FinanceArticle.name,
-        )
-        .outerjoin(
-            FinanceArticle,
-            or_(
-                FinanceArticle.id == FinanceTransaction.income_article_id,
-                FinanceArticle.id == FinanceTransaction.expense_article_id,
-            ),
-        )
-        .filter(FinanceTransaction.date.is_not(None))
-        .filter(FinanceTransaction.date <= end)
+        session.query(CounterpartyBalance.counterparty_name_norm, CounterpartyBalance.receivable_money)
+        .filter(CounterpartyBalance.snapshot_id == snapshot_id)
+        .filter(CounterpartyBalance.counterparty_name_norm.in_(names_norm))
+        .order_by(CounterpartyBalance.id.asc())
         .all()
     )
+    return {norm: float(amount or 0) for norm, amount in rows}
 
-    totals = {"bank": 0.0, "cash": 0.0}
-    seen = {"bank": False, "cash": False}
-
-    for amount, tx_type, description, raw_fields, article_name in rows:
-        bucket = None
-        payload = raw_fields or {}
-        if isinstance(payload, dict):
-            for key in ["payment_channel", "account_type", "channel", "source_account", "wallet"]:
-                bucket = _channel_bucket(str(payload.get(key, "")))
-                if bucket:
-                    break
-        if not bucket:
-            bucket = _channel_bucket(f"{article_name or ''} {description or ''}")
-        if not bucket:
-            continue
 
-        sign = 1.0 if tx_type == TxType.income else -1.0 if tx_type == TxType.expense else 0.0
-        totals[bucket] += sign * float(amount or 0)
-        seen[bucket] = True
+def _dashboard_money_lines(session: Session, *, end: date) -> list[str]:
+    balances = channel_balances(session, end=end)
+    totals = {channel: balances.get(channel, (0.0, 0))[0] for channel in ("bank", "cash")}
+    seen = {channel: channel in balances for channel in ("bank", "cash")}
 
     lines = [
         f"Р/с      · {_fmt_money(totals['bank'])}" if seen["bank"] else "Р/с      · нет данных",
@@ -156,7 +142,7 @@ def _dashboard_realization_lines(
     *,
     start: date,
     end: date,
-    cp_map: dict[str, CounterpartyBalance],
+    snapshot_id: int | None,
     limit: int = 5,
 ) -> list[str]:
     rows = (
@@ -180,13 +166,16 @@ def _dashboard_realization_lines(
         lines.append("- нет данных")
         return lines
 
+    receivables = _counterparty_receivables(
+        session, snapshot_id, {norm_counterparty_name((r[0] or "").strip()) for r in rows} - {""}
+    )
     for idx, (counterparty_name, product_type, mark, uom, realized_qty, total_amount) in enumerate(rows):
         cp_name = (counterparty_name or "").strip()
         cp_norm = norm_counterparty_name(cp_name)
-        cp_row = cp_map.get(cp_norm) if cp_norm else None
-        if cp_row and float(cp_row.receivable_money or 0) > 0:
-            status = f"долг {_fmt_money(cp_row.receivable_money)}"
-        elif cp_row:
+        receivable = receivables.get(cp_norm) if cp_norm else None
+        if receivable is not None and receivable > 0:
+            status = f"долг {_fmt_money(receivable)}"
+        elif receivable is not None:
             status = "оплачено"
         else:
             status = "нет данных"
@@ -308,47 +297,155 @@ def _dashboard_inventory_lines(session: Session, *, compact: bool = False) -> li
     return lines
 
 
-def build_dashboard_text(session: Session, *, start: date, end: date, mode: str = "full") -> str:
-    compact = mode == "summary"
-    snap, cp_map = _latest_counterparty_snapshot_map(session)
-    cp_rows = list(cp_map.values())
-    debtors = sorted(
-        ((r.counterparty_name, float(r.receivable_money or 0)) for r in cp_rows if float(r.receivable_money or 0) > 0),
-        key=lambda x: x[1],
-        reverse=True,
-    )
-    creditors = sorted(
-        ((r.counterparty_name, float(r.payable_money or 0)) for r in cp_rows if float(r.payable_money or 0) > 0),
-        key=lambda x: x[1],
-        reverse=True,
+def _section_body(lines: list[str]) -> list[str]:
+    return ["нет данных"] if len(lines) == 2 and lines[1] == "- нет данных" else lines[1:]
+
+
+def _top_counterparties(session: Session, snapshot_id: int | None, column, limit: int) -> list[tuple[str, float]]:
+    if snapshot_id is None:
+        return []
+    rows = (
+        session.query(CounterpartyBalance.counterparty_name, column)
+        .filter(CounterpartyBalance.snapshot_id == snapshot_id, column > 0)
+        .order_by(column.desc(), CounterpartyBalance.id.asc())
+        .limit(limit)
+        .all()
     )
+    return [(name, float(amount or 0)) for name, amount in rows]
 
-    lines = _boxed_header("Д А Ш Б О Р Д", end.strftime("%d.%m.%Y"))
-    money_lines = _dashboard_money_lines(session, end=end)
-    if snap:
-        money_lines.append(f"Снимок   · {snap.snapshot_date.strftime('%d.%m.%Y')}")
-    if compact and len(money_lines) > 3:
-        money_lines = money_lines[:3]
-    lines.extend([""] + _dashboard_section("ДЕНЬГИ", "💰", money_lines))
 
-    realization_lines = _dashboard_realization_lines(session, start=start, end=end, cp_map=cp_map, limit=3 if compact else 5)
-    realization_body = ["нет данных"] if len(realization_lines) == 2 and realization_lines[1] == "- нет данных" else realization_lines[1:]
-    lines.extend([""] + _dashboard_section(realization_lines[0], "🚚", realization_body))
+@dataclass(frozen=True)
+class _DashboardQuery:
+    start: date
+    end: date
+    compact: bool
+    snapshot_id: int | None
+    snapshot_date: date | None
+
+
+def _money_section(session: Session, q: _DashboardQuery) -> list[str]:
+    lines = _dashboard_money_lines(session, end=q.end)
+    if q.snapshot_date:
+        lines.append(f"Снимок   · {q.snapshot_date.strftime('%d.%m.%Y')}")
+    return lines[:3] if q.compact else lines
+
 
-    debt_lines = _dashboard_counterparty_lines("Д/З ЗАДОЛЖЕННОСТЬ", debtors, limit=3 if compact else 5)
-    debt_body = ["нет данных"] if len(debt_lines) == 2 and debt_lines[1] == "- нет данных" else debt_lines[1:]
-    lines.extend([""] + _dashboard_section(debt_lines[0], "📥", debt_body))
+def _realization_section(session: Session, q: _DashboardQuery) -> list[str]:
+    lines = _dashboard_realization_lines(session, start=q.start, end=q.end, snapshot_id=q.snapshot_id, limit=3 if q.compact else 5)
+    return _section_body(lines)
 
-    credit_lines = _dashboard_counterparty_lines("К/З ЗАДОЛЖЕННОСТЬ", creditors, limit=3 if compact else 5)
-    credit_body = ["нет данных"] if len(credit_lines) == 2 and credit_lines[1] == "- нет данных" else credit_lines[1:]
-    lines.extend([""] + _dashboard_section(credit_lines[0], "📤", credit_body))
 
-    prod_lines = _dashboard_production_lines(session, start=start, end=end, limit=3 if compact else None)
-    prod_body = ["нет данных"] if len(prod_lines) == 2 and prod_lines[1] == "- нет данных" else prod_lines[1:]
-    lines.extend([""] + _dashboard_section(prod_lines[0].rstrip(":"), "🏭", prod_body))
+def _receivables_section(session: Session, q: _DashboardQuery) -> list[str]:
+    limit = 3 if q.compact else 5
+    debtors = _top_counterparties(session, q.snapshot_id, CounterpartyBalance.receivable_money, limit)
+    return _section_body(_dashboard_counterparty_lines("Д/З ЗАДОЛЖЕННОСТЬ", debtors, limit=limit))
 
-    stock_lines = _dashboard_inventory_lines(session, compact=compact)
-    stock_body = ["нет данных"] if len(stock_lines) == 2 and stock_lines[1] == "- нет данных" else stock_lines[1:]
-    lines.extend([""] + _dashboard_section(stock_lines[0].rstrip(":"), "📦", stock_body))
 
+def _payables_section(session: Session, q: _DashboardQuery) -> list[str]:
+    limit = 3 if q.compact else 5
+    creditors = _top_counterparties(session, q.snapshot_id, CounterpartyBalance.payable_money, limit)
+    return _section_body(_dashboard_counterparty_lines("К/З ЗАДОЛЖЕННОСТЬ", creditors, limit=limit))
+
+
+def _production_section(session: Session, q: _DashboardQuery) -> list[str]:
+    return _section_body(_dashboard_production_lines(session, start=q.start, end=q.end, limit=3 if q.compact else None))
+
+
+def _inventory_section(session: Session, q: _DashboardQuery) -> list[str]:
+    return _section_body(_dashboard_inventory_lines(session, compact=q.compact))
+
+
+# (key, title, icon, body builder) in display order. The builders only read and
+# share nothing but the query, so each can run on its own session.
+DASHBOARD_SECTIONS: list[tuple[str, str, str, Callable[[Session, _DashboardQuery], list[str]]]] = [
+    ("money", "ДЕНЬГИ", "💰", _money_section),
+    ("realization", "РЕАЛИЗАЦИЯ", "🚚", _realization_section),
+    ("receivables", "Д/З ЗАДОЛЖЕННОСТЬ", "📥", _receivables_section),
+    ("payables", "К/З ЗАДОЛЖЕННОСТЬ", "📤", _payables_section),
+    ("production", "Производство", "🏭", _production_section),
+    ("inventory", "Склад", "📦", _inventory_section),
+]
+# per-section budget when sections run concurrently; a late section shows "нет данных"
+DASHBOARD_SECTION_TIMEOUT_SECONDS = 5.0
+# statement_timeout of a section session when the caller waits without a budget
+# (the worker's snapshots): a stuck query must still give its connection back
+DASHBOARD_STATEMENT_TIMEOUT_SECONDS = 120.0
+
+
+def _timed_section(key: str, build, session: Session, q: _DashboardQuery) -> list[str]:
+    started = time.perf_counter()
+    try:
+        return build(session, q)
+    finally:
+        log.info("dashboard_section", section=key, ms=round((time.perf_counter() - started) * 1000, 1))
+
+
+def _run_section(session_factory, key: str, build, q: _DashboardQuery, statement_timeout: float) -> list[str]:
+    with session_factory() as session:
+        if session.get_bind().dialect.name == "postgresql":
+            # transaction-local: the pooled connection goes back with its default
+            session.execute(
+                text("SELECT set_config('statement_timeout', :ms, true)"), {"ms": str(int(statement_timeout * 1000))}
+            )
+        return _timed_section(key, build, session, q)
+
+
+def _gather_sections(session_factory, q: _DashboardQuery, timeout: float | None) -> dict[str, list[str]]:
+    statement_timeout = timeout if timeout is not None else DASHBOARD_STATEMENT_TIMEOUT_SECONDS
+    executor = ThreadPoolExecutor(max_workers=len(DASHBOARD_SECTIONS), thread_name_prefix="dashboard")
+    futures = {
+        key: executor.submit(_run_section, session_factory, key, build, q, statement_timeout)
+        for key, _title, _icon, build in DASHBOARD_SECTIONS
+    }
+    # One shared deadline: the sections run side by side, so the screen waits
+    # for the slowest of them, at most `timeout` (None: until all are done).
+    wait(futures.values(), timeout=timeout)
+    # A late section is not waited for; statement_timeout ends its query on
+    # the server soon after, which returns its connection to the pool.
+    executor.shutdown(wait=False, cancel_futures=True)
+    bodies: dict[str, list[str]] = {}
+    for key, future in futures.items():
+        if not future.done():
+            log.warning("dashboard_section_timeout", section=key, timeout=timeout)
+            bodies[key] = ["нет данных"]
+        elif future.exception() is not None:
+            log.warning("dashboard_section_failed", section=key, error=str(future.exception()))
+            bodies[key] = ["нет данных"]
+        else:
+            bodies[key] = future.result()
+    return bodies
+
+
+def build_dashboard_text(
+    session: Session,
+    *,
+    start: date,
+    end: date,
+    mode: str = "full",
+    session_factory: Callable[[], ContextManager[Session]] | None = None,
+    section_timeout: float | None = DASHBOARD_SECTION_TIMEOUT_SECONDS,
+) -> str:
+    """Render the dashboard.
+
+    With ``session_factory`` (e.g. ``session_scope``) the sections are queried
+    concurrently, each on its own session, and a section that misses
+    ``section_timeout`` or fails is shown as "нет данных"; ``None`` waits for
+    every section. Without it they run one after another on ``session``.
+    """
+    snap = latest_counterparty_snapshot(session)
+    q = _DashboardQuery(
+        start=start,
+        end=end,
+        compact=mode == "summary",
+        snapshot_id=snap.id if snap else None,
+        snapshot_date=snap.snapshot_date if snap else None,
+    )
+    if session_factory is not None:
+        bodies = _gather_sections(session_factory, q, section_timeout)
+    else:
+        bodies = {key: _timed_section(key, build, session, q) for key, _title, _icon, build in DASHBOARD_SECTIONS}
+
+    lines = _boxed_header("Д А Ш Б О Р Д", end.strftime("%d.%m.%Y"))
+    for key, title, icon, _build in DASHBOARD_SECTIONS:
+        lines.extend([""] + _dashboard_section(title, icon, bodies[key]))
     return "\n".join(lines)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import html
+import json
+from datetime import date, datetime
+
+import redis
+import structlog
+from sqlalchemy.orm import Session
+
+from kbeton.services.dashboard import build_dashboard_text, period_range
+from kbeton.services.redis_client import get_redis
+
+log = structlog.get_logger(__name__)
+
+# Every (period, mode) pair dashboard_reply_markup can ask for.
+DASHBOARD_PERIODS = ("day", "week", "month", "year")
+DASHBOARD_MODES = ("summary", "full")
+
+DASHBOARD_KEY = "dashboard:{period}:{mode}"
+# beat refresh interval; the TTL outlives a few missed runs, then the bot computes inline
+DASHBOARD_REFRESH_SECONDS = 300
+DASHBOARD_TTL_SECONDS = 3 * DASHBOARD_REFRESH_SECONDS
+# changes within this window are folded into one refresh at its end
+DASHBOARD_DEBOUNCE_SECONDS = 10
+DASHBOARD_REFRESH_PENDING_KEY = "dashboard:refresh_pending"
+REFRESH_DASHBOARDS_TASK = "apps.worker.tasks.refresh_dashboards"
+
+
+_PERIOD_LABELS = (("day", "Сегодня"), ("week", "Неделя"), ("month", "Месяц"), ("year", "Год"))
+_MODE_LABELS = (("summary", "Кратко"), ("full", "Подробно"))
+
+
+def dashboard_reply_markup(active_period: str = "month", active_mode: str = "full", live: bool = False) -> dict:
+    """Inline keyboard under the dashboard as a plain Bot API reply_markup;
+    the bot wraps it in aiogram types, the worker sends it as is."""
+    periods = [
+        {"text": f"{'● ' if period == active_period else ''}{label}", "callback_data": f"dashboard:period:{period}:{active_mode}"}
+        for period, label in _PERIOD_LABELS
+    ]
+    modes = [
+        {"text": f"{'● ' if mode == active_mode else ''}{label}", "callback_data": f"dashboard:mode:{mode}:{active_period}"}
+        for mode, label in _MODE_LABELS
+    ]
+    if live:
+        live_button = {"text": "● 📡 Live", "callback_data": f"dashlive:off:{active_period}:{active_mode}"}
+    else:
+        live_button = {"text": "📡 Live", "callback_data": f"dashlive:on:{active_period}:{active_mode}"}
+    return {"inline_keyboard": [periods[:2], periods[2:], modes, [live_button]]}
+
+
+def dashboard_key(period: str, mode: str) -> str:
+    return DASHBOARD_KEY.format(period=period, mode=mode)
+
+
+def store_dashboard(
+    period: str, mode: str, text: str, *, end: date, client: redis.Redis | None = None, now: datetime | None = None
+) -> dict:
+    snapshot = {"text": text, "end": end.isoformat(), "as_of": (now or datetime.now().astimezone()).isoformat()}
+    try:
+        (client or get_redis()).set(dashboard_key(period, mode), json.dumps(snapshot), ex=DASHBOARD_TTL_SECONDS)
+    except redis.RedisError as e:
+        log.warning("dashboard_snapshot_write_failed", period=period, mode=mode, error=str(e))
+    return snapshot
+
+
+def read_dashboard(period: str, mode: str, *, today: date | None = None, client: redis.Redis | None = None) -> dict | None:
+    """The stored snapshot, or None when missing or computed for an earlier day."""
+    try:
+        raw = (client or get_redis()).get(dashboard_key(period, mode))
+    except redis.RedisError as e:
+        log.warning("dashboard_snapshot_read_failed", period=period, mode=mode, error=str(e))
+        return None
+    if not raw:
+        return None
+    snapshot = json.loads(raw)
+    if snapshot.get("end") != (today or date.today()).isoformat():
+        return None  # rolled over midnight: "today" / "this week" mean something else now
+    return snapshot
+
+
+def materialize_dashboards(
+    session: Session, *, today: date | None = None, client: redis.Redis | None = None, session_factory=None
+) -> int:
+    """Build and store every (period, mode) dashboard. Returns how many were written.
+
+    ``session_factory`` is passed to build_dashboard_text to query sections
+    concurrently. There is no section budget here: a snapshot is served for
+    DASHBOARD_TTL_SECONDS, so a slow section is waited for rather than
+    cached as "нет данных".
+    """
+    written = 0
+    for period in DASHBOARD_PERIODS:
+        start, end = period_range(period, today)
+        for mode in DASHBOARD_MODES:
+            text = build_dashboard_text(
+                session, start=start, end=end, mode=mode, session_factory=session_factory, section_timeout=None
+            )
+            store_dashboard(period, mode, text, end=end, client=client)
+            written += 1
+    return written
+
+
+def request_dashboard_refresh(celery_app, *, client: redis.Redis | None = None) -> bool:
+    """Schedule one refresh_dashboards run DASHBOARD_DEBOUNCE_SECONDS from now,
+    unless one is already pending. Returns True when a run was scheduled."""
+    try:
+        pending = (client or get_redis()).set(DASHBOARD_REFRESH_PENDING_KEY, "1", nx=True, ex=DASHBOARD_DEBOUNCE_SECONDS)
+    except redis.RedisError as e:
+        log.warning("dashboard_refresh_debounce_failed", error=str(e))
+        pending = True
+    if not pending:
+        return False
+    celery_app.send_task(REFRESH_DASHBOARDS_TASK, countdown=DASHBOARD_DEBOUNCE_SECONDS)
+    return True
+
+
+def as_of_label(snapshot: dict) -> str:
+    return datetime.fromisoformat(snapshot["as_of"]).strftime("%d.%m.%Y %H:%M")
+
+
+def dashboard_html(snapshot: dict) -> str:
+    return f"<pre>{html.escape(snapshot['text'])}</pre>\nДанные на {as_of_label(snapshot)}"
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Iterable
+
+from sqlalchemy import case, delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from kbeton.importers.utils import channel_bucket, payment_channel
+from kbeton.models.enums import TxType
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction
+from kbeton.models.versions import DataVersion
+from kbeton.services.versions import FINANCE_VERSION, bump_version
+
+# Two summaries of finance_transactions: finance_daily_agg (P&L) and
+# finance_channel_balances (bank / cash movement per day for the dashboard balances).
+# Rows that change through the ORM (manual entries, seed data) are folded in by the
+# mapper listeners below; bulk Core statements (import chunks, cluster / rule
+# reassignment, discarded imports) pass their RETURNING rows to apply_agg_rows.
+
+AggKey = tuple[date, TxType, int]
+ChannelKey = tuple[str, date]
+
+
+def _article_id(tx_type, income_article_id, expense_article_id) -> int:
+    if tx_type == TxType.income:
+        return income_article_id or 0
+    if tx_type == TxType.expense:
+        return expense_article_id or 0
+    return 0
+
+
+def agg_deltas(rows: Iterable, sign: int = 1) -> dict[AggKey, list]:
+    """(date, tx_type, article_id) -> [amount, count] for rows carrying date,
+    tx_type, amount, income_article_id, expense_article_id."""
+    out: dict[AggKey, list] = defaultdict(lambda: [Decimal(0), 0])
+    for r in rows:
+        if r.date is None:
+            continue  # undated rows never reach a P&L
+        key = (r.date, TxType(r.tx_type), _article_id(r.tx_type, r.income_article_id, r.expense_article_id))
+        out[key][0] += sign * Decimal(str(r.amount or 0))
+        out[key][1] += sign
+    return out
+
+
+def _signed_amount(tx_type, amount) -> Decimal:
+    value = Decimal(str(amount or 0))
+    if tx_type == TxType.income:
+        return value
+    if tx_type == TxType.expense:
+        return -value
+    return Decimal(0)
+
+
+def channel_deltas(rows: Iterable, sign: int = 1) -> dict[ChannelKey, list]:
+    """(payment_channel, date) -> [net amount, count]; rows without a channel are skipped."""
+    out: dict[ChannelKey, list] = defaultdict(lambda: [Decimal(0), 0])
+    for r in rows:
+        if r.date is None or not r.payment_channel:
+            continue
+        key = (r.payment_channel, r.date)
+        out[key][0] += sign * _signed_amount(r.tx_type, r.amount)
+        out[key][1] += sign
+    return out
+
+
+def _merged(added: dict, removed: dict) -> dict:
+    for key, (amount, count) in removed.items():
+        added[key][0] += amount
+        added[key][1] += count
+    return added
+
+
+def _upsert_sums(connection, table, keys: list[str], values: list[dict]) -> bool:
+    """Add amount / tx_count of `values` onto the rows with the same keys."""
+    if not values:
+        return False
+    dialect = sqlite if connection.dialect.name == "sqlite" else postgresql
+    stmt = dialect.insert(table).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            "amount": table.c.amount + stmt.excluded.amount,
+            "tx_count": table.c.tx_count + stmt.excluded.tx_count,
+        },
+    )
+    connection.execute(stmt)
+    return True
+
+
+def _upsert(connection, deltas: dict[AggKey, list]) -> bool:
+    values = [
+        {"date": d, "tx_type": t, "article_id": a, "amount": amount, "tx_count": count}
+        for (d, t, a), (amount, count) in sorted(deltas.items(), key=lambda kv: (kv[0][0], kv[0][1].value, kv[0][2]))
+        if amount or count
+    ]
+    return _upsert_sums(connection, FinanceDailyAgg.__table__, ["date", "tx_type", "article_id"], values)
+
+
+def _apply_channel_deltas(connection, deltas: dict[ChannelKey, list]) -> bool:
+    # per-day rows only: a backdated change touches its own day, and the
+    # balance is summed at read time (channel_balances)
+    values = [
+        {"channel": channel, "date": d, "amount": amount, "tx_count": count}
+        for (channel, d), (amount, count) in sorted(deltas.items())
+        if amount or count
+    ]
+    return _upsert_sums(connection, FinanceChannelBalance.__table__, ["channel", "date"], values)
+
+
+def _apply(connection, *, added: Iterable = (), removed: Iterable = ()) -> None:
+    added, removed = list(added), list(removed)
+    daily = _upsert(connection, _merged(agg_deltas(added), agg_deltas(removed, sign=-1)))
+    channels = _apply_channel_deltas(connection, _merged(channel_deltas(added), channel_deltas(removed, sign=-1)))
+    if daily or channels:
+        _bump_finance_version(connection, sqlite if connection.dialect.name == "sqlite" else postgresql)
+
+
+def _bump_finance_version(connection, dialect) -> None:
+    # same transaction as the rollup change, so cached P&L keyed on the old
+    # version goes stale exactly when the new figures become visible
+    stmt = dialect.insert(DataVersion).values(name=FINANCE_VERSION, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"version": DataVersion.__table__.c.version + 1, "updated_at": func.now()},
+    )
+    connection.execute(stmt)
+
+
+def apply_agg_rows(session: Session, *, added: Iterable = (), removed: Iterable = ()) -> None:
+    _apply(session.connection(), added=added, removed=removed)
+
+
+AGG_RETURNING = (
+    FinanceTransaction.date,
+    FinanceTransaction.tx_type,
+    FinanceTransaction.amount,
+    FinanceTransaction.income_article_id,
+    FinanceTransaction.expense_article_id,
+    FinanceTransaction.payment_channel,
+)
+
+
+def rebuild_daily_agg(session: Session) -> int:
+    """Recompute the whole rollup from finance_transactions. Returns row count."""
+    article = case(
+        (FinanceTransaction.tx_type == TxType.income, func.coalesce(FinanceTransaction.income_article_id, 0)),
+        (FinanceTransaction.tx_type == TxType.expense, func.coalesce(FinanceTransaction.expense_article_id, 0)),
+        else_=0,
+    )
+    session.execute(delete(FinanceDailyAgg))
+    source = (
+        select(
+            FinanceTransaction.date,
+            FinanceTransaction.tx_type,
+            article.label("article_id"),
+            func.sum(FinanceTransaction.amount),
+            func.count(FinanceTransaction.id),
+        )
+        .where(FinanceTransaction.date.is_not(None))
+        .group_by(FinanceTransaction.date, FinanceTransaction.tx_type, article)
+    )
+    session.execute(
+        insert(FinanceDailyAgg).from_select(["date", "tx_type", "article_id", "amount", "tx_count"], source)
+    )
+    bump_version(session, FINANCE_VERSION)
+    return session.execute(select(func.count()).select_from(FinanceDailyAgg)).scalar_one()
+
+
+def rebuild_channel_balances(session: Session) -> int:
+    """Recompute finance_channel_balances from finance_transactions. Returns row count."""
+    tx = FinanceTransaction
+    source = (
+        select(
+            tx.payment_channel,
+            tx.date,
+            func.sum(case((tx.tx_type == TxType.income, tx.amount), (tx.tx_type == TxType.expense, -tx.amount), else_=0)),
+            func.count(tx.id),
+        )
+        .where(tx.payment_channel.is_not(None), tx.date.is_not(None))
+        .group_by(tx.payment_channel, tx.date)
+    )
+    session.execute(delete(FinanceChannelBalance))
+    session.execute(
+        insert(FinanceChannelBalance).from_select(["channel", "date", "amount", "tx_count"], source)
+    )
+    bump_version(session, FINANCE_VERSION)
+    return session.execute(select(func.count()).select_from(FinanceChannelBalance)).scalar_one()
+
+
+def channel_balances(session: Session, *, end: date) -> dict[str, tuple[float, int]]:
+    """channel -> (balance, tx count) as of `end`, one SUM over the per-day
+    rows; channels with no transactions up to `end` are absent."""
+    rows = session.execute(
+        select(
+            FinanceChannelBalance.channel,
+            func.sum(FinanceChannelBalance.amount),
+            func.sum(FinanceChannelBalance.tx_count),
+        )
+        .where(FinanceChannelBalance.date <= end)
+        .group_by(FinanceChannelBalance.channel)
+    ).all()
+    return {channel: (float(amount or 0), int(count)) for channel, amount, count in rows if count}
+
+
+def apply_classified_rows(session: Session, rows: Iterable, *, had_channel: bool = True) -> None:
+    """Rollup update for rows an UPDATE ... RETURNING moved out of `unknown`;
+    had_channel=False when the same UPDATE also gave them their payment channel."""
+    rows = list(rows)
+    was_unknown = [
+        SimpleNamespace(
+            date=r.date, tx_type=TxType.unknown, amount=r.amount, income_article_id=None, expense_article_id=None,
+            payment_channel=r.payment_channel if had_channel else None,
+        )
+        for r in rows
+    ]
+    apply_agg_rows(session, added=rows, removed=was_unknown)
+
+
+def _update_returning(session: Session, where: list, values: dict) -> list:
+    return session.execute(
+        update(FinanceTransaction)
+        .where(*where)
+        .values(**values)
+        .returning(*AGG_RETURNING)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+
+def classify_unknown_rows(
+    session: Session, where, *, tx_type: TxType, income_article_id: int | None, expense_article_id: int | None
+) -> int:
+    """Move the unknown transactions matching `where` to the article and fold
+    them into both rollups. Rows still without a payment channel take the one
+    the article name implies ("Касса: ...", "Поступление на р/с"): at insert
+    they had neither statement columns nor a description to go by.
+    Returns the number of rows changed."""
+    values = {"tx_type": tx_type, "income_article_id": income_article_id, "expense_article_id": expense_article_id}
+    unknown = [where, FinanceTransaction.tx_type == TxType.unknown]
+    article_id = income_article_id or expense_article_id
+    article_name = None
+    if article_id:
+        article_name = session.execute(select(FinanceArticle.name).where(FinanceArticle.id == article_id)).scalar_one_or_none()
+    channel = channel_bucket(article_name or "")
+    changed = 0
+    if channel:
+        rows = _update_returning(session, [*unknown, FinanceTransaction.payment_channel.is_(None)], dict(values, payment_channel=channel))
+        apply_classified_rows(session, rows, had_channel=False)
+        changed += len(rows)
+    rows = _update_returning(session, unknown, values)
+    apply_classified_rows(session, rows)
+    return changed + len(rows)
+
+
+_AGG_FIELDS = ("date", "tx_type", "amount", "income_article_id", "expense_article_id", "payment_channel")
+
+
+def _previous(target) -> SimpleNamespace | None:
+    state = inspect(target)
+    old = {}
+    changed = False
+    for name in _AGG_FIELDS:
+        hist = state.attrs[name].history
+        if hist.deleted:
+            old[name] = hist.deleted[0]
+            changed = True
+        else:
+            old[name] = getattr(target, name)
+    return SimpleNamespace(**old) if changed else None
+
+
+@event.listens_for(FinanceTransaction, "before_insert")
+def _resolve_payment_channel(mapper, connection, target) -> None:
+    # ORM inserts (manual entries, seed data) get their channel here; the Core
+    # import sets it in its VALUES already
+    if target.payment_channel is not None:
+        return
+    article_id = target.income_article_id or target.expense_article_id
+    article_name = None
+    if article_id:
+        article_name = connection.execute(select(FinanceArticle.name).where(FinanceArticle.id == article_id)).scalar_one_or_none()
+    target.payment_channel = payment_channel(target.raw_fields, article_name, target.description)
+
+
+@event.listens_for(FinanceTransaction, "after_insert")
+def _agg_after_insert(mapper, connection, target) -> None:
+    _apply(connection, added=[target])
+
+
+@event.listens_for(FinanceTransaction, "after_update")
+def _agg_after_update(mapper, connection, target) -> None:
+    old = _previous(target)
+    if old is not None:
+        _apply(connection, added=[target], removed=[old])
+
+
+@event.listens_for(FinanceTransaction, "after_delete")
+def _agg_after_delete(mapper, connection, target) -> None:
+    _apply(connection, removed=[target])
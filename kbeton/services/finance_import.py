@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from typing import Callable, Iterable
+
+from sqlalchemy import Integer, bindparam, delete, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from kbeton.importers.finance_importer import FinanceRow, make_dedup_hash
+from kbeton.importers.utils import description_fingerprint, iter_chunks, payment_channel
+from kbeton.models.enums import TxType
+from kbeton.models.finance import FinanceArticle, FinanceTransaction, ImportJob
+from kbeton.services.finance_agg import AGG_RETURNING, apply_agg_rows
+from kbeton.services.import_jobs import checkpoint, import_progress, save_progress, skip_done_rows
+from kbeton.services.mapping import get_rule_engine
+from kbeton.services.rule_stats import flush_rule_stats_if_due
+
+FINANCE_IMPORT_CHUNK_SIZE = 1000
+
+
+def _insert_ignore_duplicates(session: Session, values: list[dict]):
+    # Multi-row INSERT ... ON CONFLICT (dedup_hash) DO NOTHING: a row any import
+    # already stored is skipped by the database, whoever else writes the table.
+    # SQLite is only used by the unit tests, it understands the same clause.
+    if session.get_bind().dialect.name == "sqlite":
+        stmt = sqlite.insert(FinanceTransaction)
+    else:
+        stmt = postgresql.insert(FinanceTransaction)
+    # RETURNING lists only the rows actually inserted; they feed the daily rollup
+    return (
+        stmt.values(values)
+        .on_conflict_do_nothing(index_elements=["dedup_hash"])
+        .returning(*AGG_RETURNING)
+    )
+
+
+def _transaction_values(
+    job_id: int, row: FinanceRow, dedup_hash: str, tx_type: TxType, article_id: int | None, article_names: dict[int, str],
+) -> dict:
+    return {
+        "import_job_id": job_id,
+        "date": row.date,
+        "amount": row.amount,
+        "currency": (row.currency or "KGS")[:10],
+        "tx_type": tx_type,
+        "description": row.description,
+        "counterparty": (row.counterparty or "")[:255],
+        "income_article_id": article_id if tx_type == TxType.income else None,
+        "expense_article_id": article_id if tx_type == TxType.expense else None,
+        "dedup_hash": dedup_hash,
+        "description_fingerprint": description_fingerprint(row.description, row.counterparty),
+        "raw_fields": row.raw_fields,
+        "payment_channel": payment_channel(row.raw_fields, article_names.get(article_id), row.description),
+    }
+
+
+# pg_advisory_xact_lock(namespace, bucket): bucket = first byte of the dedup hash
+FINANCE_DEDUP_LOCK_NAMESPACE = 0x6B626574
+
+_LOCK_DEDUP_BUCKETS = text(
+    # unnest() yields the sorted array in order, so every importer takes the
+    # locks in the same order and two chunks cannot deadlock on them
+    "SELECT count(pg_advisory_xact_lock(:namespace, b)) FROM unnest(:buckets) AS b"
+).bindparams(bindparam("buckets", type_=postgresql.ARRAY(Integer)))
+
+
+def lock_dedup_hashes(session: Session, hashes: set[str]) -> None:
+    """Serialize check-then-insert for these hashes against other importers.
+
+    Uniqueness itself is enforced by ix_fin_txn_dedup_hash. Without the locks,
+    two imports running at once (parts of one batch, or overlapping uploads)
+    would both classify rows the other one stores, and could deadlock waiting
+    on each other's uncommitted index entries taken in file order. The locks
+    are held until the transaction ends, i.e. until the chunk is committed.
+    No-op on SQLite, which has a single writer anyway.
+    """
+    if not hashes or session.get_bind().dialect.name != "postgresql":
+        return
+    buckets = sorted({int(h[:2], 16) for h in hashes})
+    session.execute(_LOCK_DEDUP_BUCKETS, {"namespace": FINANCE_DEDUP_LOCK_NAMESPACE, "buckets": buckets})
+
+
+def existing_dedup_hashes(session: Session, hashes: set[str]) -> set[str]:
+    """Hashes already stored by any import (served by ix_fin_txn_dedup_hash)."""
+    if not hashes:
+        return set()
+    stmt = select(FinanceTransaction.dedup_hash).where(FinanceTransaction.dedup_hash.in_(hashes)).distinct()
+    return set(session.execute(stmt).scalars())
+
+
+def insert_finance_chunk(session: Session, values: list[dict]) -> int:
+    if not values:
+        return 0
+    inserted = session.execute(_insert_ignore_duplicates(session, values)).all()
+    apply_agg_rows(session, added=inserted)
+    return len(inserted)
+
+
+def import_finance_rows(
+    session: Session,
+    *,
+    job: ImportJob,
+    rows: Iterable[FinanceRow],
+    chunk_size: int = FINANCE_IMPORT_CHUNK_SIZE,
+    commit_chunks: bool = False,
+    on_chunk: Callable[[dict], None] | None = None,
+) -> dict:
+    """Insert rows chunk by chunk; with commit_chunks every chunk is committed
+    together with a progress cursor, and a rerun resumes after the last one."""
+    engine = get_rule_engine(session)
+    article_names = dict(session.execute(select(FinanceArticle.id, FinanceArticle.name)).all())
+    progress = import_progress(job)
+    done = (job.summary or {}) if progress else {}
+    total = resumed = int(done.get("rows") or 0)
+    inserted = int(done.get("inserted") or 0)
+    unknown = int(done.get("unknown") or 0)
+    seen: set[str] = set()
+    for chunk in iter_chunks(skip_done_rows(rows, progress, make_dedup_hash), chunk_size):
+        total += len(chunk)
+        hashes = [make_dedup_hash(row) for row in chunk]
+        by_hash: dict[str, FinanceRow] = {}
+        for h, row in zip(hashes, chunk):
+            if h not in seen and h not in by_hash:
+                by_hash[h] = row
+        lock_dedup_hashes(session, set(by_hash))
+        existing = existing_dedup_hashes(session, set(by_hash))
+        fresh = [(h, row) for h, row in by_hash.items() if h not in existing]
+        classes = engine.classify_many((row.description, row.counterparty) for _h, row in fresh)
+        values = [_transaction_values(job.id, row, h, *cls, article_names) for (h, row), cls in zip(fresh, classes)]
+        seen.update(by_hash)
+        unknown += sum(1 for v in values if v["tx_type"] == TxType.unknown)
+        inserted += insert_finance_chunk(session, values)
+        if commit_chunks:
+            flush_rule_stats_if_due(session)  # a long import doesn't hold its counters to the end
+            save_progress(session, job, checkpoint(total, hashes), rows=total, inserted=inserted, unknown=unknown)
+        if on_chunk is not None:
+            on_chunk({"rows": total, "resumed": resumed, "inserted": inserted, "unknown": unknown})
+    return {
+        "rows": total,
+        "inserted": inserted,
+        "duplicates": total - inserted,
+        "unknown": unknown,
+    }
+
+
+def discard_finance_import(session: Session, job: ImportJob) -> None:
+    removed = session.execute(
+        delete(FinanceTransaction)
+        .where(FinanceTransaction.import_job_id == job.id)
+        .returning(*AGG_RETURNING)
+        .execution_options(synchronize_session=False)
+    ).all()
+    apply_agg_rows(session, removed=removed)
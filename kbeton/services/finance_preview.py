@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import time
+from itertools import islice
+
+from sqlalchemy.orm import Session
+
+from kbeton.importers.batch import split_finance_batch
+from kbeton.importers.estimate import estimate_rows
+from kbeton.importers.finance_formats import finance_file_columns, iter_finance_file
+from kbeton.models.enums import TxType
+from kbeton.services.mapping import get_rule_engine
+
+PREVIEW_SAMPLE_ROWS = 300
+
+
+def preview_finance_file(session: Session, *, filename: str, data: bytes, sample_rows: int = PREVIEW_SAMPLE_ROWS) -> dict:
+    """Header + first sample_rows rows only; nothing is written to the database.
+
+    Raises ValueError for files the import would reject (format, header).
+    """
+    started = time.perf_counter()
+    parts = split_finance_batch(filename, data)
+    sheet_name = None
+    if parts:
+        # batch upload: the first statement stands in for the rest
+        first = parts[0]
+        if first.data is not None:
+            filename, data = first.filename, first.data
+        sheet_name = first.sheet_name or None
+    columns = finance_file_columns(filename, data, sheet_name=sheet_name)
+    rows_iter = iter_finance_file(filename, data, sheet_name=sheet_name)
+    try:
+        sample = list(islice(rows_iter, sample_rows))
+    finally:
+        rows_iter.close()
+
+    engine = get_rule_engine(session)
+    unknown = 0
+    undated = 0
+    dates = []
+    classes = engine.classify_many((row.description, row.counterparty) for row in sample)
+    for row, (tx_type, _article_id) in zip(sample, classes):
+        if tx_type == TxType.unknown:
+            unknown += 1
+        if row.date is None:
+            undated += 1
+        else:
+            dates.append(row.date)
+    return {
+        "columns": columns,
+        "sample_rows": len(sample),
+        "total_estimate": None if parts else estimate_rows(filename, data),
+        "parts": [p.title for p in parts or []],
+        "date_min": min(dates).isoformat() if dates else None,
+        "date_max": max(dates).isoformat() if dates else None,
+        "undated": undated,
+        "unknown": unknown,
+        "hit_rate": round((len(sample) - unknown) / len(sample), 3) if sample else 0.0,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
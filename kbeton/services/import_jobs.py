@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from sqlalchemy.orm import Session
+
+from kbeton.models.finance import ImportJob
+
+T = TypeVar("T")
+
+
+def chunk_digest(keys: Iterable[str]) -> str:
+    h = hashlib.sha1()
+    for k in keys:
+        h.update(k.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+# counters save_progress keeps next to the cursor
+_PROGRESS_COUNTERS = ("rows", "inserted", "unknown")
+
+
+def import_progress(job: ImportJob) -> dict:
+    return dict((job.summary or {}).get("progress") or {})
+
+
+def save_progress(session: Session, job: ImportJob, progress: dict, **counters) -> None:
+    """Store the resume cursor and running counters, then commit the chunk."""
+    # JSON columns are not mutation-tracked, the summary has to be reassigned.
+    summary = dict(job.summary or {})
+    summary.update(counters)
+    summary["progress"] = progress
+    job.summary = summary
+    session.commit()
+
+
+def reset_progress(job: ImportJob) -> None:
+    """Drop the resume cursor and running counters, for a job whose committed
+    chunks were discarded: a rerun must start from the first row again."""
+    job.summary = {k: v for k, v in (job.summary or {}).items() if k not in ("progress", *_PROGRESS_COUNTERS)}
+
+
+def checkpoint(rows_done: int, chunk_keys: list[str], **extra) -> dict:
+    return {
+        "rows_done": rows_done,
+        "last_chunk_rows": len(chunk_keys),
+        "last_chunk_hash": chunk_digest(chunk_keys),
+        **extra,
+    }
+
+
+def skip_done_rows(rows: Iterable[T], progress: dict, key: Callable[[T], str]) -> Iterator[T]:
+    """Skip rows committed by a previous attempt, checking the file did not change."""
+    it = iter(rows)
+    done = int(progress.get("rows_done") or 0)
+    if done:
+        tail_from = done - int(progress.get("last_chunk_rows") or 0)
+        skipped = 0
+        tail: list[str] = []
+        for i, row in zip(range(done), it):
+            skipped += 1
+            if i >= tail_from:
+                tail.append(key(row))
+        if skipped != done or chunk_digest(tail) != progress.get("last_chunk_hash"):
+            raise ValueError("Import file does not match the saved progress cursor")
+    yield from it
+
+
+def batch_children(session: Session, parent: ImportJob) -> list[ImportJob]:
+    return session.query(ImportJob).filter(ImportJob.parent_id == parent.id).order_by(ImportJob.id.asc()).all()
+
+
+def aggregate_batch_summary(children: list[ImportJob]) -> tuple[str, dict]:
+    """Parent status and summary from the finished child jobs."""
+    totals = {"rows": 0, "inserted": 0, "duplicates": 0, "unknown": 0}
+    parts = []
+    failed = 0
+    for child in children:
+        summary = child.summary or {}
+        if child.status == "done":
+            for key in totals:
+                totals[key] += int(summary.get(key) or 0)
+        else:
+            failed += 1
+        parts.append({
+            "job_id": child.id,
+            "file": child.filename,
+            "sheet": child.sheet_name,
+            "status": child.status,
+            "rows": int(summary.get("rows") or 0),
+            "error": child.error,
+        })
+    status = "failed" if children and failed == len(children) else "done"
+    return status, {**totals, "parts": len(children), "failed_parts": failed, "items": parts}
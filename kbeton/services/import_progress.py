@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import Callable
+
+import redis
+import structlog
+
+from kbeton.services.redis_client import get_redis
+
+log = structlog.get_logger(__name__)
+
+PROGRESS_KEY = "import_progress:{job_id}"
+PROGRESS_TTL_SECONDS = 6 * 3600
+PROGRESS_MIN_INTERVAL_SECONDS = 2.0
+
+
+def progress_key(job_id: int) -> str:
+    return PROGRESS_KEY.format(job_id=job_id)
+
+
+class ProgressReporter:
+    """Publishes import progress to Redis, at most once per min_interval.
+
+    Redis errors are logged and swallowed: progress is best effort and must
+    never fail the import itself.
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        *,
+        total_estimate: int | None = None,
+        min_interval: float = PROGRESS_MIN_INTERVAL_SECONDS,
+        client: redis.Redis | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.job_id = job_id
+        self.total_estimate = total_estimate
+        self.min_interval = min_interval
+        self._client = client
+        self._clock = clock
+        self._started = clock()
+        self._last_published: float | None = None
+
+    def _publish(self, payload: dict) -> None:
+        try:
+            client = self._client or get_redis()
+            client.set(progress_key(self.job_id), json.dumps(payload), ex=PROGRESS_TTL_SECONDS)
+        except redis.RedisError as e:
+            log.warning("import_progress_publish_failed", job_id=self.job_id, error=str(e))
+
+    def update(self, counters: dict, *, force: bool = False) -> None:
+        now = self._clock()
+        if not force and self._last_published is not None and now - self._last_published < self.min_interval:
+            return
+        self._last_published = now
+        rows = int(counters.get("rows") or 0)
+        # After a resume `rows` includes what an earlier attempt committed; the
+        # rate comes only from rows this attempt processed in `elapsed`.
+        processed = rows - int(counters.get("resumed") or 0)
+        elapsed = max(0.0, now - self._started)
+        eta = None
+        if self.total_estimate and processed > 0 and self.total_estimate > rows:
+            eta = round(elapsed / processed * (self.total_estimate - rows), 1)
+        self._publish({
+            "status": "processing",
+            "rows": rows,
+            "inserted": int(counters.get("inserted", rows) or 0),
+            "classified": rows - int(counters.get("unknown") or 0) if "unknown" in counters else None,
+            "total_estimate": self.total_estimate,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta,
+        })
+
+    def finish(self, status: str, summary: dict | None = None, error: str = "") -> None:
+        summary = summary or {}
+        rows = int(summary.get("rows") or 0)
+        self._publish({
+            "status": status,
+            "rows": rows,
+            "inserted": int(summary.get("inserted", rows) or 0),
+            "classified": rows - int(summary.get("unknown") or 0) if "unknown" in summary else None,
+            "total_estimate": self.total_estimate,
+            "elapsed_seconds": round(max(0.0, self._clock() - self._started), 1),
+            "eta_seconds": None,
+            "error": error,
+        })
+
+
+def read_progress(job_id: int, client: redis.Redis | None = None) -> dict | None:
+    try:
+        raw = (client or get_redis()).get(progress_key(job_id))
+    except redis.RedisError as e:
+        log.warning("import_progress_read_failed", job_id=job_id, error=str(e))
+        return None
+    return json.loads(raw) if raw else None
+
+
+def _fmt_seconds(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} с"
+    return f"{seconds // 60} мин {seconds % 60:02d} с"
+
+
+def progress_lines(progress: dict | None) -> list[str]:
+    if not progress:
+        return ["Статус: в очереди"]
+    status = progress.get("status")
+    labels = {"processing": "обработка", "done": "завершен", "failed": "ошибка"}
+    lines = [f"Статус: {labels.get(status, status)}"]
+    rows = progress.get("rows") or 0
+    total = progress.get("total_estimate")
+    if total and status == "processing":
+        pct = min(100, int(rows * 100 / total)) if total else 0
+        lines.append(f"Строк: {rows:,} из ~{total:,} ({pct}%)".replace(",", " "))
+    else:
+        lines.append(f"Строк: {rows:,}".replace(",", " "))
+    lines.append(f"Записано: {progress.get('inserted') or 0:,}".replace(",", " "))
+    if progress.get("classified") is not None:
+        lines.append(f"Классифицировано: {progress['classified']:,}".replace(",", " "))
+    if progress.get("eta_seconds") is not None:
+        lines.append(f"Осталось: ~{_fmt_seconds(progress['eta_seconds'])}")
+    elif progress.get("elapsed_seconds") is not None and status != "processing":
+        lines.append(f"Время: {_fmt_seconds(progress['elapsed_seconds'])}")
+    if progress.get("error"):
+        lines.append(f"Ошибка: {progress['error']}")
+    return lines
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+
+import redis
+import structlog
+
+from kbeton.services.redis_client import get_redis
+
+log = structlog.get_logger(__name__)
+
+# One live dashboard message per chat, re-edited in place when its data changes.
+LIVE_DASHBOARD_KEY = "dashlive:{chat_id}"
+LIVE_DASHBOARD_CHATS_KEY = "dashlive:chats"
+LIVE_DASHBOARD_PENDING_KEY = "dashlive:pending:{chat_id}"
+# a forgotten tablet stops being edited after a working day; pressing Live again renews it
+LIVE_DASHBOARD_TTL_SECONDS = 12 * 3600
+# Telegram throttles edits per chat; changes inside this window are folded into one edit
+LIVE_EDIT_MIN_INTERVAL_SECONDS = 30
+UPDATE_LIVE_DASHBOARD_TASK = "apps.worker.tasks.update_live_dashboard"
+
+
+def _key(chat_id: int) -> str:
+    return LIVE_DASHBOARD_KEY.format(chat_id=chat_id)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def start_live(
+    chat_id: int, message_id: int, period: str, mode: str, text: str, *, client: redis.Redis | None = None, now: float | None = None
+) -> bool:
+    """Make message_id the chat's live dashboard (replacing any previous one).
+    ``text`` is what the message shows now, so an unchanged refresh is not re-sent."""
+    live = {"message_id": message_id, "period": period, "mode": mode, "hash": text_hash(text), "edited_at": now or time.time()}
+    try:
+        r = client or get_redis()
+        r.set(_key(chat_id), json.dumps(live), ex=LIVE_DASHBOARD_TTL_SECONDS)
+        r.sadd(LIVE_DASHBOARD_CHATS_KEY, chat_id)
+    except redis.RedisError as e:
+        log.warning("live_dashboard_write_failed", chat_id=chat_id, error=str(e))
+        return False
+    return True
+
+
+def stop_live(chat_id: int, *, client: redis.Redis | None = None) -> None:
+    try:
+        r = client or get_redis()
+        r.delete(_key(chat_id))
+        r.srem(LIVE_DASHBOARD_CHATS_KEY, chat_id)
+    except redis.RedisError as e:
+        log.warning("live_dashboard_write_failed", chat_id=chat_id, error=str(e))
+
+
+def get_live(chat_id: int, *, client: redis.Redis | None = None) -> dict | None:
+    try:
+        raw = (client or get_redis()).get(_key(chat_id))
+    except redis.RedisError as e:
+        log.warning("live_dashboard_read_failed", chat_id=chat_id, error=str(e))
+        return None
+    return json.loads(raw) if raw else None
+
+
+def mark_live_edited(chat_id: int, live: dict, text: str, *, client: redis.Redis | None = None, now: float | None = None) -> None:
+    live = dict(live, hash=text_hash(text), edited_at=now or time.time())
+    try:
+        (client or get_redis()).set(_key(chat_id), json.dumps(live), keepttl=True, xx=True)
+    except redis.RedisError as e:
+        log.warning("live_dashboard_write_failed", chat_id=chat_id, error=str(e))
+
+
+def schedule_live_updates(celery_app, *, client: redis.Redis | None = None, now: float | None = None) -> int:
+    """Queue one update_live_dashboard run per live chat, no sooner than
+    LIVE_EDIT_MIN_INTERVAL_SECONDS after that chat's last edit. A chat that
+    already has a run pending is skipped: that run reads the newest snapshot
+    anyway. Returns how many runs were queued."""
+    now = now or time.time()
+    try:
+        r = client or get_redis()
+        chat_ids = [int(c) for c in r.smembers(LIVE_DASHBOARD_CHATS_KEY)]
+    except redis.RedisError as e:
+        log.warning("live_dashboard_read_failed", error=str(e))
+        return 0
+    queued = 0
+    for chat_id in chat_ids:
+        try:
+            raw = r.get(_key(chat_id))
+            if not raw:
+                r.srem(LIVE_DASHBOARD_CHATS_KEY, chat_id)  # expired
+                continue
+            live = json.loads(raw)
+            delay = max(0, int(LIVE_EDIT_MIN_INTERVAL_SECONDS - (now - float(live.get("edited_at") or 0))))
+            if not r.set(LIVE_DASHBOARD_PENDING_KEY.format(chat_id=chat_id), "1", nx=True, ex=delay + LIVE_EDIT_MIN_INTERVAL_SECONDS):
+                continue
+        except redis.RedisError as e:
+            log.warning("live_dashboard_schedule_failed", chat_id=chat_id, error=str(e))
+            continue
+        celery_app.send_task(UPDATE_LIVE_DASHBOARD_TASK, args=[chat_id], countdown=delay)
+        queued += 1
+    return queued
+
+
+def take_live(chat_id: int, *, client: redis.Redis | None = None) -> dict | None:
+    """Called by the queued run: clears the chat's pending marker (later changes
+    queue a new run) and returns its live entry, if still live."""
+    try:
+        (client or get_redis()).delete(LIVE_DASHBOARD_PENDING_KEY.format(chat_id=chat_id))
+    except redis.RedisError as e:
+        log.warning("live_dashboard_write_failed", chat_id=chat_id, error=str(e))
+    return get_live(chat_id, client=client)
@@ -5,6 +5,7 @@ from datetime import date
 
 from sqlalchemy.orm import Session
 
+from kbeton.importers.utils import description_fingerprint
 from kbeton.models.enums import TxType
 from kbeton.models.finance import FinanceArticle, FinanceTransaction, ImportJob
 
@@ -64,6 +65,7 @@ def create_manual_finance_tx(
         income_article_id=income_article_id,
         expense_article_id=expense_article_id,
         dedup_hash=dedup_hash,
+        description_fingerprint=description_fingerprint(description, counterparty),
         raw_fields=raw_fields or {},
     )
     session.add(tx)
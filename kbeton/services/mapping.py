@@ -1,24 +1,37 @@
 from __future__ import annotations
 
 import re
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, deque
+from functools import lru_cache
+from typing import Iterable, NamedTuple
+from weakref import WeakKeyDictionary
+
 from sqlalchemy import select, desc
 from sqlalchemy.orm import Session
 
 from kbeton.models.finance import MappingRule, FinanceArticle
 from kbeton.models.enums import PatternType, TxType
+from kbeton.services.versions import RULES_VERSION, get_version
+
+CLASSIFY_MEMO_SIZE = 50_000
+CLASSIFY_MEMO_TTL = 6 * 3600
+# how long classification counters may sit in process memory before a flush
+RULE_STATS_FLUSH_SECONDS = 60
 
 def normalize_text(s: str) -> str:
     return (s or "").strip().lower()
 
-def classify_transaction(session: Session, *, description: str, counterparty: str) -> tuple[TxType, int | None]:
-    text = normalize_text(f"{description} {counterparty}")
-
-    rules = session.execute(
+def load_active_rules(session: Session) -> list[MappingRule]:
+    return session.execute(
         select(MappingRule)
         .where(MappingRule.is_active == True)
         .order_by(desc(MappingRule.priority), MappingRule.id.asc())
     ).scalars().all()
 
+def classify_with_rules(rules: list[MappingRule], *, description: str, counterparty: str) -> tuple[TxType, int | None]:
+    text = normalize_text(f"{description} {counterparty}")
     for r in rules:
         pat = r.pattern or ""
         if r.pattern_type == PatternType.contains:
@@ -32,6 +45,268 @@ def classify_transaction(session: Session, *, description: str, counterparty: st
                 continue
     return TxType.unknown, None
 
+class RuleHit(NamedTuple):
+    rule_id: int
+    kind: TxType
+    article_id: int | None
+
+_MISSING = object()
+
+class ClassificationMemo:
+    """Bounded LRU with a TTL in front of the rule engine, keyed on
+    (rules version, normalized text). 1C exports repeat the same payment
+    texts thousands of times; each distinct text is matched once per process."""
+
+    def __init__(self, maxsize: int = CLASSIFY_MEMO_SIZE, ttl: float = CLASSIFY_MEMO_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict[tuple[int, str], tuple[float, RuleHit | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple[int, str]):
+        """Cached value or _MISSING."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires >= self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return _MISSING
+
+    def put(self, key: tuple[int, str], value: RuleHit | None) -> None:
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        # counters survive: they describe the process, not one rules version
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+class RuleStatsCollector:
+    """Per-rule hit counts and regex match time accumulated in process memory;
+    kbeton.services.rule_stats.flush_rule_stats moves them to mapping_rule_stats.
+    Contains rules share one automaton scan, so only regex rules get a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.drained_at = time.monotonic()
+        self.hits: Counter[int] = Counter()
+        self.evaluations: Counter[int] = Counter()
+        self.seconds: defaultdict[int, float] = defaultdict(float)
+        self.last_hit: dict[int, float] = {}
+
+    def record_hits(self, hits: Iterable[RuleHit | None]) -> None:
+        counts = Counter(h.rule_id for h in hits if h is not None)
+        if not counts:
+            return
+        now = time.time()
+        with self._lock:
+            self.hits.update(counts)
+            for rule_id in counts:
+                self.last_hit[rule_id] = now
+
+    def record_eval(self, rule_id: int, seconds: float) -> None:
+        # called from the match loop; a lost increment under a thread race is acceptable
+        self.evaluations[rule_id] += 1
+        self.seconds[rule_id] += seconds
+
+    def flush_due(self, now: float | None = None) -> bool:
+        """Something is pending and the last drain is RULE_STATS_FLUSH_SECONDS old."""
+        now = time.monotonic() if now is None else now
+        return bool(self.evaluations or self.hits) and now - self.drained_at >= RULE_STATS_FLUSH_SECONDS
+
+    def drain(self) -> dict[int, dict]:
+        """Pending stats per rule id; the collector starts over."""
+        with self._lock:
+            hits, evaluations, seconds, last_hit = self.hits, self.evaluations, self.seconds, self.last_hit
+            self._reset()
+        return {
+            rule_id: {
+                "hits": hits.get(rule_id, 0),
+                "evaluations": evaluations.get(rule_id, 0),
+                "seconds": seconds.get(rule_id, 0.0),
+                "last_hit": last_hit.get(rule_id),
+            }
+            for rule_id in set(hits) | set(evaluations)
+        }
+
+rule_stats = RuleStatsCollector()
+
+class RuleEngine:
+    """Active rules compiled once: an Aho–Corasick automaton over all contains
+    patterns plus precompiled regexes. Gives the same answer as
+    classify_with_rules: the first matching rule in (priority desc, id asc)."""
+
+    def __init__(
+        self,
+        rules: list[MappingRule],
+        *,
+        version: int = 0,
+        memo: ClassificationMemo | None = None,
+        stats: RuleStatsCollector | None = None,
+    ):
+        self.version = version
+        self.memo = memo
+        self.stats = stats
+        # rank = position in priority order; lower rank wins
+        self._hits: list[RuleHit] = [RuleHit(r.id, r.kind, r.article_id) for r in rules]
+        self._regexes: list[tuple[int, int, re.Pattern]] = []
+        contains: list[tuple[int, str]] = []
+        for rank, r in enumerate(rules):
+            if r.pattern_type == PatternType.contains:
+                contains.append((rank, normalize_text(r.pattern or "")))
+            else:
+                try:
+                    self._regexes.append((rank, r.id, re.compile(r.pattern or "", flags=re.IGNORECASE)))
+                except re.error:
+                    continue
+        self._build_automaton(contains)
+
+    def _build_automaton(self, patterns: list[tuple[int, str]]) -> None:
+        goto: list[dict[str, int]] = [{}]
+        best: list[int | None] = [None]
+        for rank, pat in patterns:
+            state = 0
+            for ch in pat:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    goto.append({})
+                    best.append(None)
+                    nxt = len(goto) - 1
+                    goto[state][ch] = nxt
+                state = nxt
+            if best[state] is None or rank < best[state]:
+                best[state] = rank
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            # best rank of every pattern ending here, including suffixes reached via fail links
+            inherited = best[fail[state]]
+            if inherited is not None and (best[state] is None or inherited < best[state]):
+                best[state] = inherited
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if state else 0
+                queue.append(nxt)
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+
+    def _best_contains(self, text: str) -> int | None:
+        goto, fail, best = self._goto, self._fail, self._best
+        found = best[0]  # an empty pattern matches everything
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            rank = best[state]
+            if rank is not None and (found is None or rank < found):
+                found = rank
+                if found == 0:
+                    break
+        return found
+
+    def classify(self, *, description: str, counterparty: str) -> tuple[TxType, int | None]:
+        hit = self._lookup(normalize_text(f"{description} {counterparty}"))
+        if self.stats is not None:
+            self.stats.record_hits((hit,))
+        if hit is None:
+            return TxType.unknown, None
+        return hit.kind, hit.article_id
+
+    def classify_many(self, rows: Iterable[tuple[str, str]]) -> list[tuple[TxType, int | None]]:
+        """classify() for (description, counterparty) pairs; repeated texts
+        (recurring payments, the same counterparty) are matched once."""
+        return [(hit.kind, hit.article_id) if hit else (TxType.unknown, None) for hit in self.match_many(rows)]
+
+    def match_many(self, rows: Iterable[tuple[str, str]]) -> list[RuleHit | None]:
+        """Winning rule per (description, counterparty) pair, None when no rule matches."""
+        lookup = self._lookup if self.memo is not None else lru_cache(maxsize=None)(self._match_text)
+        hits = [lookup(normalize_text(f"{description} {counterparty}")) for description, counterparty in rows]
+        if self.stats is not None:
+            self.stats.record_hits(hits)
+        return hits
+
+    def _lookup(self, text: str) -> RuleHit | None:
+        if self.memo is None:
+            return self._match_text(text)
+        key = (self.version, text)
+        hit = self.memo.get(key)
+        if hit is _MISSING:
+            hit = self._match_text(text)
+            self.memo.put(key, hit)
+        return hit
+
+    def _match_text(self, text: str) -> RuleHit | None:
+        found = self._best_contains(text)
+        stats = self.stats
+        for rank, rule_id, rx in self._regexes:
+            if found is not None and rank > found:
+                break
+            if stats is None:
+                matched = rx.search(text)
+            else:
+                started = time.perf_counter()
+                matched = rx.search(text)
+                stats.record_eval(rule_id, time.perf_counter() - started)
+            if matched:
+                found = rank
+                break
+        return None if found is None else self._hits[found]
+
+
+_engines: "WeakKeyDictionary[object, RuleEngine]" = WeakKeyDictionary()
+_engines_lock = threading.Lock()
+
+
+def get_rule_engine(session: Session) -> RuleEngine:
+    """Engine cached per database engine, rebuilt when the rules version moves
+    (see kbeton.services.versions.bump_version)."""
+    version = get_version(session, RULES_VERSION)
+    bind = session.get_bind()
+    engine = _engines.get(bind)
+    if engine is None or engine.version != version:
+        memo = engine.memo if engine is not None else ClassificationMemo()
+        memo.clear()
+        engine = RuleEngine(load_active_rules(session), version=version, memo=memo, stats=rule_stats)
+        with _engines_lock:
+            _engines[bind] = engine
+    return engine
+
+
+def classify_transaction(session: Session, *, description: str, counterparty: str) -> tuple[TxType, int | None]:
+    return get_rule_engine(session).classify(description=description, counterparty=counterparty)
+
+def classify_many(session: Session, rows: Iterable[tuple[str, str]]) -> list[tuple[TxType, int | None]]:
+    """Batch form of classify_transaction: one version check for all rows."""
+    return get_rule_engine(session).classify_many(rows)
+
 def apply_article(session: Session, *, tx_type: TxType, article_id: int) -> tuple[int | None, int | None]:
     # validates article kind
     art = session.execute(select(FinanceArticle).where(FinanceArticle.id == article_id)).scalar_one()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+from datetime import date
+
+import redis
+import structlog
+from sqlalchemy.orm import Session
+
+from kbeton.reports.export_xlsx import pnl_to_xlsx
+from kbeton.reports.pnl import PnlRow, pnl
+from kbeton.services.redis_client import get_redis_bytes
+from kbeton.services.versions import FINANCE_VERSION, get_version
+
+log = structlog.get_logger(__name__)
+
+# Keys carry the finance data version, so a write never has to delete anything:
+# the next read simply misses. The TTL only collects superseded entries.
+PNL_CACHE_KEY = "pnl:v{version}:{period}:{start}:{end}:{kind}"
+PNL_CACHE_TTL_SECONDS = 24 * 3600
+PNL_CACHE_STATS_KEY = "pnl_cache:stats"
+
+
+def pnl_cache_key(*, version: int, start: date, end: date, period: str, kind: str) -> str:
+    return PNL_CACHE_KEY.format(version=version, period=period, start=start.isoformat(), end=end.isoformat(), kind=kind)
+
+
+def _encode(rows: list[PnlRow], meta: dict) -> bytes:
+    meta = dict(meta, daily=[dict(d, date=d["date"].isoformat()) for d in meta["daily"]])
+    return json.dumps({
+        "rows": [[r.period_start.isoformat(), r.income_sum, r.expense_sum] for r in rows],
+        "meta": meta,
+    }).encode("utf-8")
+
+
+def _decode(raw: bytes) -> tuple[list[PnlRow], dict]:
+    data = json.loads(raw)
+    rows = [PnlRow(period_start=date.fromisoformat(p), income_sum=inc, expense_sum=exp) for p, inc, exp in data["rows"]]
+    meta = data["meta"]
+    meta["daily"] = [dict(d, date=date.fromisoformat(d["date"])) for d in meta["daily"]]
+    return rows, meta
+
+
+class PnlCache:
+    """Redis cache for pnl() results and their XLSX export.
+
+    Redis errors are logged and swallowed: the cache is an optimisation, a
+    failing Redis only means every request computes the report itself.
+    """
+
+    def __init__(self, client: redis.Redis | None = None) -> None:
+        self._client = client
+
+    @property
+    def client(self) -> redis.Redis:
+        return self._client or get_redis_bytes()
+
+    def _get(self, key: str, *, count: bool = True) -> bytes | None:
+        try:
+            raw = self.client.get(key)
+            if count:
+                self.client.hincrby(PNL_CACHE_STATS_KEY, "hits" if raw is not None else "misses", 1)
+            return raw
+        except redis.RedisError as e:
+            log.warning("pnl_cache_read_failed", key=key, error=str(e))
+            return None
+
+    def _set(self, key: str, value: bytes) -> None:
+        try:
+            self.client.set(key, value, ex=PNL_CACHE_TTL_SECONDS)
+        except redis.RedisError as e:
+            log.warning("pnl_cache_write_failed", key=key, error=str(e))
+
+    def report(self, session: Session, *, start: date, end: date, period: str, count: bool = True) -> tuple[list[PnlRow], dict]:
+        key = pnl_cache_key(version=get_version(session, FINANCE_VERSION), start=start, end=end, period=period, kind="json")
+        raw = self._get(key, count=count)
+        if raw is not None:
+            return _decode(raw)
+        rows, meta = pnl(session, start=start, end=end, period=period)
+        self._set(key, _encode(rows, meta))
+        return rows, meta
+
+    def xlsx(
+        self, session: Session, *, start: date, end: date, period: str, report: tuple[list[PnlRow], dict] | None = None
+    ) -> bytes:
+        """``report`` is the (rows, meta) the caller already has for the same
+        range; without it a miss reads the report uncounted, so one request
+        is one lookup in the hit rate."""
+        key = pnl_cache_key(version=get_version(session, FINANCE_VERSION), start=start, end=end, period=period, kind="xlsx")
+        data = self._get(key)
+        if data is not None:
+            return data
+        rows, meta = report or self.report(session, start=start, end=end, period=period, count=False)
+        data = pnl_to_xlsx(rows, period=period, start=start, end=end, totals=meta)
+        self._set(key, data)
+        return data
+
+    def stats(self) -> dict:
+        try:
+            raw = self.client.hgetall(PNL_CACHE_STATS_KEY)
+        except redis.RedisError as e:
+            log.warning("pnl_cache_read_failed", key=PNL_CACHE_STATS_KEY, error=str(e))
+            raw = {}
+        counts = {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()}
+        hits, misses = counts.get("hits", 0), counts.get("misses", 0)
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": round(hits / total, 3) if total else 0.0}
+
+
+pnl_cache = PnlCache()
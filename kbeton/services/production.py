@@ -7,7 +7,7 @@ import re
 from sqlalchemy.orm import Session
 
 from kbeton.db.session import session_scope
-from kbeton.models.counterparty import CounterpartyBalance, CounterpartySnapshot
+from kbeton.models.counterparty import CounterpartyBalance
 from kbeton.models.enums import (
     InventoryTxnType,
     PriceKind,
@@ -20,6 +20,7 @@ from kbeton.models.pricing import PriceVersion
 from kbeton.models.production import ProductionOutput, ProductionShift
 from kbeton.models.recipes import ConcreteRecipe
 from kbeton.services.audit import audit_log
+from kbeton.services.counterparties import latest_counterparty_snapshot
 
 
 @dataclass(slots=True)
@@ -236,7 +237,7 @@ def get_shift_report_data(
 
 def get_counterparty_registry() -> list[str]:
     with session_scope() as session:
-        snapshot = session.query(CounterpartySnapshot).order_by(CounterpartySnapshot.id.desc()).first()
+        snapshot = latest_counterparty_snapshot(session)
         if not snapshot:
             return []
         rows = (
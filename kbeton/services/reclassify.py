@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from kbeton.models.enums import PatternType, TxType
+from kbeton.models.finance import FinanceTransaction, MappingRule
+from kbeton.services.finance_agg import classify_unknown_rows
+from kbeton.services.mapping import RuleHit, get_rule_engine, normalize_text
+
+RECLASSIFY_CHUNK_SIZE = 2000
+_LIKE_ESCAPE = "!"  # a backslash would need different quoting depending on standard_conforming_strings
+
+
+def _like_escape(pattern: str) -> str:
+    return pattern.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def contains_prefilter(session: Session, rule_ids: list[int]):
+    """SQL condition satisfied by every row the given contains rules can match,
+    or None when it cannot be expressed: a regex or empty pattern among them, or
+    a dialect whose lower() only folds ASCII (SQLite), which would miss Cyrillic."""
+    if session.get_bind().dialect.name != "postgresql":
+        return None
+    rules = session.execute(
+        select(MappingRule).where(MappingRule.id.in_(rule_ids), MappingRule.is_active == True)
+    ).scalars().all()
+    if not rules or any(r.pattern_type != PatternType.contains for r in rules):
+        return None
+    patterns = {normalize_text(r.pattern) for r in rules}
+    if "" in patterns:
+        return None
+    text = func.lower(FinanceTransaction.description + " " + FinanceTransaction.counterparty)
+    return or_(*(text.like(f"%{_like_escape(p)}%", escape=_LIKE_ESCAPE) for p in sorted(patterns)))
+
+
+def _apply_hit(session: Session, hit: RuleHit, ids: list[int]) -> int:
+    # tx_type guard: rows triaged by hand while the job runs are left alone
+    return classify_unknown_rows(
+        session,
+        FinanceTransaction.id.in_(ids),
+        tx_type=hit.kind,
+        income_article_id=hit.article_id if hit.kind == TxType.income else None,
+        expense_article_id=hit.article_id if hit.kind == TxType.expense else None,
+    )
+
+
+def reclassify_unknown(
+    session: Session,
+    *,
+    rule_ids: list[int] | None = None,
+    chunk_size: int = RECLASSIFY_CHUNK_SIZE,
+    commit_chunks: bool = False,
+) -> dict:
+    """Re-apply the active rules to unknown transactions, keyset-paginated by id.
+
+    With rule_ids only rows those (new) rules can match are read; on PostgreSQL
+    their contains patterns are pushed into the WHERE clause. Writes are one
+    UPDATE per winning rule per chunk."""
+    engine = get_rule_engine(session)
+    prefilter = contains_prefilter(session, rule_ids) if rule_ids else None
+    by_rule: Counter[int] = Counter()
+    scanned = 0
+    last_id = 0
+    while True:
+        stmt = select(FinanceTransaction.id, FinanceTransaction.description, FinanceTransaction.counterparty).where(
+            FinanceTransaction.tx_type == TxType.unknown, FinanceTransaction.id > last_id
+        )
+        if prefilter is not None:
+            stmt = stmt.where(prefilter)
+        chunk = session.execute(stmt.order_by(FinanceTransaction.id).limit(chunk_size)).all()
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        scanned += len(chunk)
+        groups: dict[RuleHit, list[int]] = defaultdict(list)
+        for row, hit in zip(chunk, engine.match_many((r.description, r.counterparty) for r in chunk)):
+            if hit is not None and hit.kind != TxType.unknown:
+                groups[hit].append(row.id)
+        for hit, ids in groups.items():
+            by_rule[hit.rule_id] += _apply_hit(session, hit, ids)
+        if commit_chunks:
+            session.commit()
+    return {
+        "scanned": scanned,
+        "classified": sum(by_rule.values()),
+        "by_rule": {str(rule_id): n for rule_id, n in by_rule.most_common() if n},
+    }
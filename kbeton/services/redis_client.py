@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+import redis
+
+from kbeton.core.config import settings
+
+@lru_cache(maxsize=1)
+def get_redis() -> redis.Redis:
+    return redis.Redis.from_url(settings.redis_url, decode_responses=True, socket_timeout=2)
+
+@lru_cache(maxsize=1)
+def get_redis_bytes() -> redis.Redis:
+    """Same server, raw bytes values (cached files)."""
+    return redis.Redis.from_url(settings.redis_url, socket_timeout=2)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import structlog
+from sqlalchemy import desc, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from kbeton.models.finance import FinanceArticle, MappingRule, MappingRuleStat
+from kbeton.services.mapping import RuleStatsCollector, rule_stats
+
+log = structlog.get_logger(__name__)
+
+DEAD_RULE_DAYS = 30
+
+
+def flush_rule_stats(session: Session, collector: RuleStatsCollector = rule_stats) -> int:
+    """Add the process-local counters to mapping_rule_stats (one upsert).
+    Returns the number of rules written."""
+    pending = collector.drain()
+    if not pending:
+        return 0
+    # rules deleted since they were counted are dropped instead of violating the FK
+    alive = set(session.execute(select(MappingRule.id).where(MappingRule.id.in_(pending))).scalars())
+    values = [
+        {
+            "rule_id": rule_id,
+            "hits": s["hits"],
+            "evaluations": s["evaluations"],
+            "match_seconds": s["seconds"],
+            "last_hit_at": datetime.fromtimestamp(s["last_hit"], tz=timezone.utc) if s["last_hit"] else None,
+        }
+        for rule_id, s in sorted(pending.items())  # fixed order: concurrent flushes lock rows alike
+        if rule_id in alive
+    ]
+    if not values:
+        return 0
+    dialect = postgresql if session.get_bind().dialect.name != "sqlite" else sqlite
+    stmt = dialect.insert(MappingRuleStat).values(values)
+    table = MappingRuleStat.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["rule_id"],
+        set_={
+            "hits": table.c.hits + stmt.excluded.hits,
+            "evaluations": table.c.evaluations + stmt.excluded.evaluations,
+            "match_seconds": table.c.match_seconds + stmt.excluded.match_seconds,
+            "last_hit_at": func.coalesce(stmt.excluded.last_hit_at, table.c.last_hit_at),
+            "updated_at": func.now(),
+        },
+    )
+    session.execute(stmt)
+    return len(values)
+
+
+def flush_rule_stats_if_due(session: Session, collector: RuleStatsCollector = rule_stats) -> int:
+    """flush_rule_stats once RULE_STATS_FLUSH_SECONDS have passed, for the
+    processes that classify between imports (bot previews, long imports).
+    Runs in a savepoint: a failed stats write leaves the caller's work alone."""
+    if not collector.flush_due():
+        return 0
+    try:
+        with session.begin_nested():
+            return flush_rule_stats(session, collector)
+    except Exception as e:
+        log.warning("rule_stats_flush_failed", error=str(e))
+        return 0
+
+
+def rule_stats_report(session: Session, *, limit: int | None = None) -> list[dict]:
+    """Active rules with their counters, most hits first; `dead` marks rules
+    that have not fired for DEAD_RULE_DAYS (counted from creation if never)."""
+    rows = session.execute(
+        select(MappingRule, FinanceArticle.name, MappingRuleStat)
+        .join(FinanceArticle, FinanceArticle.id == MappingRule.article_id)
+        .outerjoin(MappingRuleStat, MappingRuleStat.rule_id == MappingRule.id)
+        .where(MappingRule.is_active == True)
+        .order_by(desc(func.coalesce(MappingRuleStat.hits, 0)), desc(MappingRule.priority), MappingRule.id)
+        .limit(limit)
+    ).all()
+    dead_before = datetime.now(timezone.utc) - timedelta(days=DEAD_RULE_DAYS)
+    report = []
+    for rule, article_name, stat in rows:
+        hits = int(stat.hits) if stat else 0
+        evaluations = int(stat.evaluations) if stat else 0
+        seconds = float(stat.match_seconds) if stat else 0.0
+        last_seen = (stat.last_hit_at if stat else None) or rule.created_at
+        if last_seen is not None and last_seen.tzinfo is None:
+            last_seen = last_seen.replace(tzinfo=timezone.utc)
+        report.append({
+            "rule_id": rule.id,
+            "kind": rule.kind.value,
+            "pattern_type": rule.pattern_type.value,
+            "pattern": rule.pattern,
+            "priority": rule.priority,
+            "article": article_name,
+            "hits": hits,
+            "evaluations": evaluations,
+            "match_ms": round(seconds * 1000, 3),
+            "avg_match_us": round(seconds / evaluations * 1e6, 2) if evaluations else 0.0,
+            "last_hit_at": stat.last_hit_at if stat else None,
+            "dead": last_seen is not None and last_seen < dead_before,
+        })
+    return report
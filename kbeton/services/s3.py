@@ -22,3 +22,7 @@ def get_bytes(key: str) -> bytes:
     c = s3_client()
     obj = c.get_object(Bucket=settings.s3_bucket, Key=key)
     return obj["Body"].read()
+
+def delete_object(key: str) -> None:
+    c = s3_client()
+    c.delete_object(Bucket=settings.s3_bucket, Key=key)
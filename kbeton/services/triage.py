@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from sqlalchemy import desc, func, select
+from sqlalchemy.orm import Session
+
+from kbeton.models.enums import TxType
+from kbeton.models.finance import FinanceTransaction
+from kbeton.services.finance_agg import classify_unknown_rows
+from kbeton.services.mapping import apply_article
+
+TRIAGE_CLUSTERS = 10
+
+
+def unknown_clusters(session: Session, *, limit: int = TRIAGE_CLUSTERS) -> list[dict]:
+    """Unknown transactions grouped by description fingerprint (text plus
+    counterparty), largest first
+    (served by the partial index ix_fin_txn_unknown_fingerprint)."""
+    count = func.count(FinanceTransaction.id)
+    total = func.coalesce(func.sum(FinanceTransaction.amount), 0)
+    rows = session.execute(
+        select(
+            FinanceTransaction.description_fingerprint,
+            count.label("count"),
+            total.label("total"),
+            func.min(FinanceTransaction.id).label("sample_id"),
+            func.min(FinanceTransaction.date).label("date_min"),
+            func.max(FinanceTransaction.date).label("date_max"),
+        )
+        .where(FinanceTransaction.tx_type == TxType.unknown)
+        .group_by(FinanceTransaction.description_fingerprint)
+        .order_by(desc(count), desc(total))
+        .limit(limit)
+    ).all()
+    samples = {}
+    if rows:
+        samples = {
+            s.id: s
+            for s in session.execute(
+                select(FinanceTransaction.id, FinanceTransaction.description, FinanceTransaction.counterparty)
+                .where(FinanceTransaction.id.in_([r.sample_id for r in rows]))
+            ).all()
+        }
+    return [
+        {
+            "fingerprint": r.description_fingerprint,
+            "count": int(r.count),
+            "total": float(r.total or 0),
+            "sample_id": r.sample_id,
+            "sample": samples[r.sample_id].description or "",
+            "counterparty": samples[r.sample_id].counterparty or "",
+            "date_min": r.date_min,
+            "date_max": r.date_max,
+        }
+        for r in rows
+    ]
+
+
+def unknown_backlog(session: Session) -> int:
+    return session.execute(
+        select(func.count(FinanceTransaction.id)).where(FinanceTransaction.tx_type == TxType.unknown)
+    ).scalar_one()
+
+
+def assign_cluster(session: Session, *, sample_id: int, tx_type: TxType, article_id: int) -> int:
+    """Assign the article to every unknown transaction sharing the sample's
+    fingerprint (see classify_unknown_rows). Returns the number of rows changed."""
+    income_article_id, expense_article_id = apply_article(session, tx_type=tx_type, article_id=article_id)
+    sample = session.get(FinanceTransaction, sample_id)
+    if sample is None:
+        raise ValueError("Transaction not found")
+    if sample.description_fingerprint:
+        members = FinanceTransaction.description_fingerprint == sample.description_fingerprint
+    else:
+        # no text to group on (empty or digits-only description): this row only
+        members = FinanceTransaction.id == sample.id
+    return classify_unknown_rows(
+        session, members, tx_type=tx_type, income_article_id=income_article_id, expense_article_id=expense_article_id
+    )
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from kbeton.models.versions import DataVersion
+
+RULES_VERSION = "mapping_rules"
+# bumped with every finance_daily_agg change, i.e. any write that moves a P&L figure
+FINANCE_VERSION = "finance"
+
+
+def get_version(session: Session, name: str) -> int:
+    return session.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar_one_or_none() or 0
+
+
+def bump_version(session: Session, name: str) -> int:
+    """Increment the counter in the caller's transaction; readers see the new
+    value (and drop their caches) once it commits."""
+    result = session.execute(
+        update(DataVersion)
+        .where(DataVersion.name == name)
+        .values(version=DataVersion.version + 1)
+        .returning(DataVersion.version)
+    ).scalar_one_or_none()
+    if result is None:
+        session.add(DataVersion(name=name, version=1))
+        session.flush()
+        result = 1
+    return result
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""Benchmark transaction classification on synthetic rules and rows.
+
+Runs against an in-memory SQLite database, so it needs no services:
+
+    PYTHONPATH=. python scripts/bench_classify.py --rows 100000 --rules 1000
+
+Compares classify_many (one pass over the batch), classify_transaction
+called per row, and the pre-engine path (load rules + classify_with_rules
+per row, measured on --legacy-rows rows and extrapolated).
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from kbeton.db.base import Base
+from kbeton.models.enums import PatternType, TxType
+from kbeton.models.finance import FinanceArticle, MappingRule
+from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
+from kbeton.services.mapping import classify_many, classify_transaction, classify_with_rules, get_rule_engine, load_active_rules
+
+WORDS = [
+    "оплата", "за", "цемент", "м500", "дизель", "аренда", "миксер", "бетон", "м300", "блоки",
+    "песок", "щебень", "доставка", "ремонт", "зарплата", "налог", "услуги", "связь", "электроэнергия",
+    "аванс", "договор", "счет", "поставка", "запчасти", "шины", "масло", "охрана", "вода",
+]
+COUNTERPARTIES = ["ОсОО", "ИП", "ОАО", "ЗАО"]
+ALPHABET = "абвгдежзийклмнопрстуфхцчшщэюя"
+
+
+def _word(rng: random.Random) -> str:
+    if rng.random() < 0.6:
+        return rng.choice(WORDS)
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(4, 9)))
+
+
+def _seed_rules(session, rng: random.Random, count: int, regex_share: float) -> None:
+    income = FinanceArticle(kind=TxType.income, name="Bench income", is_active=True)
+    expense = FinanceArticle(kind=TxType.expense, name="Bench expense", is_active=True)
+    session.add_all([income, expense])
+    session.flush()
+    for _ in range(count):
+        art = rng.choice([income, expense])
+        if rng.random() < regex_share:
+            ptype, pattern = PatternType.regex, rf"{_word(rng)}\s+\w*{_word(rng)[:3]}"
+        else:
+            ptype, pattern = PatternType.contains, f"{_word(rng)} {_word(rng)}" if rng.random() < 0.5 else _word(rng) + "ст"
+        session.add(MappingRule(kind=art.kind, pattern_type=ptype, pattern=pattern, priority=rng.choice([90, 100, 110]), is_active=True, article_id=art.id))
+    session.commit()
+
+
+def _make_rows(rng: random.Random, count: int) -> list[tuple[str, str]]:
+    # recurring payments: a fifth of the texts repeat, as in real statements
+    pool = [(" ".join(_word(rng) for _ in range(rng.randint(3, 10))), f"{rng.choice(COUNTERPARTIES)} {_word(rng).title()}") for _ in range(max(1, count // 5))]
+    return [rng.choice(pool) if rng.random() < 0.5 else (" ".join(_word(rng) for _ in range(rng.randint(3, 10))), rng.choice(pool)[1]) for _ in range(count)]
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark mapping rule classification.")
+    p.add_argument("--rows", type=int, default=100_000)
+    p.add_argument("--rules", type=int, default=1_000)
+    p.add_argument("--regex-share", type=float, default=0.1, help="Share of regex rules")
+    p.add_argument("--legacy-rows", type=int, default=200, help="Rows for the per-row rule-loading path (slow)")
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine, tables=[User.__table__, FinanceArticle.__table__, MappingRule.__table__, DataVersion.__table__])
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, future=True)
+
+    with Session() as session:
+        _seed_rules(session, rng, args.rules, args.regex_share)
+        rows = _make_rows(rng, args.rows)
+
+        _, build_s = _timed(lambda: classify_many(session, rows[:1]))
+        memo = get_rule_engine(session).memo
+        memo.clear()  # every path starts cold
+        batch, batch_s = _timed(lambda: classify_many(session, rows))
+        memo_stats = memo.stats()
+        _, warm_s = _timed(lambda: classify_many(session, rows))
+        memo.clear()
+        single, single_s = _timed(lambda: [classify_transaction(session, description=d, counterparty=c) for d, c in rows])
+        legacy_sample = rows[:args.legacy_rows]
+        legacy, legacy_s = _timed(
+            lambda: [classify_with_rules(load_active_rules(session), description=d, counterparty=c) for d, c in legacy_sample]
+        )
+
+    assert batch == single, "classify_many disagrees with classify_transaction"
+    assert legacy == batch[:len(legacy)], "engine disagrees with classify_with_rules"
+    legacy_total = legacy_s / max(1, len(legacy_sample)) * len(rows)
+    hits = sum(1 for kind, _ in batch if kind != TxType.unknown)
+
+    print(f"rows={len(rows)} rules={args.rules} regex_share={args.regex_share} seed={args.seed} classified={hits}")
+    print(f"engine build (first call)          {build_s:8.3f}s")
+    print(f"classify_many                      {batch_s:8.3f}s  {len(rows) / batch_s:10.0f} rows/s  memo hit_rate={memo_stats['hit_rate']}")
+    print(f"classify_many, warm memo           {warm_s:8.3f}s  {len(rows) / warm_s:10.0f} rows/s")
+    print(f"classify_transaction per row       {single_s:8.3f}s  {len(rows) / single_s:10.0f} rows/s  x{single_s / batch_s:.1f}")
+    print(f"rules query + loop per row (est.)  {legacy_total:8.3f}s  {len(rows) / legacy_total:10.0f} rows/s  x{legacy_total / batch_s:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+from __future__ import annotations
+
+import argparse
+from kbeton.db.session import session_scope
+from kbeton.services.finance_agg import rebuild_channel_balances, rebuild_daily_agg
+
+def main():
+    p = argparse.ArgumentParser(description="Recompute finance_daily_agg and finance_channel_balances from finance_transactions.")
+    p.parse_args()
+
+    with session_scope() as session:
+        rows = rebuild_daily_agg(session)
+        print(f"Rebuilt finance_daily_agg: {rows} rows")
+        rows = rebuild_channel_balances(session)
+        print(f"Rebuilt finance_channel_balances: {rows} rows")
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from kbeton.models.finance import FinanceArticle, MappingRule
 from kbeton.models.inventory import InventoryItem, InventoryBalance
 from kbeton.models.user import User
 from kbeton.services.pricing import set_price
+from kbeton.services.versions import RULES_VERSION, bump_version
 
 def main():
     now = datetime.now(timezone.utc)
@@ -41,6 +42,7 @@ def main():
         add_rule(TxType.income, "бетон", art_beton.id, priority=110)
         add_rule(TxType.income, "блок", art_blocks.id, priority=105)
         add_rule(TxType.expense, "цемент", art_cement.id, priority=120)
+        bump_version(session, RULES_VERSION)
 
         # Inventory items
         items = [
@@ -7,7 +7,7 @@ import random
 from datetime import date, datetime, timedelta, timezone
 
 from kbeton.db.session import session_scope
-from kbeton.importers.utils import norm_counterparty_name
+from kbeton.importers.utils import description_fingerprint, norm_counterparty_name
 from kbeton.models.audit import AuditLog
 from kbeton.models.counterparty import CounterpartyBalance, CounterpartySnapshot
 from kbeton.models.enums import (
@@ -25,6 +25,7 @@ from kbeton.models.inventory import InventoryBalance, InventoryItem, InventoryTx
 from kbeton.models.production import ProductionOutput, ProductionShift
 from kbeton.models.user import User
 from kbeton.services.pricing import set_price
+from kbeton.services.versions import RULES_VERSION, bump_version
 
 DEFAULT_ARTICLES = [
     ("Concrete sales", TxType.income),
@@ -105,6 +106,8 @@ def _ensure_rules(session, articles: dict[str, FinanceArticle], admin_id: int) -
                     created_by_user_id=admin_id,
                 )
             )
+    session.flush()
+    bump_version(session, RULES_VERSION)
 
 
 def _ensure_inventory(session) -> list[InventoryItem]:
@@ -308,6 +311,7 @@ def main() -> None:
                         income_article_id=art_income.id if art_income else None,
                         expense_article_id=art_expense.id if art_expense else None,
                         dedup_hash=dedup_hash,
+                        description_fingerprint=description_fingerprint(desc, cp),
                         raw_fields={"seed": True, "row": i + 1},
                     )
                 )
@@ -6,8 +6,12 @@ from sqlalchemy.orm import sessionmaker
 
 from kbeton.db.base import Base
 from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
 from kbeton.models.finance import FinanceArticle, MappingRule
 from kbeton.models.pricing import PriceVersion
+# the tests build their own sessions instead of going through kbeton.db.session,
+# which is where the apps pick up the finance rollup listeners
+import kbeton.services.finance_agg  # noqa: F401
 
 @pytest.fixture()
 def sqlite_session():
@@ -17,6 +21,7 @@ def sqlite_session():
         User.__table__,
         FinanceArticle.__table__,
         MappingRule.__table__,
+        DataVersion.__table__,
         PriceVersion.__table__,
     ])
     Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
@@ -27,3 +27,24 @@ def test_build_storage_invalid_value(monkeypatch):
     monkeypatch.setattr(settings, "bot_fsm_storage", "unsupported")
     with pytest.raises(RuntimeError):
         build_fsm_storage()
+
+
+def test_unconfirmed_finance_upload_is_deleted_on_cancel(monkeypatch):
+    import asyncio
+
+    from aiogram.fsm.context import FSMContext
+    from aiogram.fsm.storage.base import StorageKey
+
+    from apps.bot import utils
+
+    deleted: list[str] = []
+    monkeypatch.setattr(utils, "delete_object", deleted.append)
+    state = FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=1, chat_id=2, user_id=3))
+
+    async def scenario():
+        await utils.discard_pending_upload(state)
+        await state.update_data(finance_import_key="imports/finance/abc_bank.xlsx")
+        await utils.discard_pending_upload(state)
+
+    asyncio.run(scenario())
+    assert deleted == ["imports/finance/abc_bank.xlsx"]
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from apps.worker.celery_app import IMPORTS_QUEUE, NOTIFICATIONS_QUEUE, REPORTS_QUEUE, celery
+
+
+def _queue_for(name: str) -> str:
+    return celery.amqp.router.route({}, name)["queue"].name
+
+
+def test_every_task_is_routed_to_a_declared_queue():
+    celery.loader.import_default_modules()
+    declared = {q.name for q in celery.conf.task_queues}
+    names = [n for n in celery.tasks if n.startswith("apps.worker.tasks.")]
+    assert names
+    for name in names:
+        assert name in celery.conf.task_routes, name
+        assert _queue_for(name) in declared
+
+
+def test_workload_classes_use_separate_queues():
+    assert _queue_for("apps.worker.tasks.process_finance_import") == IMPORTS_QUEUE
+    assert _queue_for("apps.worker.tasks.process_counterparty_import") == IMPORTS_QUEUE
+    assert _queue_for("apps.worker.tasks.send_daily_pnl") == REPORTS_QUEUE
+    assert _queue_for("apps.worker.tasks.check_inventory_alerts") == NOTIFICATIONS_QUEUE
+    assert _queue_for("apps.worker.tasks.send_telegram_message") == NOTIFICATIONS_QUEUE
+    assert celery.tasks["apps.worker.tasks.process_finance_import"].acks_late
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import datetime
+
+from kbeton.importers.utils import (
+    date_column_converter,
+    detect_date_format,
+    detect_money_locale,
+    money_column_converter,
+    parse_date,
+    parse_money,
+)
+
+
+def test_detects_date_format_once_per_column():
+    assert detect_date_format(["01.02.2026", "15.12.2025", None, ""]) == "%d.%m.%Y"
+    assert detect_date_format(["2026-02-01", datetime.date(2026, 1, 1)]) == "%Y-%m-%d"
+    assert detect_date_format(["01.02.2026", "2026-02-01"]) is None
+    assert detect_date_format([datetime.datetime(2026, 1, 1)]) is None
+
+
+def test_detects_money_locale():
+    assert detect_money_locale([100, 2.5, "300"]) == "plain"
+    assert detect_money_locale(["1 500,50", "12,5"]) == "comma_decimal"
+    assert detect_money_locale(["1,500.25", "12,000"]) == "comma_thousands"
+    assert detect_money_locale(["1.500,25"]) == "dot_thousands"
+    assert detect_money_locale(["1,500.25", "1.500,25"]) is None
+
+
+def test_column_converters_match_per_cell_parsers_including_mixed_cells():
+    dates = ["01.02.2026", "1.2.2026", "31.02.2026", "2026-02-03", "1.2.26", "", None, datetime.date(2026, 2, 4), datetime.datetime(2026, 2, 5, 10)]
+    to_date = date_column_converter(dates[:2])
+    assert [to_date(v) for v in dates] == [parse_date(v) for v in dates]
+
+    amounts = ["1 500,50", "12,5", "1,500", "-1,500", "1.500,00", "1.500", "abc", "", None, 7, 2.25]
+    to_money = money_column_converter(amounts[:2])
+    assert [to_money(v) for v in amounts] == [parse_money(v) for v in amounts]
+
+    fallback = money_column_converter(["1,500.25", "1.500,25"])
+    assert fallback is parse_money
@@ -1,7 +1,8 @@
 from types import SimpleNamespace
 
 from apps.bot.keyboards import dashboard_period_kb
-from apps.bot.routers.finance import _active_dashboard_mode, _active_dashboard_period
+from apps.bot.routers.finance import _active_dashboard_live, _active_dashboard_mode, _active_dashboard_period
+from kbeton.services.dashboard_snapshots import dashboard_reply_markup
 
 
 def test_dashboard_period_keyboard_has_expected_buttons_and_active_state():
@@ -32,3 +33,22 @@ def test_active_dashboard_period_detects_selected_button():
 def test_active_dashboard_mode_detects_selected_button():
     message = SimpleNamespace(reply_markup=dashboard_period_kb("month", "summary"))
     assert _active_dashboard_mode(message) == "summary"
+
+
+def test_live_button_toggles_and_is_detected():
+    off = dashboard_period_kb("week", "summary")
+    on = dashboard_period_kb("week", "summary", live=True)
+    assert [btn.callback_data for btn in off.inline_keyboard[-1]] == ["dashlive:on:week:summary"]
+    assert [(btn.text, btn.callback_data) for btn in on.inline_keyboard[-1]] == [("● 📡 Live", "dashlive:off:week:summary")]
+    assert _active_dashboard_live(SimpleNamespace(reply_markup=on)) is True
+    assert _active_dashboard_live(SimpleNamespace(reply_markup=off)) is False
+    # the live button carries a "●" but is neither a period nor a mode
+    assert _active_dashboard_period(SimpleNamespace(reply_markup=on)) == "week"
+    assert _active_dashboard_mode(SimpleNamespace(reply_markup=on)) == "summary"
+
+
+def test_worker_markup_is_the_bot_keyboard():
+    for live in (False, True):
+        kb = dashboard_period_kb("day", "full", live=live)
+        assert kb.model_dump(exclude_none=True) == dashboard_reply_markup("day", "full", live=live)
+        assert [len(row) for row in kb.inline_keyboard] == [2, 2, 2, 1]
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+
+import redis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from kbeton.models.counterparty import CounterpartySnapshot, CounterpartyBalance
+from kbeton.models.enums import TxType
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob
+from kbeton.models.inventory import InventoryItem, InventoryBalance
+from kbeton.models.production import ProductionShift, ProductionOutput, ProductionRealization
+from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
+from kbeton.services.dashboard_snapshots import (
+    DASHBOARD_DEBOUNCE_SECONDS,
+    REFRESH_DASHBOARDS_TASK,
+    as_of_label,
+    materialize_dashboards,
+    read_dashboard,
+    request_dashboard_refresh,
+    store_dashboard,
+)
+from kbeton.services.manual_finance import create_manual_finance_tx
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data: dict[str, str] = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class _DownRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError("down")
+        return fail
+
+
+class _FakeCelery:
+    def __init__(self):
+        self.sent: list[tuple[str, int]] = []
+
+    def send_task(self, name, countdown=None):
+        self.sent.append((name, countdown))
+
+
+def _session():
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    for table in [
+        User.__table__,
+        FinanceArticle.__table__,
+        ImportJob.__table__,
+        FinanceTransaction.__table__,
+        FinanceDailyAgg.__table__,
+        FinanceChannelBalance.__table__,
+        DataVersion.__table__,
+        CounterpartySnapshot.__table__,
+        CounterpartyBalance.__table__,
+        ProductionShift.__table__,
+        ProductionOutput.__table__,
+        ProductionRealization.__table__,
+        InventoryItem.__table__,
+        InventoryBalance.__table__,
+    ]:
+        table.create(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+    return Session()
+
+
+def test_materialized_dashboards_are_served_until_midnight():
+    session = _session()
+    client = _FakeRedis()
+    today = date(2026, 3, 18)
+    try:
+        create_manual_finance_tx(
+            session, tx_date=today, amount=1500, tx_type=TxType.income, description="Бетон",
+            counterparty="", actor_user_id=None, article_name="Поступление на р/с",
+        )
+        session.flush()
+
+        assert materialize_dashboards(session, today=today, client=client) == 8
+        snapshot = read_dashboard("day", "full", today=today, client=client)
+        assert snapshot is not None
+        assert "Р/с      · 1 500 сом" in snapshot["text"]
+        assert read_dashboard("year", "summary", today=today, client=client)["end"] == today.isoformat()
+
+        assert read_dashboard("day", "full", today=date(2026, 3, 19), client=client) is None
+    finally:
+        session.close()
+
+
+def test_snapshot_keeps_its_as_of_time():
+    client = _FakeRedis()
+    store_dashboard("week", "summary", "text", end=date(2026, 3, 18), client=client, now=datetime(2026, 3, 18, 14, 5))
+    snapshot = read_dashboard("week", "summary", today=date(2026, 3, 18), client=client)
+    assert snapshot["text"] == "text"
+    assert as_of_label(snapshot) == "18.03.2026 14:05"
+    assert read_dashboard("week", "full", today=date(2026, 3, 18), client=client) is None
+
+
+def test_refresh_requests_are_debounced():
+    client, app = _FakeRedis(), _FakeCelery()
+    assert request_dashboard_refresh(app, client=client) is True
+    assert request_dashboard_refresh(app, client=client) is False
+    assert app.sent == [(REFRESH_DASHBOARDS_TASK, DASHBOARD_DEBOUNCE_SECONDS)]
+
+    client.data.clear()  # the pending marker expired
+    assert request_dashboard_refresh(app, client=client) is True
+    assert len(app.sent) == 2
+
+
+def test_redis_down_degrades_to_inline_and_undebounced():
+    client, app = _DownRedis(), _FakeCelery()
+    assert read_dashboard("day", "summary", client=client) is None
+    snapshot = store_dashboard("day", "summary", "text", end=date(2026, 3, 18), client=client)
+    assert snapshot["text"] == "text"
+    assert request_dashboard_refresh(app, client=client) is True
+    assert app.sent == [(REFRESH_DASHBOARDS_TASK, DASHBOARD_DEBOUNCE_SECONDS)]
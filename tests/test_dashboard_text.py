@@ -1,18 +1,23 @@
 from __future__ import annotations
 
+import threading
+import time
+from contextlib import contextmanager
 from datetime import date
+from types import SimpleNamespace
 
-from sqlalchemy import Column, Integer, MetaData, Table, create_engine, text
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 
 from kbeton.models.counterparty import CounterpartySnapshot, CounterpartyBalance
 from kbeton.models.enums import ProductType, ShiftStatus, ShiftType, TxType
-from kbeton.models.finance import FinanceArticle, FinanceTransaction, ImportJob
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob
 from kbeton.models.inventory import InventoryItem, InventoryBalance
 from kbeton.models.production import ProductionShift, ProductionOutput, ProductionRealization
 from kbeton.models.user import User
-
-from apps.bot.routers.finance import _build_dashboard_text
+from kbeton.models.versions import DataVersion
+from kbeton.services import dashboard
+from kbeton.services.dashboard import build_dashboard_text
 from kbeton.importers.utils import norm_counterparty_name
 
 
@@ -23,6 +28,9 @@ def _session():
         FinanceArticle.__table__,
         ImportJob.__table__,
         FinanceTransaction.__table__,
+        FinanceDailyAgg.__table__,
+        FinanceChannelBalance.__table__,
+        DataVersion.__table__,
         CounterpartySnapshot.__table__,
         CounterpartyBalance.__table__,
         ProductionShift.__table__,
@@ -187,7 +195,7 @@ def test_build_dashboard_text_uses_visual_sections():
         )
         session.commit()
 
-        dashboard_text = _build_dashboard_text(session, start=date(date.today().year, date.today().month, 1), end=date.today())
+        dashboard_text = build_dashboard_text(session, start=date(date.today().year, date.today().month, 1), end=date.today())
 
         assert "Д А Ш Б О Р Д" in dashboard_text
         assert "╔" in dashboard_text
@@ -216,7 +224,7 @@ def test_build_dashboard_text_uses_visual_sections():
 def test_build_dashboard_text_supports_summary_mode():
     session = _session()
     try:
-        summary_text = _build_dashboard_text(
+        summary_text = build_dashboard_text(
             session,
             start=date(date.today().year, date.today().month, 1),
             end=date.today(),
@@ -228,3 +236,173 @@ def test_build_dashboard_text_supports_summary_mode():
         assert "┏━━ 📦 Склад" in summary_text
     finally:
         session.close()
+
+
+def _file_session_factory(path):
+    engine = create_engine(f"sqlite+pysqlite:///{path}", future=True)
+    for table in [
+        User.__table__,
+        FinanceArticle.__table__,
+        ImportJob.__table__,
+        FinanceTransaction.__table__,
+        FinanceDailyAgg.__table__,
+        FinanceChannelBalance.__table__,
+        DataVersion.__table__,
+        CounterpartySnapshot.__table__,
+        CounterpartyBalance.__table__,
+        ProductionShift.__table__,
+        ProductionOutput.__table__,
+        ProductionRealization.__table__,
+        InventoryItem.__table__,
+        InventoryBalance.__table__,
+    ]:
+        table.create(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+
+    @contextmanager
+    def scope():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    return Session, scope
+
+
+def test_concurrent_sections_match_sequential_and_time_out_alone(tmp_path, monkeypatch):
+    Session, scope = _file_session_factory(tmp_path / "dash.db")
+    session = Session()
+    try:
+        session.add(ImportJob(id=1, kind="counterparty", status="done", filename="cp.xlsx", s3_key="", summary={}))
+        snap = CounterpartySnapshot(snapshot_date=date(2026, 3, 1), import_job_id=1)
+        session.add(snap)
+        session.flush()
+        session.add_all([
+            CounterpartyBalance(
+                snapshot_id=snap.id, counterparty_name="Аламуд", counterparty_name_norm=norm_counterparty_name("Аламуд"),
+                receivable_money=1_500_000, payable_money=0, receivable_assets="", payable_assets="", ending_balance_money=1_500_000,
+            ),
+            CounterpartyBalance(
+                snapshot_id=snap.id, counterparty_name="Цемент ОсОО", counterparty_name_norm=norm_counterparty_name("Цемент ОсОО"),
+                receivable_money=0, payable_money=250_000, receivable_assets="", payable_assets="", ending_balance_money=-250_000,
+            ),
+        ])
+        session.add(InventoryItem(id=1, name="Щебень 5-20", uom="т", min_qty=0, is_active=True))
+        session.add(InventoryBalance(item_id=1, qty=800))
+        session.commit()
+
+        sequential = build_dashboard_text(session, start=date(2026, 3, 1), end=date(2026, 3, 18))
+        concurrent = build_dashboard_text(session, start=date(2026, 3, 1), end=date(2026, 3, 18), session_factory=scope)
+        assert concurrent == sequential
+        assert "Аламуд" in concurrent and "Цемент ОсОО" in concurrent
+
+        release = threading.Event()
+
+        def slow(_session, _q):
+            release.wait(5)
+            return ["никогда"]
+
+        def broken(_session, _q):
+            raise RuntimeError("boom")
+
+        sections = [
+            (key, title, icon, slow if key == "production" else broken if key == "payables" else build)
+            for key, title, icon, build in dashboard.DASHBOARD_SECTIONS
+        ]
+        monkeypatch.setattr(dashboard, "DASHBOARD_SECTIONS", sections)
+        try:
+            text = build_dashboard_text(
+                session, start=date(2026, 3, 1), end=date(2026, 3, 18), session_factory=scope, section_timeout=0.5
+            )
+        finally:
+            release.set()
+        assert "никогда" not in text
+        assert "┏━━ 🏭 Производство\n┃ нет данных" in text
+        assert "┏━━ 📤 К/З ЗАДОЛЖЕННОСТЬ\n┃ нет данных" in text
+        assert "Аламуд" in text and "Щебень" in text
+    finally:
+        session.close()
+
+
+def test_sections_without_budget_are_waited_for_and_capped_on_the_server(monkeypatch):
+    executed: list[tuple[str, dict]] = []
+
+    class _PgSession:
+        def get_bind(self):
+            return SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+
+        def execute(self, stmt, params=None):
+            executed.append((str(stmt), params))
+
+    @contextmanager
+    def scope():
+        yield _PgSession()
+
+    def slow(_session, _q):
+        time.sleep(0.3)
+        return ["готово"]
+
+    monkeypatch.setattr(dashboard, "DASHBOARD_SECTIONS", [
+        (key, title, icon, slow) for key, title, icon, _build in dashboard.DASHBOARD_SECTIONS
+    ])
+    q = dashboard._DashboardQuery(start=date(2026, 3, 1), end=date(2026, 3, 18), compact=False, snapshot_id=None, snapshot_date=None)
+
+    bodies = dashboard._gather_sections(scope, q, None)
+    assert all(b == ["готово"] for b in bodies.values())
+    assert len(executed) == len(dashboard.DASHBOARD_SECTIONS)
+    assert all("set_config('statement_timeout'" in sql for sql, _ in executed)
+    assert {params["ms"] for _, params in executed} == {str(int(dashboard.DASHBOARD_STATEMENT_TIMEOUT_SECONDS * 1000))}
+
+    executed.clear()
+    bodies = dashboard._gather_sections(scope, q, 0.05)
+    assert all(b == ["нет данных"] for b in bodies.values())
+    time.sleep(0.4)  # the abandoned sections finish in the background
+    assert {params["ms"] for _, params in executed} == {"50"}
+
+
+def test_counterparty_sections_read_only_top_rows_and_realized_names():
+    session = _session()
+    try:
+        session.add(ImportJob(id=1, kind="counterparty", status="done", filename="cp.xlsx", s3_key="", summary={}))
+        snap = CounterpartySnapshot(snapshot_date=date(2026, 3, 1), import_job_id=1)
+        session.add(snap)
+        session.flush()
+        names = [f"Контрагент {i:03d}" for i in range(200)]
+        session.add_all([
+            CounterpartyBalance(
+                snapshot_id=snap.id, counterparty_name=name, counterparty_name_norm=norm_counterparty_name(name),
+                receivable_money=(i * 37) % 200 * 1000, payable_money=(i * 53) % 200 * 100,
+                receivable_assets="", payable_assets="", ending_balance_money=0,
+            )
+            for i, name in enumerate(names)
+        ])
+        shift = ProductionShift(
+            date=date(2026, 3, 10), shift_type=ShiftType.day, equipment="РБУ", area="РБУ",
+            counterparty_name="Контрагент 007", status=ShiftStatus.approved,
+        )
+        session.add(shift)
+        session.flush()
+        output = ProductionOutput(shift_id=shift.id, product_type=ProductType.concrete, quantity=10, uom="м3", mark="M300")
+        session.add(output)
+        session.flush()
+        session.add(ProductionRealization(output_id=output.id, realized_qty=10, unit_price=5000, total_amount=50000))
+        session.commit()
+
+        statements: list[str] = []
+        listen = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+        event.listen(session.get_bind(), "before_cursor_execute", listen)
+        try:
+            text_out = build_dashboard_text(session, start=date(2026, 3, 1), end=date(2026, 3, 18), mode="summary")
+        finally:
+            event.remove(session.get_bind(), "before_cursor_execute", listen)
+
+        debtors = sorted(((n, (i * 37) % 200 * 1000) for i, n in enumerate(names)), key=lambda x: -x[1])[:3]
+        debt_block = text_out.split("Д/З ЗАДОЛЖЕННОСТЬ")[1].split("┗")[0]
+        assert [line.split()[2] for line in debt_block.strip().splitlines()] == [n.split()[1] for n, _ in debtors]
+        assert "долг 59 000 сом" in text_out  # 7 * 37 % 200 * 1000, looked up by name
+
+        cp_queries = [s for s in statements if "FROM counterparty_balances" in s]
+        assert cp_queries and all("LIMIT" in s or " IN (" in s for s in cp_queries)
+    finally:
+        session.close()
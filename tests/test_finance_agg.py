@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from kbeton.db.base import Base
+from kbeton.importers.finance_importer import FinanceRow
+from kbeton.models.enums import PatternType, TxType
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob, MappingRule
+from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
+from kbeton.reports.pnl import pnl
+from kbeton.services.finance_agg import channel_balances, rebuild_channel_balances, rebuild_daily_agg
+from kbeton.services.finance_import import discard_finance_import, import_finance_rows
+from kbeton.services.manual_finance import create_manual_finance_tx
+from kbeton.services.reclassify import reclassify_unknown
+from kbeton.services.triage import assign_cluster
+from kbeton.services.versions import RULES_VERSION, bump_version
+
+
+def _session():
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine, tables=[
+        User.__table__,
+        FinanceArticle.__table__,
+        MappingRule.__table__,
+        DataVersion.__table__,
+        ImportJob.__table__,
+        FinanceTransaction.__table__,
+        FinanceDailyAgg.__table__,
+        FinanceChannelBalance.__table__,
+    ])
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+    return Session()
+
+
+def _row(day: int, amount: float, description: str) -> FinanceRow:
+    return FinanceRow(date=date(2026, 1, day), amount=amount, currency="KGS", description=description, counterparty="", tx_type=None, raw_fields={})
+
+
+def _rollup(session) -> dict:
+    session.flush()
+    rows = session.execute(select(FinanceDailyAgg).where(FinanceDailyAgg.tx_count != 0)).scalars()
+    return {(r.date, r.tx_type, r.article_id): (float(r.amount), r.tx_count) for r in rows}
+
+
+def _assert_matches_rebuild(session) -> dict:
+    incremental = _rollup(session)
+    rebuild_daily_agg(session)
+    assert incremental == _rollup(session)
+    return incremental
+
+
+def test_rollup_follows_every_write_path():
+    session = _session()
+    try:
+        diesel = FinanceArticle(kind=TxType.expense, name="Дизель", is_active=True)
+        rent = FinanceArticle(kind=TxType.expense, name="Аренда", is_active=True)
+        session.add_all([diesel, rent])
+        session.flush()
+        session.add(MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="diesel", priority=100, is_active=True, article_id=diesel.id))
+        job = ImportJob(kind="finance", status="processing", filename="bank.xlsx", s3_key="k")
+        session.add(job)
+        session.flush()
+
+        rows = [_row(d % 5 + 1, 100 + d, "Diesel fuel" if d % 3 == 0 else f"Rent office {d}") for d in range(12)]
+        import_finance_rows(session, job=job, rows=rows + rows[:2], chunk_size=5)
+        rollup = _assert_matches_rebuild(session)
+        assert sum(count for (_d, t, _a), (_s, count) in rollup.items() if t == TxType.unknown) == 8
+
+        create_manual_finance_tx(
+            session, tx_date=date(2026, 1, 2), amount=250, tx_type=TxType.income, description="Бетон",
+            counterparty="", actor_user_id=None, article_name="Продажи",
+        )
+        _assert_matches_rebuild(session)
+
+        sample = session.query(FinanceTransaction).filter(FinanceTransaction.tx_type == TxType.unknown).first()
+        assert assign_cluster(session, sample_id=sample.id, tx_type=TxType.expense, article_id=rent.id) == 8
+        _assert_matches_rebuild(session)
+
+        manual = session.query(FinanceTransaction).filter(FinanceTransaction.description == "Бетон").one()
+        manual.amount = 300
+        manual.date = date(2026, 1, 3)
+        _assert_matches_rebuild(session)
+
+        rows, meta = pnl(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="month")
+        assert meta["total_income"] == 300.0
+        assert meta["total_expense"] == float(sum(100 + d for d in range(12)))
+        assert meta["unknown_count"] == 0
+        assert {a["name"] for a in meta["top_expense_articles"]} == {"Дизель", "Аренда"}
+
+        discard_finance_import(session, job)
+        rollup = _assert_matches_rebuild(session)
+        assert list(rollup.values()) == [(300.0, 1)]
+    finally:
+        session.close()
+
+
+def test_reclassify_updates_rollup():
+    session = _session()
+    try:
+        diesel = FinanceArticle(kind=TxType.expense, name="Дизель", is_active=True)
+        job = ImportJob(kind="finance", status="done", filename="bank.xlsx", s3_key="k")
+        session.add_all([diesel, job])
+        session.flush()
+        import_finance_rows(session, job=job, rows=[_row(1, 40, "Diesel"), _row(2, 60, "Diesel"), _row(2, 5, "Misc")])
+        session.add(MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="diesel", priority=100, is_active=True, article_id=diesel.id))
+        session.flush()
+        bump_version(session, RULES_VERSION)
+
+        assert reclassify_unknown(session)["classified"] == 2
+        rollup = _assert_matches_rebuild(session)
+        assert rollup[(date(2026, 1, 2), TxType.expense, diesel.id)] == (60.0, 1)
+        assert rollup[(date(2026, 1, 2), TxType.unknown, 0)] == (5.0, 1)
+    finally:
+        session.close()
+
+
+def _balances(session) -> dict:
+    session.flush()
+    rows = session.execute(select(FinanceChannelBalance).where(FinanceChannelBalance.tx_count != 0)).scalars()
+    return {(r.channel, r.date): (float(r.amount), r.tx_count) for r in rows}
+
+
+def test_channel_balances_sum_per_day_rows():
+    session = _session()
+    try:
+        job = ImportJob(kind="finance", status="done", filename="bank.xlsx", s3_key="k")
+        session.add(job)
+        session.flush()
+        rows = [
+            FinanceRow(date=date(2026, 1, 10), amount=1000, currency="KGS", description="Поступление", counterparty="", tx_type=None, raw_fields={"payment_channel": "Банк"}),
+            FinanceRow(date=date(2026, 1, 12), amount=300, currency="KGS", description="Прочее", counterparty="", tx_type=None, raw_fields={"payment_channel": "р/с"}),
+            FinanceRow(date=date(2026, 1, 11), amount=50, currency="KGS", description="Комиссия", counterparty="", tx_type=None, raw_fields={}),
+        ]
+        import_finance_rows(session, job=job, rows=rows)
+        assert channel_balances(session, end=date(2026, 1, 31)) == {"bank": (0.0, 2)}  # unknown rows move no money
+
+        sample = session.query(FinanceTransaction).filter(FinanceTransaction.description == "Поступление").one()
+        sample.tx_type = TxType.income
+        create_manual_finance_tx(
+            session, tx_date=date(2026, 1, 11), amount=200, tx_type=TxType.expense, description="Выдача",
+            counterparty="", actor_user_id=None, article_name="Касса: хозрасходы",
+        )
+        # backdated: a row for its own day only, later balances pick it up in the sum
+        create_manual_finance_tx(
+            session, tx_date=date(2026, 1, 5), amount=70, tx_type=TxType.income, description="Перевод на р/с",
+            counterparty="", actor_user_id=None, article_name="Прочие доходы",
+        )
+        incremental = _balances(session)
+        assert incremental[("bank", date(2026, 1, 5))] == (70.0, 1)
+        rebuild_channel_balances(session)
+        assert incremental == _balances(session)
+
+        assert channel_balances(session, end=date(2026, 1, 4)) == {}
+        assert channel_balances(session, end=date(2026, 1, 11)) == {"bank": (1070.0, 2), "cash": (-200.0, 1)}
+        assert channel_balances(session, end=date(2026, 1, 31)) == {"bank": (1070.0, 3), "cash": (-200.0, 1)}
+
+        discard_finance_import(session, job)
+        assert channel_balances(session, end=date(2026, 1, 31)) == {"bank": (70.0, 1), "cash": (-200.0, 1)}
+    finally:
+        session.close()
+
+
+def test_triage_and_reclassify_give_unknown_rows_the_article_channel():
+    session = _session()
+    try:
+        petty = FinanceArticle(kind=TxType.expense, name="Касса: хозрасходы", is_active=True)
+        bank_in = FinanceArticle(kind=TxType.income, name="Поступление на р/с", is_active=True)
+        job = ImportJob(kind="finance", status="done", filename="bank.xlsx", s3_key="k")
+        session.add_all([petty, bank_in, job])
+        session.flush()
+        rows = [
+            _row(3, 40, "Канцтовары"),
+            _row(4, 25, "Канцтовары"),
+            FinanceRow(date=date(2026, 1, 5), amount=10, currency="KGS", description="Канцтовары", counterparty="", tx_type=None, raw_fields={"payment_channel": "Банк"}),
+            _row(6, 900, "Оплата за бетон"),
+        ]
+        import_finance_rows(session, job=job, rows=rows)
+        assert channel_balances(session, end=date(2026, 1, 31)) == {"bank": (0.0, 1)}
+
+        sample = session.query(FinanceTransaction).filter(FinanceTransaction.amount == 40).one()
+        assert assign_cluster(session, sample_id=sample.id, tx_type=TxType.expense, article_id=petty.id) == 3
+        # the statement's own channel wins over the article's
+        assert channel_balances(session, end=date(2026, 1, 31)) == {"bank": (-10.0, 1), "cash": (-65.0, 2)}
+
+        session.add(MappingRule(kind=TxType.income, pattern_type=PatternType.contains, pattern="бетон", priority=100, is_active=True, article_id=bank_in.id))
+        session.flush()
+        bump_version(session, RULES_VERSION)
+        assert reclassify_unknown(session)["classified"] == 1
+        assert channel_balances(session, end=date(2026, 1, 31)) == {"bank": (890.0, 2), "cash": (-65.0, 2)}
+
+        incremental = _balances(session)
+        rebuild_channel_balances(session)
+        assert incremental == _balances(session)
+    finally:
+        session.close()
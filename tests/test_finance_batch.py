@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import io
+import zipfile
+from contextlib import contextmanager
+from datetime import date
+
+import pytest
+from openpyxl import Workbook
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from apps.worker import tasks
+from kbeton.db.base import Base
+from kbeton.importers.batch import split_finance_batch
+from kbeton.importers.finance_formats import iter_finance_file
+from kbeton.models.audit import AuditLog
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob
+from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
+from kbeton.services.import_jobs import aggregate_batch_summary
+
+
+def _workbook(*sheets: str, covers: tuple[str, ...] = ()) -> bytes:
+    wb = Workbook()
+    wb.active.title = sheets[0]
+    for name in sheets[1:]:
+        wb.create_sheet(name)
+    for i, ws in enumerate(wb.worksheets):
+        if ws.title in covers:
+            ws.append(["Сводка по счетам за февраль"])
+            ws.append(["Итого", 1000])
+            continue
+        ws.append(["Дата", "Сумма", "Назначение"])
+        ws.append(["01.02.2026", 100 + i, f"Платеж {ws.title}"])
+    bio = io.BytesIO()
+    wb.save(bio)
+    return bio.getvalue()
+
+
+def test_multi_sheet_workbook_splits_per_sheet_and_single_sheet_does_not():
+    data = _workbook("Bank A", "Bank B")
+    parts = split_finance_batch("accounts.xlsx", data)
+    assert [(p.filename, p.sheet_name, p.data) for p in parts] == [("accounts.xlsx", "Bank A", None), ("accounts.xlsx", "Bank B", None)]
+    rows = list(iter_finance_file("accounts.xlsx", data, sheet_name="Bank B"))
+    assert [r.description for r in rows] == ["Платеж Bank B"]
+    assert split_finance_batch("one.xlsx", _workbook("Sheet")) is None
+    assert split_finance_batch("one.csv", b"date;amount\n") is None
+
+
+def test_zip_splits_per_statement_file():
+    bio = io.BytesIO()
+    with zipfile.ZipFile(bio, "w") as zf:
+        zf.writestr("2026/jan.xlsx", _workbook("Sheet"))
+        zf.writestr("2026/feb.csv", "date;amount;description\n2026-02-01;5;x\n")
+        zf.writestr("2026/readme.pdf", b"%PDF")
+        zf.writestr("__MACOSX/2026/._jan.xlsx", b"junk")
+    parts = split_finance_batch("2026.zip", bio.getvalue())
+    assert [p.title for p in parts] == ["jan.xlsx", "feb.csv"]
+    assert all(p.data for p in parts)
+
+    empty = io.BytesIO()
+    with zipfile.ZipFile(empty, "w") as zf:
+        zf.writestr("readme.txt.pdf", b"")
+    with pytest.raises(ValueError):
+        split_finance_batch("empty.zip", empty.getvalue())
+
+
+def test_only_statement_sheets_become_parts():
+    data = _workbook("Итоги", "Bank A", "Bank B", covers=("Итоги",))
+    assert [p.sheet_name for p in split_finance_batch("accounts.xlsx", data)] == ["Bank A", "Bank B"]
+    # one statement sheet next to a summary: a plain single-statement upload again
+    assert split_finance_batch("accounts.xlsx", _workbook("Выписка", "Итоги", covers=("Итоги",))) is None
+
+
+def test_zip_workbook_sheets_share_one_member_and_size_is_capped(monkeypatch):
+    from kbeton.importers import batch
+
+    bio = io.BytesIO()
+    with zipfile.ZipFile(bio, "w") as zf:
+        zf.writestr("accounts.xlsx", _workbook("Bank A", "Bank B"))
+    parts = split_finance_batch("2026.zip", bio.getvalue())
+    assert [p.title for p in parts] == ["accounts.xlsx [Bank A]", "accounts.xlsx [Bank B]"]
+    assert parts[0].data is parts[1].data
+
+    monkeypatch.setattr(batch, "MAX_BATCH_MEMBER_BYTES", 1024)
+    with pytest.raises(ValueError, match="too large"):
+        split_finance_batch("2026.zip", bio.getvalue())
+
+
+def test_batch_summary_aggregates_done_parts():
+    children = [
+        ImportJob(id=2, filename="jan.xlsx", sheet_name="", status="done", summary={"rows": 10, "inserted": 9, "duplicates": 1, "unknown": 3}, error=""),
+        ImportJob(id=3, filename="feb.xlsx", sheet_name="", status="failed", summary={}, error="Cannot detect header row for finance import"),
+    ]
+    status, summary = aggregate_batch_summary(children)
+    assert status == "done"
+    assert {k: summary[k] for k in ("rows", "inserted", "duplicates", "unknown", "parts", "failed_parts")} == {
+        "rows": 10, "inserted": 9, "duplicates": 1, "unknown": 3, "parts": 2, "failed_parts": 1,
+    }
+    assert aggregate_batch_summary(children[1:])[0] == "failed"
+
+
+def test_failed_part_still_finalizes_the_parent(monkeypatch):
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, AuditLog.__table__, FinanceArticle.__table__, DataVersion.__table__, ImportJob.__table__,
+        FinanceTransaction.__table__, FinanceDailyAgg.__table__, FinanceChannelBalance.__table__,
+    ])
+    session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, future=True)()
+
+    @contextmanager
+    def scope():
+        yield session
+        session.commit()
+
+    class _Progress:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def finish(self, *args, **kwargs):
+            pass
+
+    notified: list[str] = []
+    monkeypatch.setattr(tasks, "session_scope", scope)
+    monkeypatch.setattr(tasks, "ProgressReporter", _Progress)
+    monkeypatch.setattr(tasks, "_notify_import", lambda _s, _job, text, **kw: notified.append(text))
+    monkeypatch.setattr(tasks, "_dashboard_changed", lambda: None)
+
+    parent = ImportJob(kind="finance_batch", status="processing", filename="2026.zip", s3_key="k")
+    session.add(parent)
+    session.flush()
+    done = ImportJob(kind="finance", status="done", filename="jan.xlsx", s3_key="k1", parent_id=parent.id, summary={"rows": 2, "inserted": 2})
+    # raised after committing a chunk, outside its own try: left 'processing' with rows
+    stuck = ImportJob(kind="finance", status="processing", filename="feb.xlsx", s3_key="k2", parent_id=parent.id, summary={"rows": 1, "progress": {"rows_done": 1}})
+    session.add_all([done, stuck])
+    session.flush()
+    session.add(FinanceTransaction(
+        import_job_id=stuck.id, date=date(2026, 2, 1), amount=5, description="x", counterparty="",
+        dedup_hash="h1", raw_fields={},
+    ))
+    session.commit()
+
+    callback = tasks._batch_callback(parent.id)
+    assert [e.task for e in callback.options["link_error"]] == ["apps.worker.tasks.finalize_failed_finance_batch"]
+
+    result = tasks.finalize_failed_finance_batch.run(parent.id)
+    assert result["ok"] is True and result["failed_parts"] == 1
+    assert session.get(ImportJob, parent.id).status == "done"
+    assert session.get(ImportJob, stuck.id).status == "failed"
+    assert "progress" not in session.get(ImportJob, stuck.id).summary
+    assert session.query(FinanceTransaction).count() == 0
+    assert notified and "частей 2, с ошибкой 1" in notified[0]
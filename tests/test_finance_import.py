@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from kbeton.db.base import Base
+from kbeton.importers.finance_importer import FinanceRow
+from kbeton.models.enums import PatternType, TxType
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob, MappingRule
+from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
+from kbeton.services.finance_import import import_finance_rows, insert_finance_chunk
+
+
+def _session():
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine, tables=[
+        User.__table__,
+        FinanceArticle.__table__,
+        MappingRule.__table__,
+        DataVersion.__table__,
+        ImportJob.__table__,
+        FinanceTransaction.__table__,
+        FinanceDailyAgg.__table__,
+        FinanceChannelBalance.__table__,
+    ])
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+    return Session()
+
+
+def _row(day: int, amount: float, description: str, counterparty: str = "") -> FinanceRow:
+    return FinanceRow(
+        date=date(2026, 1, day),
+        amount=amount,
+        currency="KGS",
+        description=description,
+        counterparty=counterparty,
+        tx_type=None,
+        raw_fields={"0": f"2026-01-{day:02d}", "1": amount, "2": description},
+    )
+
+
+def test_import_finance_rows_classifies_and_inserts_in_chunks():
+    session = _session()
+    try:
+        article = FinanceArticle(kind=TxType.expense, name="Дизель", is_active=True)
+        session.add(article)
+        session.flush()
+        session.add(MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="diesel", priority=100, is_active=True, article_id=article.id))
+        job = ImportJob(kind="finance", status="processing", filename="bank.xlsx", s3_key="k")
+        session.add(job)
+        session.flush()
+
+        rows = [_row(d % 28 + 1, 100 + d, "Diesel fuel" if d % 2 else "Misc payment") for d in range(25)]
+        summary = import_finance_rows(session, job=job, rows=iter(rows), chunk_size=7)
+        session.commit()
+
+        assert summary == {"rows": 25, "inserted": 25, "duplicates": 0, "unknown": 13}
+        stored = session.query(FinanceTransaction).filter(FinanceTransaction.import_job_id == job.id).all()
+        assert len(stored) == 25
+        diesel = [t for t in stored if t.description == "Diesel fuel"]
+        assert all(t.tx_type == TxType.expense and t.expense_article_id == article.id for t in diesel)
+    finally:
+        session.close()
+
+
+def test_import_finance_rows_skips_duplicates_within_job():
+    session = _session()
+    try:
+        job = ImportJob(kind="finance", status="processing", filename="bank.xlsx", s3_key="k")
+        session.add(job)
+        session.flush()
+
+        rows = [_row(1, 500, "Оплата"), _row(1, 500, "Оплата"), _row(2, 700, "Оплата")]
+        summary = import_finance_rows(session, job=job, rows=rows, chunk_size=2)
+        session.commit()
+
+        assert summary["inserted"] == 2
+        assert summary["duplicates"] == 1
+        assert session.query(FinanceTransaction).count() == 2
+    finally:
+        session.close()
+
+
+def test_import_finance_rows_skips_rows_from_earlier_imports():
+    session = _session()
+    try:
+        first = ImportJob(kind="finance", status="processing", filename="week1.xlsx", s3_key="k1")
+        second = ImportJob(kind="finance", status="processing", filename="week2.xlsx", s3_key="k2")
+        session.add_all([first, second])
+        session.flush()
+
+        week1 = [_row(d, 100 * d, "Оплата") for d in range(1, 8)]
+        week2 = [_row(d, 100 * d, "Оплата") for d in range(5, 12)]
+        import_finance_rows(session, job=first, rows=week1)
+        summary = import_finance_rows(session, job=second, rows=week2, chunk_size=3)
+        session.commit()
+
+        assert summary["rows"] == 7
+        assert summary["inserted"] == 4
+        assert summary["duplicates"] == 3
+        assert session.query(FinanceTransaction).count() == 11
+
+        # a writer that skips the lock and the prefetch is still stopped by the unique index
+        third = ImportJob(kind="finance", status="processing", filename="week3.xlsx", s3_key="k3")
+        session.add(third)
+        session.flush()
+        stored = session.query(FinanceTransaction).filter(FinanceTransaction.import_job_id == first.id).first()
+        values = [dict(
+            import_job_id=third.id, date=stored.date, amount=stored.amount, currency="KGS", tx_type=TxType.unknown,
+            description=stored.description, counterparty="", dedup_hash=stored.dedup_hash, raw_fields={},
+        )]
+        assert insert_finance_chunk(session, values) == 0
+        assert session.query(FinanceTransaction).count() == 11
+    finally:
+        session.close()
+
+
+def test_preview_reports_columns_dates_and_hit_rate_without_writing():
+    import io
+
+    import pytest
+    from openpyxl import Workbook
+
+    from kbeton.services.finance_preview import preview_finance_file
+
+    session = _session()
+    try:
+        article = FinanceArticle(kind=TxType.expense, name="Дизель", is_active=True)
+        session.add(article)
+        session.flush()
+        session.add(MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="дизель", priority=100, is_active=True, article_id=article.id))
+        session.flush()
+
+        wb = Workbook()
+        ws = wb.active
+        ws.append(["Выписка"])
+        ws.append(["Дата", "Сумма", "Назначение"])
+        for day in range(1, 11):
+            ws.append([date(2026, 3, day), 100 * day, "Дизель" if day % 2 else "Прочее"])
+        bio = io.BytesIO()
+        wb.save(bio)
+
+        preview = preview_finance_file(session, filename="march.xlsx", data=bio.getvalue(), sample_rows=6)
+        assert preview["columns"] == {"date": "Дата", "amount": "Сумма", "description": "Назначение"}
+        assert preview["sample_rows"] == 6
+        assert (preview["date_min"], preview["date_max"]) == ("2026-03-01", "2026-03-06")
+        assert preview["unknown"] == 3
+        assert preview["hit_rate"] == 0.5
+        assert session.query(FinanceTransaction).count() == 0
+
+        with pytest.raises(ValueError):
+            preview_finance_file(session, filename="bad.csv", data=b"foo;bar\n1;2\n")
+    finally:
+        session.close()
+
+
+def test_dedup_check_takes_bucket_locks_in_order_on_postgres():
+    from types import SimpleNamespace
+
+    from sqlalchemy.dialects import postgresql
+
+    from kbeton.services.finance_import import FINANCE_DEDUP_LOCK_NAMESPACE, lock_dedup_hashes
+
+    executed = []
+    session = SimpleNamespace(
+        get_bind=lambda: SimpleNamespace(dialect=SimpleNamespace(name="postgresql")),
+        execute=lambda stmt, params: executed.append((stmt, params)),
+    )
+    lock_dedup_hashes(session, {"ff00", "0a11", "ff99", "7c00"})
+    stmt, params = executed[0]
+    assert params == {"namespace": FINANCE_DEDUP_LOCK_NAMESPACE, "buckets": [0x0A, 0x7C, 0xFF]}
+    assert "pg_advisory_xact_lock" in str(stmt.compile(dialect=postgresql.dialect()))
+
+    sqlite_session = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=SimpleNamespace(name="sqlite")))
+    lock_dedup_hashes(sqlite_session, {"ff00"})  # no-op, nothing to execute
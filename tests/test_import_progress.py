@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from kbeton.importers.estimate import estimate_rows
+from kbeton.services.import_progress import ProgressReporter, progress_lines, read_progress
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data: dict[str, str] = {}
+        self.writes = 0
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.writes += 1
+
+    def get(self, key):
+        return self.data.get(key)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_progress_is_throttled_and_reports_eta():
+    client, clock = _FakeRedis(), _Clock()
+    reporter = ProgressReporter(7, total_estimate=4000, min_interval=2.0, client=client, clock=clock)
+
+    reporter.update({"rows": 0})
+    clock.now += 0.5
+    reporter.update({"rows": 1000, "inserted": 990, "unknown": 100})
+    assert client.writes == 1
+
+    clock.now += 2.0
+    reporter.update({"rows": 1000, "inserted": 990, "unknown": 100})
+    assert client.writes == 2
+    progress = read_progress(7, client=client)
+    assert progress["status"] == "processing"
+    assert progress["classified"] == 900
+    assert progress["eta_seconds"] == 7.5
+
+    reporter.finish("done", {"rows": 4000, "inserted": 3990, "unknown": 10, "duplicates": 10})
+    progress = read_progress(7, client=client)
+    assert progress["status"] == "done"
+    assert progress["eta_seconds"] is None
+    assert "Записано: 3 990" in progress_lines(progress)
+
+
+def test_progress_lines_for_queued_job_and_row_estimate():
+    assert progress_lines(None) == ["Статус: в очереди"]
+    assert estimate_rows("a.csv", b"date;amount\n1;2\n3;4\n") == 2
+    assert estimate_rows("a.xlsx", b"not a zip") is None
+
+
+def test_eta_after_resume_uses_only_rows_of_this_attempt():
+    client, clock = _FakeRedis(), _Clock()
+    reporter = ProgressReporter(8, total_estimate=4000, client=client, clock=clock)
+    clock.now += 2.0
+    # 3000 rows were committed by the failed attempt, 500 more in the last 2 s
+    reporter.update({"rows": 3500, "resumed": 3000, "inserted": 3500})
+    assert read_progress(8, client=client)["eta_seconds"] == 2.0
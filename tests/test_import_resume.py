@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from apps.worker import tasks
+from kbeton.db.base import Base
+from kbeton.importers.counterparties_importer import CounterpartyRow
+from kbeton.importers.finance_importer import FinanceRow
+from kbeton.models.counterparty import CounterpartyBalance, CounterpartySnapshot
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob, MappingRule
+from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
+from kbeton.services.counterparties import import_counterparty_rows, latest_counterparty_snapshot
+from kbeton.services.finance_import import discard_finance_import, import_finance_rows
+
+
+def _session():
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine, tables=[
+        User.__table__,
+        FinanceArticle.__table__,
+        MappingRule.__table__,
+        DataVersion.__table__,
+        ImportJob.__table__,
+        FinanceTransaction.__table__,
+        FinanceDailyAgg.__table__,
+        FinanceChannelBalance.__table__,
+        CounterpartySnapshot.__table__,
+        CounterpartyBalance.__table__,
+    ])
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+    return Session()
+
+
+def _fin_row(i: int) -> FinanceRow:
+    return FinanceRow(
+        date=date(2026, 2, i % 28 + 1),
+        amount=1000 + i,
+        currency="KGS",
+        description=f"Платеж {i}",
+        counterparty="",
+        tx_type=None,
+        raw_fields={},
+    )
+
+
+def _cp_row(i: int) -> CounterpartyRow:
+    return CounterpartyRow(
+        counterparty_name=f"ОсОО {i}",
+        counterparty_name_norm=f"осоо {i}",
+        receivable_money=float(i),
+        receivable_assets="",
+        payable_money=0.0,
+        payable_assets="",
+        ending_balance_money=float(i),
+        raw_fields={},
+    )
+
+
+def _crash_after(rows, n: int):
+    for i, row in enumerate(rows):
+        if i == n:
+            raise RuntimeError("worker lost")
+        yield row
+
+
+def test_finance_import_resumes_after_last_committed_chunk():
+    session = _session()
+    try:
+        job = ImportJob(kind="finance", status="processing", filename="bank.xlsx", s3_key="k")
+        session.add(job)
+        session.commit()
+        rows = [_fin_row(i) for i in range(23)]
+
+        with pytest.raises(RuntimeError):
+            import_finance_rows(session, job=job, rows=_crash_after(rows, 12), chunk_size=5, commit_chunks=True)
+        session.rollback()
+        assert session.query(FinanceTransaction).count() == 10
+        assert job.summary["progress"]["rows_done"] == 10
+
+        summary = import_finance_rows(session, job=job, rows=rows, chunk_size=5, commit_chunks=True)
+        assert summary == {"rows": 23, "inserted": 23, "duplicates": 0, "unknown": 23}
+        assert session.query(FinanceTransaction).count() == 23
+    finally:
+        session.close()
+
+
+def test_failed_import_reruns_from_the_first_row():
+    session = _session()
+    try:
+        job = ImportJob(kind="finance", status="processing", filename="bank.xlsx", s3_key="k")
+        session.add(job)
+        session.commit()
+        rows = [_fin_row(i) for i in range(23)]
+
+        with pytest.raises(RuntimeError) as err:
+            import_finance_rows(session, job=job, rows=_crash_after(rows, 12), chunk_size=5, commit_chunks=True)
+        job = tasks._fail_import(session, job.id, discard_finance_import, err.value)
+        session.commit()
+        assert session.query(FinanceTransaction).count() == 0
+        assert "progress" not in job.summary and "rows" not in job.summary
+
+        # a redelivered run of the failed job
+        job = tasks._start_import(session, job.id)
+        summary = import_finance_rows(session, job=job, rows=rows, chunk_size=5, commit_chunks=True)
+        assert summary == {"rows": 23, "inserted": 23, "duplicates": 0, "unknown": 23}
+        assert session.query(FinanceTransaction).count() == 23
+    finally:
+        session.close()
+
+
+def test_resume_rejects_changed_file():
+    session = _session()
+    try:
+        job = ImportJob(kind="finance", status="processing", filename="bank.xlsx", s3_key="k")
+        session.add(job)
+        session.commit()
+        with pytest.raises(RuntimeError):
+            import_finance_rows(session, job=job, rows=_crash_after([_fin_row(i) for i in range(10)], 6), chunk_size=3, commit_chunks=True)
+        session.rollback()
+
+        changed = [_fin_row(i + 100) for i in range(10)]
+        with pytest.raises(ValueError):
+            import_finance_rows(session, job=job, rows=changed, chunk_size=3, commit_chunks=True)
+    finally:
+        session.close()
+
+
+def test_counterparty_import_resumes_into_same_snapshot():
+    session = _session()
+    try:
+        job = ImportJob(kind="counterparty", status="processing", filename="cp.xlsx", s3_key="k")
+        session.add(job)
+        session.commit()
+        rows = [_cp_row(i) for i in range(9)]
+
+        with pytest.raises(RuntimeError):
+            import_counterparty_rows(session, job=job, rows=_crash_after(rows, 7), snapshot_date=date(2026, 2, 1), chunk_size=4, commit_chunks=True)
+        session.rollback()
+        assert latest_counterparty_snapshot(session) is None
+
+        result = import_counterparty_rows(session, job=job, rows=rows, snapshot_date=date(2026, 2, 2), chunk_size=4, commit_chunks=True)
+        job.status = "done"
+        session.commit()
+
+        assert result["rows"] == 9
+        assert session.query(CounterpartySnapshot).count() == 1
+        assert session.query(CounterpartyBalance).count() == 9
+        assert latest_counterparty_snapshot(session).id == result["snapshot_id"]
+    finally:
+        session.close()
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+from datetime import date
+
+from apps.worker import tasks
+from kbeton.services import dashboard_snapshots, live_dashboard
+from kbeton.services.dashboard_snapshots import store_dashboard
+from kbeton.services.live_dashboard import (
+    LIVE_DASHBOARD_CHATS_KEY,
+    LIVE_EDIT_MIN_INTERVAL_SECONDS,
+    UPDATE_LIVE_DASHBOARD_TASK,
+    get_live,
+    schedule_live_updates,
+    start_live,
+    take_live,
+)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data: dict[str, str] = {}
+        self.sets: dict[str, set[str]] = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False, xx=False, keepttl=False):
+        if (nx and key in self.data) or (xx and key not in self.data):
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(str(member))
+
+    def srem(self, key, member):
+        self.sets.get(key, set()).discard(str(member))
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+
+class _FakeCelery:
+    def __init__(self):
+        self.sent: list[tuple[str, list, int]] = []
+
+    def send_task(self, name, args=None, countdown=None):
+        self.sent.append((name, args, countdown))
+
+
+def test_live_updates_are_coalesced_per_chat_and_spaced_out():
+    client, app = _FakeRedis(), _FakeCelery()
+    start_live(10, 501, "month", "full", "text", client=client, now=1000.0)
+    start_live(20, 777, "day", "summary", "text", client=client, now=900.0)
+
+    assert schedule_live_updates(app, client=client, now=1005.0) == 2
+    assert sorted(app.sent) == [
+        (UPDATE_LIVE_DASHBOARD_TASK, [10], LIVE_EDIT_MIN_INTERVAL_SECONDS - 5),
+        (UPDATE_LIVE_DASHBOARD_TASK, [20], 0),
+    ]
+    # more changes while both runs are pending add nothing
+    assert schedule_live_updates(app, client=client, now=1006.0) == 0
+
+    assert take_live(20, client=client)["message_id"] == 777
+    assert schedule_live_updates(app, client=client, now=1007.0) == 1
+
+    client.delete("dashlive:10")  # TTL ran out
+    client.delete("dashlive:pending:10")
+    schedule_live_updates(app, client=client, now=1100.0)
+    assert client.smembers(LIVE_DASHBOARD_CHATS_KEY) == {"20"}
+
+
+def test_update_task_edits_only_when_the_dashboard_changed(monkeypatch):
+    client = _FakeRedis()
+    monkeypatch.setattr(live_dashboard, "get_redis", lambda: client)
+    monkeypatch.setattr(dashboard_snapshots, "get_redis", lambda: client)
+    edits: list[tuple] = []
+    replies = [{"ok": True}]
+    monkeypatch.setattr(tasks, "tg_edit_message", lambda *args: edits.append(args) or replies[-1])
+    today = date.today()
+
+    store_dashboard("week", "full", "Р/с · 1 000 сом", end=today)
+    start_live(10, 501, "week", "full", "Р/с · 1 000 сом", now=1000.0)
+    assert tasks.update_live_dashboard.run(10)["reason"] == "unchanged"
+
+    store_dashboard("week", "full", "Р/с · 2 500 сом", end=today)
+    assert tasks.update_live_dashboard.run(10)["edited"] is True
+    chat_id, message_id, html_text, markup = edits[-1]
+    assert (chat_id, message_id) == (10, 501)
+    assert "2 500 сом" in html_text
+    assert markup["inline_keyboard"][-1][0]["callback_data"] == "dashlive:off:week:full"
+    assert tasks.update_live_dashboard.run(10)["reason"] == "unchanged"
+
+    store_dashboard("week", "full", "Р/с · 3 000 сом", end=today)
+    replies.append({"ok": False, "description": "Bad Request: message to edit not found"})
+    assert tasks.update_live_dashboard.run(10)["ok"] is False
+    assert get_live(10) is None
+    assert tasks.update_live_dashboard.run(10)["reason"] == "not live"
+    assert json.loads(client.data["dashboard:week:full"])["text"] == "Р/с · 3 000 сом"
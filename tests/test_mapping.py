@@ -2,7 +2,8 @@ from __future__ import annotations
 
 from kbeton.models.enums import TxType, PatternType
 from kbeton.models.finance import FinanceArticle, MappingRule
-from kbeton.services.mapping import classify_transaction, apply_article
+from kbeton.services.mapping import _MISSING, ClassificationMemo, RuleEngine, apply_article, classify_many, classify_transaction, classify_with_rules, get_rule_engine
+from kbeton.services.versions import RULES_VERSION, bump_version
 
 def test_mapping_contains(sqlite_session):
     s = sqlite_session
@@ -26,3 +27,69 @@ def test_apply_article_validates_kind(sqlite_session):
         assert False, "Expected ValueError"
     except ValueError:
         assert True
+
+def _rule(rule_id, pattern, *, ptype=PatternType.contains, priority=100, kind=TxType.expense, article_id=1):
+    return MappingRule(id=rule_id, kind=kind, pattern_type=ptype, pattern=pattern, priority=priority, is_active=True, article_id=article_id)
+
+def test_rule_engine_matches_legacy_order():
+    import random
+
+    words = ["цемент", "дизель", "бетон", "аренда", "зп", "ент", "бет", "оплата", ""]
+    rnd = random.Random(7)
+    rules = []
+    for i in range(1, 60):
+        if rnd.random() < 0.25:
+            pat, ptype = rnd.choice([r"^оплата", r"бетон\s+м\d+", r"(", r"ДИЗ"]), PatternType.regex
+        else:
+            pat, ptype = rnd.choice(words[:-1]) + rnd.choice(["", " м", "а"]), PatternType.contains
+        rules.append(_rule(i, pat, ptype=ptype, priority=rnd.choice([90, 100, 110]), article_id=i))
+    rules.append(_rule(99, "", priority=50, article_id=99))
+    rules.sort(key=lambda r: (-r.priority, r.id))
+    engine = RuleEngine(rules)
+    for _ in range(500):
+        desc = " ".join(rnd.choice(words) for _ in range(rnd.randint(0, 4)))
+        cp = rnd.choice(["ОсОО Цемент", "ИП Бетон М300", ""])
+        assert engine.classify(description=desc, counterparty=cp) == classify_with_rules(rules, description=desc, counterparty=cp)
+
+def test_rule_engine_rebuilt_after_version_bump(sqlite_session):
+    s = sqlite_session
+    a = FinanceArticle(kind=TxType.expense, name="Дизель", is_active=True)
+    s.add(a); s.flush()
+    assert classify_transaction(s, description="Дизель для миксера", counterparty="") == (TxType.unknown, None)
+    engine = get_rule_engine(s)
+
+    s.add(MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="дизель", priority=100, is_active=True, article_id=a.id))
+    s.flush()
+    assert get_rule_engine(s) is engine  # cached until the version moves
+    bump_version(s, RULES_VERSION)
+    assert get_rule_engine(s) is not engine
+    assert classify_transaction(s, description="Дизель для миксера", counterparty="") == (TxType.expense, a.id)
+
+def test_classify_many_matches_single_calls(sqlite_session):
+    s = sqlite_session
+    a = FinanceArticle(kind=TxType.expense, name="Цемент", is_active=True)
+    b = FinanceArticle(kind=TxType.income, name="Продажи", is_active=True)
+    s.add_all([a, b]); s.flush()
+    s.add_all([
+        MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="цемент", priority=100, is_active=True, article_id=a.id),
+        MappingRule(kind=TxType.income, pattern_type=PatternType.regex, pattern=r"бетон\s+м\d+", priority=110, is_active=True, article_id=b.id),
+    ])
+    s.flush()
+    rows = [("Цемент М500", "ОсОО Цемент"), ("Бетон М300", "ИП Иванов"), ("Цемент М500", "ОсОО Цемент"), ("Аренда", "")]
+    result = classify_many(s, rows)
+    assert result == [classify_transaction(s, description=d, counterparty=c) for d, c in rows]
+    assert result == [(TxType.expense, a.id), (TxType.income, b.id), (TxType.expense, a.id), (TxType.unknown, None)]
+
+def test_classification_memo_lru_ttl_and_counters():
+    now = [0.0]
+    memo = ClassificationMemo(maxsize=2, ttl=10, clock=lambda: now[0])
+    engine = RuleEngine([_rule(1, "дизель", article_id=5)], version=3, memo=memo)
+    rows = [("Дизель", "АЗС"), ("Прочее", ""), ("Дизель", "АЗС"), ("  ДИЗЕЛЬ", "азс ")]
+    assert engine.classify_many(rows) == [(TxType.expense, 5), (TxType.unknown, None), (TxType.expense, 5), (TxType.expense, 5)]
+    assert memo.stats() == {"hits": 2, "misses": 2, "size": 2, "hit_rate": 0.5}
+    assert memo.get((3, "дизель азс")) is not None and memo.get((4, "дизель азс")) is _MISSING  # keyed on version
+
+    engine.classify(description="Аренда", counterparty="")  # evicts the least recently used entry
+    assert memo.stats()["size"] == 2 and memo.get((3, "прочее")) is _MISSING
+    now[0] = 11
+    assert memo.get((3, "дизель азс")) is _MISSING  # expired
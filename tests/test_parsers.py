@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import io
 import datetime
+import types
+
+import pytest
 from openpyxl import Workbook
 
-from kbeton.importers.finance_importer import parse_finance_xlsx
-from kbeton.importers.counterparties_importer import parse_counterparties_xlsx
+from kbeton.importers.finance_importer import iter_finance_rows, parse_finance_xlsx
+from kbeton.importers.counterparties_importer import iter_counterparty_rows, parse_counterparties_xlsx
 
 def _xlsx_bytes(rows):
     wb = Workbook()
@@ -37,3 +40,31 @@ def test_counterparty_parser_detects_headers():
     assert rows[0].counterparty_name == "ОсОО СтройИнвест"
     assert rows[0].receivable_money == 500000
     assert "цемент" in rows[0].receivable_assets.lower()
+
+def test_finance_iter_rows_streams_after_title_rows():
+    data = _xlsx_bytes([
+        ["Выписка по счету"],
+        [],
+        ["Дата", "Сумма", "Назначение"],
+        [datetime.date(2026, 1, 2), "1 500,50", "Дизель"],
+        [None, None, None],
+        ["03.01.2026", -200, "Комиссия"],
+    ])
+    rows = iter_finance_rows(data)
+    assert isinstance(rows, types.GeneratorType)
+    rows = list(rows)
+    assert [r.date for r in rows] == [datetime.date(2026, 1, 2), datetime.date(2026, 1, 3)]
+    assert rows[0].amount == 1500.5
+    assert rows[1].currency == "KGS"
+    assert rows[1].counterparty == ""
+
+def test_iter_rows_header_search_is_bounded():
+    data = _xlsx_bytes([["-"]] * 5 + [["Дата", "Сумма", "Назначение"], ["01.01.2026", 1, "x"]])
+    with pytest.raises(ValueError):
+        list(iter_finance_rows(data, max_scan=5))
+    assert len(list(iter_finance_rows(data, max_scan=6))) == 1
+
+    cp = _xlsx_bytes([["-"]] * 3 + [["Контрагент", "Сальдо конечное"], ["ОсОО А", 10]])
+    with pytest.raises(ValueError):
+        list(iter_counterparty_rows(cp, max_scan=3))
+    assert [r.ending_balance_money for r in iter_counterparty_rows(cp)] == [10]
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import case, create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from kbeton.db.base import Base
+from kbeton.models.enums import TxType
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob
+from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
+from kbeton.reports.pnl import PnlRow, pnl
+
+
+def _session():
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine, tables=[
+        User.__table__,
+        FinanceArticle.__table__,
+        ImportJob.__table__,
+        FinanceTransaction.__table__,
+        FinanceDailyAgg.__table__,
+        FinanceChannelBalance.__table__,
+        DataVersion.__table__,
+    ])
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+    return Session()
+
+
+# The per-day Python implementation pnl() had before bucketing moved into SQL;
+# kept here as the reference the SQL version must agree with.
+
+def _date_floor(d: date, period: str) -> date:
+    if period == "day":
+        return d
+    if period == "week":
+        return d - timedelta(days=d.weekday())
+    if period == "month":
+        return date(d.year, d.month, 1)
+    if period == "quarter":
+        return date(d.year, (d.month - 1) // 3 * 3 + 1, 1)
+    if period == "year":
+        return date(d.year, 1, 1)
+    raise ValueError("Invalid period")
+
+
+def _reference_pnl(session, *, start: date, end: date, period: str):
+    tx = FinanceTransaction
+    rows = session.execute(
+        select(
+            tx.date.label("d"),
+            func.sum(case((tx.tx_type == TxType.income, tx.amount), else_=0)).label("income"),
+            func.sum(case((tx.tx_type == TxType.expense, tx.amount), else_=0)).label("expense"),
+            func.sum(case((tx.tx_type == TxType.unknown, 1), else_=0)).label("unknown_count"),
+        )
+        .where(tx.date >= start, tx.date <= end)
+        .group_by(tx.date)
+    ).all()
+    by_day = {r.d: (float(r.income or 0), float(r.expense or 0), int(r.unknown_count or 0)) for r in rows}
+    out: dict[date, PnlRow] = {}
+    unknown_total = 0
+    daily = []
+    d = start
+    while d <= end:
+        inc, exp, unk = by_day.get(d, (0.0, 0.0, 0))
+        unknown_total += unk
+        ps = _date_floor(d, period)
+        out.setdefault(ps, PnlRow(period_start=ps, income_sum=0.0, expense_sum=0.0))
+        out[ps].income_sum += inc
+        out[ps].expense_sum += exp
+        daily.append({"date": d, "income": inc, "expense": exp, "net": inc - exp})
+        d += timedelta(days=1)
+    top = {}
+    for kind, column in ((TxType.income, tx.income_article_id), (TxType.expense, tx.expense_article_id)):
+        top[kind] = [
+            {"name": name, "amount": float(amount)}
+            for name, amount in session.execute(
+                select(FinanceArticle.name, func.sum(tx.amount))
+                .join(FinanceArticle, FinanceArticle.id == column)
+                .where(tx.tx_type == kind, tx.date >= start, tx.date <= end)
+                .group_by(FinanceArticle.name)
+                .order_by(func.sum(tx.amount).desc())
+                .limit(10)
+            ).all()
+        ]
+    return [out[p] for p in sorted(out)], unknown_total, daily, top
+
+
+def _seed(session, rng: random.Random) -> None:
+    articles = [FinanceArticle(kind=TxType.expense if i % 2 else TxType.income, name=f"Статья {i}", is_active=True) for i in range(4)]
+    job = ImportJob(kind="finance", status="done", filename="bank.xlsx", s3_key="k")
+    session.add_all(articles + [job])
+    session.flush()
+    for i in range(300):
+        tx_type = rng.choice([TxType.income, TxType.expense, TxType.unknown])
+        article = rng.choice([a for a in articles if a.kind == tx_type] + [None]) if tx_type != TxType.unknown else None
+        session.add(FinanceTransaction(
+            import_job_id=job.id, date=date(2024, 1, 1) + timedelta(days=rng.randrange(900)),
+            amount=round(rng.uniform(1, 50_000), 2), tx_type=tx_type, description="", counterparty="",
+            income_article_id=article.id if article and tx_type == TxType.income else None,
+            expense_article_id=article.id if article and tx_type == TxType.expense else None,
+            dedup_hash=f"h{i}", raw_fields={},
+        ))
+    session.flush()
+
+
+def test_pnl_matches_reference_implementation():
+    rng = random.Random(20261016)
+    session = _session()
+    try:
+        _seed(session, rng)
+        for _ in range(40):
+            start = date(2023, 12, 1) + timedelta(days=rng.randrange(950))
+            end = start + timedelta(days=rng.randrange(400))
+            period = rng.choice(["day", "week", "month", "quarter", "year"])
+
+            rows, meta = pnl(session, start=start, end=end, period=period)
+            ref_rows, ref_unknown, ref_daily, ref_top = _reference_pnl(session, start=start, end=end, period=period)
+
+            assert [r.period_start for r in rows] == [r.period_start for r in ref_rows], (start, end, period)
+            assert [r.income_sum for r in rows] == pytest.approx([r.income_sum for r in ref_rows])
+            assert [r.expense_sum for r in rows] == pytest.approx([r.expense_sum for r in ref_rows])
+            assert meta["unknown_count"] == ref_unknown
+            assert [d["date"] for d in meta["daily"]] == [d["date"] for d in ref_daily]
+            for key in ("income", "expense", "net"):
+                assert [d[key] for d in meta["daily"]] == pytest.approx([d[key] for d in ref_daily])
+            assert meta["total_net"] == pytest.approx(sum(r.net_profit for r in ref_rows))
+            for key, kind in (("top_income_articles", TxType.income), ("top_expense_articles", TxType.expense)):
+                assert [a["name"] for a in meta[key]] == [a["name"] for a in ref_top[kind]]
+                assert [a["amount"] for a in meta[key]] == pytest.approx([a["amount"] for a in ref_top[kind]])
+    finally:
+        session.close()
+
+
+def test_pnl_is_one_statement():
+    session = _session()
+    try:
+        _seed(session, random.Random(7))
+        statements = []
+        event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+        _rows, meta = pnl(session, start=date(2024, 1, 1), end=date(2025, 12, 31), period="month")
+        assert len(statements) == 1
+        assert meta["top_income_articles"] and meta["top_expense_articles"]
+    finally:
+        session.close()
+
+
+def test_pnl_long_range_quarterly_and_bad_period():
+    session = _session()
+    try:
+        rows, meta = pnl(session, start=date(2016, 2, 15), end=date(2026, 2, 14), period="quarter")
+        assert rows[0].period_start == date(2016, 1, 1) and rows[-1].period_start == date(2026, 1, 1)
+        assert len(rows) == 41 and len(meta["daily"]) == 3653
+        assert pnl(session, start=date(2026, 1, 2), end=date(2026, 1, 1), period="day")[0] == []
+        with pytest.raises(ValueError):
+            pnl(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="decade")
+    finally:
+        session.close()
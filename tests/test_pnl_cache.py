@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from datetime import date
+
+import redis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from kbeton.db.base import Base
+from kbeton.models.enums import TxType
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob
+from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
+from kbeton.services.manual_finance import create_manual_finance_tx
+from kbeton.services.pnl_cache import PnlCache
+from kbeton.services.versions import FINANCE_VERSION, get_version
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+        self.hashes: dict[str, dict[bytes, int]] = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def hincrby(self, key, field, amount):
+        h = self.hashes.setdefault(key, {})
+        h[field.encode()] = h.get(field.encode(), 0) + amount
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+
+class _DownRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError("down")
+        return fail
+
+
+def _session():
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine, tables=[
+        User.__table__,
+        FinanceArticle.__table__,
+        DataVersion.__table__,
+        ImportJob.__table__,
+        FinanceTransaction.__table__,
+        FinanceDailyAgg.__table__,
+        FinanceChannelBalance.__table__,
+    ])
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+    return Session()
+
+
+def _add_income(session, amount: float) -> None:
+    create_manual_finance_tx(
+        session, tx_date=date(2026, 1, 5), amount=amount, tx_type=TxType.income, description="Бетон",
+        counterparty="", actor_user_id=None, article_name="Продажи",
+    )
+    session.flush()
+
+
+def test_pnl_cache_hits_until_finance_version_moves():
+    session = _session()
+    client = _FakeRedis()
+    cache = PnlCache(client)
+    try:
+        _add_income(session, 1000)
+        version = get_version(session, FINANCE_VERSION)
+        assert version > 0
+
+        rows, meta = cache.report(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="week")
+        cached_rows, cached_meta = cache.report(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="week")
+        assert cached_rows == rows and cached_meta == meta
+        assert cached_meta["daily"][0]["date"] == date(2026, 1, 1)
+        assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+        xlsx = cache.xlsx(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="week")
+        assert xlsx[:2] == b"PK" and cache.xlsx(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="week") == xlsx
+        # the report read behind the first xlsx miss is not a lookup of its own
+        assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5}
+
+        rows, meta = cache.report(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="month")
+        cache.xlsx(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="month", report=(rows, meta))
+        assert cache.stats() == {"hits": 2, "misses": 4, "hit_rate": 0.333}
+
+        _add_income(session, 500)
+        assert get_version(session, FINANCE_VERSION) > version
+        _rows, meta = cache.report(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="week")
+        assert meta["total_income"] == 1500.0
+    finally:
+        session.close()
+
+
+def test_pnl_cache_falls_back_when_redis_is_down():
+    session = _session()
+    try:
+        _add_income(session, 700)
+        cache = PnlCache(_DownRedis())
+        _rows, meta = cache.report(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="month")
+        assert meta["total_income"] == 700.0
+        assert cache.xlsx(session, start=date(2026, 1, 1), end=date(2026, 1, 31), period="month")[:2] == b"PK"
+        assert cache.stats() == {"hits": 0, "misses": 0, "hit_rate": 0.0}
+    finally:
+        session.close()
@@ -12,3 +12,79 @@ def test_postgres_connection_smoke():
     with engine.connect() as conn:
         value = conn.execute(text("select 1")).scalar_one()
     assert value == 1
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL is not set")
+def test_dedup_bucket_locks_block_a_second_importer():
+    from sqlalchemy.orm import Session
+
+    from kbeton.services.finance_import import lock_dedup_hashes
+
+    engine = create_engine(os.environ["TEST_DATABASE_URL"], pool_pre_ping=True)
+    with Session(engine) as first, Session(engine) as second:
+        lock_dedup_hashes(first, {"ab" + "0" * 62})
+        second.execute(text("SET LOCAL lock_timeout = '200ms'"))
+        with pytest.raises(Exception):
+            lock_dedup_hashes(second, {"ab" + "1" * 62})
+        second.rollback()
+        first.commit()
+        lock_dedup_hashes(second, {"ab" + "1" * 62})
+        second.commit()
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL is not set")
+def test_pnl_generate_series_bucketing_matches_reference():
+    import random
+    from datetime import date, timedelta
+
+    from sqlalchemy.orm import Session
+    from test_pnl import _reference_pnl, _seed
+
+    from kbeton.db.base import Base
+    from kbeton.models.enums import TxType
+    from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob
+    from kbeton.models.user import User
+    from kbeton.models.versions import DataVersion
+    from kbeton.reports.pnl import pnl
+
+    engine = create_engine(os.environ["TEST_DATABASE_URL"], pool_pre_ping=True)
+    with engine.connect() as conn:
+        outer = conn.begin()
+        # a throwaway schema inside a transaction that is rolled back: the
+        # database under test is left as it was
+        conn.execute(text("CREATE SCHEMA pnl_smoke"))
+        conn.execute(text("SET LOCAL search_path TO pnl_smoke"))
+        Base.metadata.create_all(conn, tables=[
+            User.__table__,
+            FinanceArticle.__table__,
+            ImportJob.__table__,
+            FinanceTransaction.__table__,
+            FinanceDailyAgg.__table__,
+            FinanceChannelBalance.__table__,
+            DataVersion.__table__,
+        ])
+        session = Session(bind=conn, join_transaction_mode="create_savepoint")
+        try:
+            rng = random.Random(20261016)
+            _seed(session, rng)
+            for _ in range(20):
+                start = date(2023, 12, 1) + timedelta(days=rng.randrange(950))
+                end = start + timedelta(days=rng.randrange(400))
+                period = rng.choice(["day", "week", "month", "quarter", "year"])
+
+                rows, meta = pnl(session, start=start, end=end, period=period)
+                ref_rows, ref_unknown, ref_daily, ref_top = _reference_pnl(session, start=start, end=end, period=period)
+
+                assert [r.period_start for r in rows] == [r.period_start for r in ref_rows], (start, end, period)
+                assert [r.income_sum for r in rows] == pytest.approx([r.income_sum for r in ref_rows])
+                assert [r.expense_sum for r in rows] == pytest.approx([r.expense_sum for r in ref_rows])
+                assert meta["unknown_count"] == ref_unknown
+                assert [d["date"] for d in meta["daily"]] == [d["date"] for d in ref_daily]
+                for key in ("income", "expense", "net"):
+                    assert [d[key] for d in meta["daily"]] == pytest.approx([d[key] for d in ref_daily])
+                for key, kind in (("top_income_articles", TxType.income), ("top_expense_articles", TxType.expense)):
+                    assert [a["name"] for a in meta[key]] == [a["name"] for a in ref_top[kind]]
+                    assert [a["amount"] for a in meta[key]] == pytest.approx([a["amount"] for a in ref_top[kind]])
+        finally:
+            session.close()
+            outer.rollback()
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from kbeton.db.base import Base
+from kbeton.models.enums import PatternType, TxType
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob, MappingRule
+from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
+from kbeton.services.reclassify import _like_escape, contains_prefilter, reclassify_unknown
+from kbeton.services.versions import RULES_VERSION, bump_version
+
+
+def _session():
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine, tables=[
+        User.__table__,
+        FinanceArticle.__table__,
+        MappingRule.__table__,
+        DataVersion.__table__,
+        ImportJob.__table__,
+        FinanceTransaction.__table__,
+        FinanceDailyAgg.__table__,
+        FinanceChannelBalance.__table__,
+    ])
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+    return Session()
+
+
+def _seed(session, descriptions: list[str]) -> ImportJob:
+    job = ImportJob(kind="finance", status="done", filename="bank.xlsx", s3_key="k")
+    session.add(job)
+    session.flush()
+    for i, text in enumerate(descriptions):
+        session.add(FinanceTransaction(import_job_id=job.id, date=date(2026, 1, 1), amount=100 + i, description=text, counterparty="", tx_type=TxType.unknown, dedup_hash=f"h{i}", raw_fields={}))
+    session.flush()
+    return job
+
+
+def test_reclassify_unknown_applies_new_rule_in_keyset_chunks():
+    session = _session()
+    try:
+        diesel = FinanceArticle(kind=TxType.expense, name="Дизель", is_active=True)
+        sales = FinanceArticle(kind=TxType.income, name="Продажи", is_active=True)
+        session.add_all([diesel, sales])
+        session.flush()
+        _seed(session, ["Дизель для миксера"] * 5 + ["Оплата за бетон"] * 3 + ["Прочее"] * 2)
+        manual = session.query(FinanceTransaction).filter(FinanceTransaction.description == "Оплата за бетон").first()
+        manual.tx_type = TxType.expense
+        manual.expense_article_id = diesel.id
+
+        rule = MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="дизель", priority=100, is_active=True, article_id=diesel.id)
+        other = MappingRule(kind=TxType.income, pattern_type=PatternType.regex, pattern=r"оплата\s+за\s+бетон", priority=90, is_active=True, article_id=sales.id)
+        session.add_all([rule, other])
+        session.flush()
+        bump_version(session, RULES_VERSION)
+
+        result = reclassify_unknown(session, chunk_size=3, commit_chunks=True)
+
+        assert result == {"scanned": 9, "classified": 7, "by_rule": {str(rule.id): 5, str(other.id): 2}}
+        txs = session.query(FinanceTransaction).all()
+        assert sum(1 for t in txs if t.tx_type == TxType.unknown) == 2
+        assert {t.income_article_id for t in txs if t.tx_type == TxType.income} == {sales.id}
+        session.refresh(manual)
+        assert manual.tx_type == TxType.expense and manual.expense_article_id == diesel.id
+        assert reclassify_unknown(session)["classified"] == 0
+    finally:
+        session.close()
+
+
+def test_contains_prefilter_only_on_postgres():
+    session = _session()
+    try:
+        assert contains_prefilter(session, [1]) is None
+        assert _like_escape("100%_a!") == "100!%!_a!!"
+    finally:
+        session.close()
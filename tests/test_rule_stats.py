@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from kbeton.db.base import Base
+from kbeton.models.enums import PatternType, TxType
+from kbeton.models.finance import FinanceArticle, MappingRule, MappingRuleStat
+from kbeton.models.user import User
+from kbeton.services.mapping import RULE_STATS_FLUSH_SECONDS, RuleEngine, RuleStatsCollector
+from kbeton.services.rule_stats import flush_rule_stats, flush_rule_stats_if_due, rule_stats_report
+
+
+def _session():
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine, tables=[
+        User.__table__,
+        FinanceArticle.__table__,
+        MappingRule.__table__,
+        MappingRuleStat.__table__,
+    ])
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+    return Session()
+
+
+def test_rule_stats_are_collected_flushed_and_reported():
+    session = _session()
+    try:
+        art = FinanceArticle(kind=TxType.expense, name="Дизель", is_active=True)
+        session.add(art)
+        session.flush()
+        old = datetime.now(timezone.utc) - timedelta(days=90)
+        diesel = MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="дизель", priority=100, is_active=True, article_id=art.id)
+        fuel = MappingRule(kind=TxType.expense, pattern_type=PatternType.regex, pattern=r"топливо\s+\w+", priority=90, is_active=True, article_id=art.id)
+        dead = MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="солярка", priority=80, is_active=True, article_id=art.id, created_at=old)
+        stale = MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="гсм", priority=70, is_active=True, article_id=art.id, created_at=old)
+        session.add_all([diesel, fuel, dead, stale])
+        session.flush()
+        session.add(MappingRuleStat(rule_id=stale.id, hits=2, evaluations=2, match_seconds=0, last_hit_at=old + timedelta(days=10)))
+        session.flush()
+
+        collector = RuleStatsCollector()
+        engine = RuleEngine([diesel, fuel, dead], stats=collector)
+        engine.classify_many([("Дизель", ""), ("Дизель", ""), ("Топливо для миксера", ""), ("Прочее", "")])
+        assert collector.hits == {diesel.id: 2, fuel.id: 1}
+        assert collector.evaluations[fuel.id] == 2  # not tried where the higher-priority "дизель" already matched
+
+        assert flush_rule_stats(session, collector) == 2
+        assert collector.drain() == {}
+        engine.classify(description="Дизель", counterparty="")
+        flush_rule_stats(session, collector)
+
+        report = {r["rule_id"]: r for r in rule_stats_report(session)}
+        assert report[diesel.id]["hits"] == 3 and report[diesel.id]["last_hit_at"] is not None
+        assert report[fuel.id]["hits"] == 1 and report[fuel.id]["evaluations"] == 2 and report[fuel.id]["match_ms"] > 0
+        assert report[dead.id]["hits"] == 0 and report[dead.id]["dead"]
+        assert report[stale.id]["hits"] == 2 and report[stale.id]["dead"]  # fired, but not for 30+ days
+        assert not report[diesel.id]["dead"]
+        assert [r["rule_id"] for r in rule_stats_report(session)][:1] == [diesel.id]
+    finally:
+        session.close()
+
+
+def test_flush_skips_deleted_rules():
+    session = _session()
+    try:
+        collector = RuleStatsCollector()
+        collector.record_eval(12345, 0.001)
+        assert flush_rule_stats(session, collector) == 0
+        assert session.query(MappingRuleStat).count() == 0
+    finally:
+        session.close()
+
+
+def test_flush_if_due_waits_for_the_interval():
+    session = _session()
+    try:
+        art = FinanceArticle(kind=TxType.expense, name="Дизель", is_active=True)
+        session.add(art)
+        session.flush()
+        rule = MappingRule(kind=TxType.expense, pattern_type=PatternType.contains, pattern="дизель", priority=100, is_active=True, article_id=art.id)
+        session.add(rule)
+        session.flush()
+
+        collector = RuleStatsCollector()
+        assert not collector.flush_due(now=collector.drained_at + RULE_STATS_FLUSH_SECONDS)  # nothing pending
+        RuleEngine([rule], stats=collector).classify(description="Дизель", counterparty="")
+        assert flush_rule_stats_if_due(session, collector) == 0
+        assert collector.hits == {rule.id: 1}
+
+        collector.drained_at -= RULE_STATS_FLUSH_SECONDS
+        assert flush_rule_stats_if_due(session, collector) == 1
+        assert session.get(MappingRuleStat, rule.id).hits == 1
+        assert not collector.flush_due()
+    finally:
+        session.close()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import datetime
+
+import pytest
+
+from kbeton.importers.finance_formats import finance_file_ext, iter_finance_file
+from kbeton.importers.finance_importer import make_dedup_hash
+from kbeton.importers.text_statement_importer import iter_1c_exchange_rows, iter_csv_rows
+
+ONEC = """1CClientBankExchange
+ВерсияФормата=1.03
+Кодировка=Windows
+СекцияРасчСчет
+РасчСчет=1280000000000001
+КонецРасчСчет
+СекцияДокумент=Платежное поручение
+Номер=15
+Дата=03.02.2026
+Сумма=12500.50
+ПлательщикСчет=1280000000000001
+Плательщик=ОсОО Кбетон
+ПолучательСчет=1030000000000777
+Получатель=ОсОО Нефтепродукт
+НазначениеПлатежа=Оплата за дизель
+ДатаСписано=03.02.2026
+КонецДокумента
+СекцияДокумент=Платежное поручение
+Номер=16
+Дата=04.02.2026
+Сумма=300000
+ПлательщикСчет=1090000000000555
+Плательщик=ОсОО СтройИнвест
+ПолучательСчет=1280000000000001
+Получатель=ОсОО Кбетон
+НазначениеПлатежа=Оплата за бетон М300
+ДатаПоступило=05.02.2026
+КонецДокумента
+КонецФайла
+"""
+
+
+def test_1c_exchange_cp1251_directions():
+    rows = list(iter_1c_exchange_rows(ONEC.replace("\n", "\r\n").encode("cp1251")))
+    assert len(rows) == 2
+    out, inc = rows
+    assert (out.tx_type, out.amount, out.date) == ("расход", 12500.5, datetime.date(2026, 2, 3))
+    assert out.counterparty == "ОсОО Нефтепродукт"
+    assert out.description == "Оплата за дизель"
+    assert out.raw_fields["payment_channel"] == "bank"
+    assert (inc.tx_type, inc.date, inc.counterparty) == ("приход", datetime.date(2026, 2, 5), "ОсОО СтройИнвест")
+
+
+def test_csv_reuses_finance_header_synonyms():
+    data = "Выписка;;;\nДата;Сумма;Назначение;Контрагент\n01.02.2026;1 500,50;Дизель;АЗС\n;;;\n2026-02-02;200;Комиссия;Банк\n".encode("cp1251")
+    rows = list(iter_csv_rows(data))
+    assert [r.date for r in rows] == [datetime.date(2026, 2, 1), datetime.date(2026, 2, 2)]
+    assert rows[0].amount == 1500.5
+    assert rows[0].counterparty == "АЗС"
+
+
+def test_routing_by_extension_gives_same_rows_for_csv_and_txt():
+    data = "date,amount,description\n2026-02-01,100,x\n".encode("utf-8")
+    assert finance_file_ext("выписка.CSV") == ".csv"
+    assert finance_file_ext("statement.pdf") is None
+    csv_rows = list(iter_finance_file("a.csv", data))
+    txt_rows = list(iter_finance_file("a.txt", data))
+    assert [make_dedup_hash(r) for r in csv_rows] == [make_dedup_hash(r) for r in txt_rows]
+    assert len(list(iter_finance_file("kl_to_1c.txt", ONEC.encode("utf-8")))) == 2
+    with pytest.raises(ValueError):
+        iter_finance_file("statement.pdf", data)
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from kbeton.db.base import Base
+from kbeton.importers.utils import description_fingerprint
+from kbeton.models.enums import TxType
+from kbeton.models.finance import FinanceArticle, FinanceChannelBalance, FinanceDailyAgg, FinanceTransaction, ImportJob
+from kbeton.models.user import User
+from kbeton.models.versions import DataVersion
+from kbeton.services.triage import assign_cluster, unknown_backlog, unknown_clusters
+
+
+def _session():
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine, tables=[
+        User.__table__,
+        FinanceArticle.__table__,
+        ImportJob.__table__,
+        FinanceTransaction.__table__,
+        FinanceDailyAgg.__table__,
+        FinanceChannelBalance.__table__,
+        DataVersion.__table__,
+    ])
+    Session = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+    return Session()
+
+
+def _tx(
+    job_id: int, i: int, description: str, amount: float, tx_type: TxType = TxType.unknown, counterparty: str = ""
+) -> FinanceTransaction:
+    return FinanceTransaction(
+        import_job_id=job_id, date=date(2026, 1, 1 + i % 28), amount=amount, description=description, counterparty=counterparty,
+        tx_type=tx_type, dedup_hash=f"h{i}", description_fingerprint=description_fingerprint(description, counterparty), raw_fields={},
+    )
+
+
+def test_description_fingerprint_drops_numbers_and_punctuation():
+    assert description_fingerprint("Оплата по счету №15 от 01.02.2026") == description_fingerprint("ОПЛАТА по счету № 16 от 03.02.2026")
+    assert description_fingerprint("", 'ОсОО "Цемент"') == "осоо цемент"
+    assert len(description_fingerprint("слово " * 40)) <= 64
+
+
+def test_description_fingerprint_keeps_suppliers_apart():
+    cement = description_fingerprint("Оплата по счету №15 от 01.02.2024", "ОсОО Цемент")
+    rent = description_fingerprint("Оплата по счету №77 от 03.02.2024", "ИП Иванов (аренда)")
+    assert cement == "оплата по счету от | осоо цемент"
+    assert cement != rent
+    assert cement == description_fingerprint("Оплата по счету №16 от 05.02.2024", 'ОсОО "Цемент"')
+    long = description_fingerprint("слово " * 40, "ОсОО Очень Длинное Название Поставщика")
+    assert len(long) <= 64 and long.endswith(" | осоо очень длинное назва")
+
+
+def test_unknown_clusters_and_assign_whole_cluster():
+    session = _session()
+    try:
+        diesel = FinanceArticle(kind=TxType.expense, name="Дизель", is_active=True)
+        job = ImportJob(kind="finance", status="done", filename="bank.xlsx", s3_key="k")
+        session.add_all([diesel, job])
+        session.flush()
+        txs = [_tx(job.id, i, f"Дизельное топливо, накладная {100 + i}", 50) for i in range(6)]
+        txs += [_tx(job.id, 10 + i, f"Аренда офиса за {i + 1} мес.", 500) for i in range(2)]
+        txs.append(_tx(job.id, 20, "Дизельное топливо, накладная 999", 50, tx_type=TxType.expense))
+        txs.append(_tx(job.id, 21, "Дизельное топливо, накладная 7", 80, counterparty="ОсОО Нефть"))
+        session.add_all(txs)
+        session.flush()
+
+        clusters = unknown_clusters(session)
+        assert [(c["fingerprint"], c["count"], c["total"]) for c in clusters] == [
+            ("дизельное топливо накладная", 6, 300.0),
+            ("аренда офиса за мес", 2, 1000.0),
+            ("дизельное топливо накладная | осоо нефть", 1, 80.0),
+        ]
+        assert clusters[0]["sample_id"] == txs[0].id and clusters[0]["sample"].startswith("Дизельное")
+        assert clusters[2]["counterparty"] == "ОсОО Нефть"
+        assert unknown_backlog(session) == 9
+
+        assert assign_cluster(session, sample_id=clusters[0]["sample_id"], tx_type=TxType.expense, article_id=diesel.id) == 6
+        assert unknown_backlog(session) == 3
+        assigned = session.query(FinanceTransaction).filter(FinanceTransaction.expense_article_id == diesel.id).count()
+        assert assigned == 6
+        assert assign_cluster(session, sample_id=clusters[0]["sample_id"], tx_type=TxType.expense, article_id=diesel.id) == 0
+    finally:
+        session.close()